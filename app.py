@@ -8,6 +8,9 @@ Routes are organized in separate blueprint modules in the routes package.
 from flask import Flask
 from database import init_database, add_sample_data
 from routes import register_blueprints
+from cli import register_commands
+from search_index import build_catalog_index
+from metrics import register_request_hooks
 
 
 def create_app():
@@ -26,9 +29,18 @@ def create_app():
     # Add sample data for testing and demonstration
     add_sample_data()
     
+    # Build the in-memory fuzzy search index
+    build_catalog_index()
+    
     # Register all route blueprints
     register_blueprints(app)
     
+    # Record request counts, latency and database time for /metrics
+    register_request_hooks(app)
+    
+    # Register batch job CLI commands
+    register_commands(app)
+    
     return app
 
 
@@ -0,0 +1,4 @@
+"""
+Benchmarks Package - Performance measurements for the Library Management System
+Run individual benchmarks with ``python -m benchmarks.<name>``.
+"""
@@ -0,0 +1,61 @@
+"""
+Autocomplete Latency Benchmark
+
+Measures per-keystroke latency of the title prefix index at several
+catalog sizes, typing each sampled title one character at a time.
+
+Usage:
+    python -m benchmarks.autocomplete_latency [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from search_index import PrefixIndex
+
+WORDS = (
+    'river shadow garden empire winter glass silent crown ocean ember night stone '
+    'the a an of and in last first secret little house war peace king queen '
+    'history journey dream light dark city island mountain letters song'
+).split()
+
+def synthetic_titles(count: int, seed: int = 327):
+    rng = random.Random(seed)
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(2, 5))]
+        yield ' '.join(words).title() + f' {i}'
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=200, help='Titles to type per catalog size.')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'titles':>10}{'build (s)':>12}{'keystrokes':>12}{'p50 (us)':>10}{'p99 (us)':>10}{'max (us)':>10}")
+    for size in args.sizes:
+        titles = list(synthetic_titles(size))
+        index = PrefixIndex()
+        started = time.perf_counter()
+        index.add_many(titles)
+        build = time.perf_counter() - started
+
+        rng = random.Random(9558)
+        samples = []
+        for title in rng.sample(titles, min(args.queries, size)):
+            for end in range(1, len(title) + 1):
+                started = time.perf_counter()
+                index.complete(title[:end], args.limit)
+                samples.append((time.perf_counter() - started) * 1e6)
+
+        print(f'{size:>10}{build:>12.2f}{len(samples):>12}{statistics.median(samples):>10.1f}'
+              f'{percentile(samples, 99):>10.1f}{max(samples):>10.1f}')
+
+if __name__ == '__main__':
+    main()
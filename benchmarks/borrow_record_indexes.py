@@ -0,0 +1,118 @@
+"""
+Borrow Record Index Benchmark
+
+Times the open-loan queries behind get_patron_borrowed_books,
+get_patron_borrow_count and update_borrow_record_return_date as
+borrow_records grows, with and without the migration indexes.
+
+Usage:
+    python -m benchmarks.borrow_record_indexes [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+
+QUERIES = {
+    'patron_borrowed_books': '''
+        SELECT br.*, b.title, b.author 
+        FROM borrow_records br 
+        JOIN books b ON br.book_id = b.id 
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+        ORDER BY br.borrow_date
+    ''',
+    'patron_borrow_count': '''
+        SELECT COUNT(*) as count FROM borrow_records 
+        WHERE patron_id = ? AND return_date IS NULL
+    ''',
+    'open_record_lookup': '''
+        SELECT id FROM borrow_records 
+        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+    ''',
+}
+
+def build_database(path: str, rows: int, books: int = 10000, patrons: int = 50000,
+                   open_ratio: float = 0.02, seed: int = 327) -> None:
+    """Create a synthetic database; only ``open_ratio`` of loans are still open."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL, book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Book {i}', f'Author {i % 997}', f'{9780000000000 + i}', 5, 5) for i in range(books))
+    )
+    start = datetime(2020, 1, 1)
+
+    def records():
+        for _ in range(rows):
+            borrowed = start + timedelta(minutes=rng.randrange(3_000_000))
+            returned = None if rng.random() < open_ratio else (borrowed + timedelta(days=7)).isoformat()
+            yield (f'{rng.randrange(patrons):06d}', rng.randrange(1, books + 1),
+                   borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat(), returned)
+
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', records())
+    conn.commit()
+    conn.close()
+
+def time_queries(path: str, iterations: int, patrons: int = 50000, books: int = 10000,
+                 seed: int = 9558) -> dict:
+    """Return the mean time in microseconds per query name."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    results = {}
+    for name, sql in QUERIES.items():
+        args = [(f'{rng.randrange(patrons):06d}',) if sql.count('?') == 1
+                else (f'{rng.randrange(patrons):06d}', rng.randrange(1, books + 1))
+                for _ in range(iterations)]
+        started = time.perf_counter()
+        for params in args:
+            conn.execute(sql, params).fetchall()
+        results[name] = (time.perf_counter() - started) / iterations * 1e6
+    conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'query':<24}{'no index (us)':>16}{'indexed (us)':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f'bench_{size}.db')
+            build_database(path, size)
+            before = time_queries(path, args.iterations)
+
+            database.DATABASE = path
+            database.migrate_database()
+            database.get_pool().close()
+            after = time_queries(path, args.iterations)
+
+            for name in QUERIES:
+                print(f'{size:>10}  {name:<24}{before[name]:>16.1f}{after[name]:>16.1f}')
+
+if __name__ == '__main__':
+    main()
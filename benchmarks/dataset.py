@@ -0,0 +1,130 @@
+"""
+Synthetic Dataset Generator
+
+Builds a deterministic library database at a realistic size for the
+benchmarks: books, patrons with open loans (some overdue) and a long
+tail of returned loans. The same arguments always produce the same data.
+
+Usage:
+    python -m benchmarks.dataset library_bench.db [--books 10000] [--patrons 2000] [--loans 50000]
+"""
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import database
+from benchmarks.autocomplete_latency import synthetic_titles
+from services.library_service import BORROWING_LIMIT, LOAN_PERIOD_DAYS
+
+FIRST_NAMES = 'Ada Alan Grace Edsger Barbara Donald Margaret Ken Frances Niklaus Radia John'.split()
+LAST_NAMES = 'Lovelace Turing Hopper Dijkstra Liskov Knuth Hamilton Thompson Allen Wirth Perlman Backus'.split()
+FIRST_PATRON_ID = 100000
+HISTORY_DAYS = 730
+
+def patron_id(index: int) -> str:
+    """The 6-digit card ID of the ``index``-th synthetic patron."""
+    return f'{FIRST_PATRON_ID + index:06d}'
+
+def generate_dataset(path: str, books: int = 10_000, patrons: int = 2_000, loans: int = 50_000,
+                     open_ratio: float = 0.2, overdue_ratio: float = 0.3, seed: int = 327,
+                     now: Optional[datetime] = None) -> Dict:
+    """
+    Create a seeded database at ``path`` (which must not exist yet).
+
+    ``open_ratio`` of loans are still open, capped at the borrowing limit
+    per patron and the copies of each book; ``overdue_ratio`` of the open
+    loans are past their due date. Points ``database.DATABASE`` at the
+    new file.
+
+    Returns:
+        dict: The generation parameters and the resulting row counts
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    now = now or datetime.now()
+
+    database.DATABASE = path
+    database.init_database()
+
+    total_copies = [rng.randint(1, 10) for _ in range(books)]
+    titles = synthetic_titles(books, seed)
+    book_rows = [(title, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', f'{9790000000000 + i}',
+                  copies, copies) for i, (title, copies) in enumerate(zip(titles, total_copies))]
+
+    open_per_patron = [0] * patrons
+    open_per_book = [0] * books
+    loan_rows = []
+    open_loans = overdue_loans = 0
+    for _ in range(loans):
+        patron = rng.randrange(patrons)
+        book = rng.randrange(books)
+        if (rng.random() < open_ratio and open_per_patron[patron] < BORROWING_LIMIT
+                and open_per_book[book] < total_copies[book]):
+            if rng.random() < overdue_ratio:
+                due_date = now - timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 23))
+                overdue_loans += 1
+            else:
+                due_date = now + timedelta(days=rng.randint(0, LOAN_PERIOD_DAYS - 1), hours=rng.randint(1, 23))
+            borrow_date = due_date - timedelta(days=LOAN_PERIOD_DAYS)
+            return_date = None
+            open_per_patron[patron] += 1
+            open_per_book[book] += 1
+            open_loans += 1
+        else:
+            borrow_date = now - timedelta(days=rng.randint(LOAN_PERIOD_DAYS + 60, HISTORY_DAYS),
+                                          minutes=rng.randrange(1440))
+            due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
+            return_date = (borrow_date + timedelta(days=rng.randint(1, 30))).isoformat()
+        loan_rows.append((patron_id(patron), book + 1, borrow_date.isoformat(), due_date.isoformat(),
+                          database.epoch_seconds(due_date), return_date))
+
+    for i, open_count in enumerate(open_per_book):
+        title, author, isbn, copies, _ = book_rows[i]
+        book_rows[i] = (title, author, isbn, copies, copies - open_count)
+
+    with database.db_connection() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', book_rows)
+        # Loans are inserted in borrow order, as the application would have
+        loan_rows.sort(key=lambda row: row[2])
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, due_at, return_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', loan_rows)
+        if database._has_books_fts(conn):
+            # Merge the FTS segments written by the bulk load, as a live catalog's automerge would
+            conn.execute("INSERT INTO books_fts (books_fts) VALUES ('optimize')")
+        conn.execute('ANALYZE')
+    database.invalidate_book_cache()
+
+    return {
+        'books': books, 'patrons': patrons, 'loans': loans, 'open_ratio': open_ratio,
+        'overdue_ratio': overdue_ratio, 'seed': seed,
+        'open_loans': open_loans, 'overdue_loans': overdue_loans
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='Database file to create.')
+    parser.add_argument('--books', type=int, default=10_000)
+    parser.add_argument('--patrons', type=int, default=2_000)
+    parser.add_argument('--loans', type=int, default=50_000)
+    parser.add_argument('--open-ratio', type=float, default=0.2)
+    parser.add_argument('--overdue-ratio', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=327)
+    args = parser.parse_args()
+
+    summary = generate_dataset(args.path, args.books, args.patrons, args.loans,
+                               args.open_ratio, args.overdue_ratio, args.seed)
+    database.get_pool().close()
+    print(f"{args.path}: {summary['books']} books, {summary['loans']} loans "
+          f"({summary['open_loans']} open, {summary['overdue_loans']} overdue)")
+
+if __name__ == '__main__':
+    main()
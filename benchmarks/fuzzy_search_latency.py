@@ -0,0 +1,59 @@
+"""
+Fuzzy Search Latency Benchmark
+
+Measures TrigramIndex search latency at several catalog sizes for
+misspelt titles (a dropped letter, or a vowel swapped and the end cut
+off), and how often the misspelt title is found among the results.
+
+Usage:
+    python -m benchmarks.fuzzy_search_latency [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.autocomplete_latency import percentile, synthetic_titles
+from search_index import TrigramIndex
+
+def misspellings(title: str, rng: random.Random):
+    words = title.split()
+    i = rng.randrange(len(words) - 1)
+    j = rng.randrange(len(words[i]))
+    words[i] = words[i][:j] + words[i][j + 1:]
+    yield ' '.join(words)
+    yield title[:-2].lower().replace('e', 'a', 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=200, help='Titles to misspell per catalog size.')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'titles':>10}{'build (s)':>12}{'queries':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}"
+          f"{'found':>8}")
+    for size in args.sizes:
+        index = TrigramIndex()
+        started = time.perf_counter()
+        for doc_id, title in enumerate(synthetic_titles(size)):
+            index.add(doc_id, title)
+        build = time.perf_counter() - started
+
+        rng = random.Random(9558)
+        titles = list(synthetic_titles(size))
+        samples = []
+        found = 0
+        for doc_id in rng.sample(range(size), min(args.queries, size)):
+            for query in misspellings(titles[doc_id], rng):
+                started = time.perf_counter()
+                results = index.search(query, limit=args.limit)
+                samples.append((time.perf_counter() - started) * 1e3)
+                found += any(match == doc_id for match, _ in results)
+
+        print(f'{size:>10}{build:>12.2f}{len(samples):>10}{statistics.median(samples):>10.2f}'
+              f'{percentile(samples, 99):>10.2f}{max(samples):>10.2f}{found / len(samples):>8.0%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""
+HTTP Load Test
+
+Starts the app on a synthetic database (see benchmarks.dataset) and
+drives the real blueprints with many concurrent keep-alive clients and a
+configurable mix of reads and writes. Reports throughput, outcomes
+(including "database is busy" refusals from SQLite lock contention),
+error rates and latency percentiles and histograms per route.
+
+Usage:
+    python -m benchmarks.http_load [--server prefork|dev] [--workers 4] [--clients 32]
+        [--duration 30] [--mix catalog=25,search=10,api_search=25,late_fee=20,borrow=10,return=10]
+        [--books 10000] [--patrons 2000] [--loans 50000] [--output load.json]
+    python -m benchmarks.http_load --url http://127.0.0.1:5000 ...   # an already running server
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import database
+from benchmarks.autocomplete_latency import percentile
+from benchmarks.dataset import generate_dataset, patron_id
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = 'catalog=25,search=10,api_search=25,late_fee=20,borrow=10,return=10'
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+HISTOGRAM_LABELS = [f'<={bound}' for bound in HISTOGRAM_BUCKETS_MS] + [f'>{HISTOGRAM_BUCKETS_MS[-1]}']
+OUTCOMES = ('ok', 'refused', 'busy', 'http_error', 'conn_error')
+BUSY_MARKERS = (b'database is busy', b'database is locked')
+FRESH_PATRON_BASE = 900000
+PATRONS_PER_CLIENT = 20
+SERVER_START_TIMEOUT = 60
+
+class RouteStats:
+    """Per-client, per-route counters; merged after the run so clients never share a lock."""
+
+    def __init__(self):
+        self.latencies = []
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+
+    def merge(self, other: 'RouteStats') -> None:
+        self.latencies.extend(other.latencies)
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] += count
+
+    def report(self, duration: float) -> Dict:
+        requests = len(self.latencies)
+        histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for latency in self.latencies:
+            histogram[bisect_left(HISTOGRAM_BUCKETS_MS, latency * 1000)] += 1
+        errors = self.outcomes['http_error'] + self.outcomes['conn_error']
+        return {
+            'requests': requests,
+            'rps': round(requests / duration, 1),
+            'outcomes': dict(self.outcomes),
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'busy_rate': round(self.outcomes['busy'] / requests, 4) if requests else 0.0,
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 2) if requests else None,
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 2) if requests else None,
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 2) if requests else None,
+            'max_ms': round(max(self.latencies) * 1000, 2) if requests else None,
+            'histogram_ms': dict(zip(HISTOGRAM_LABELS, histogram)),
+        }
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Parse ``route=weight,...`` into weights, rejecting unknown routes."""
+    weights = {}
+    for part in mix.split(','):
+        route, _, weight = part.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route {route!r}; choose from {', '.join(ROUTES)}")
+        weights[route] = int(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("The mix needs at least one route with a positive weight")
+    return weights
+
+def _flashes(response: http.client.HTTPResponse) -> bytes:
+    """The flashed messages in the (signed, unencrypted) Flask session cookie set on a redirect."""
+    for header, value in response.getheaders():
+        if header.lower() == 'set-cookie' and value.startswith('session='):
+            payload = value[len('session='):].split(';', 1)[0]
+            compressed = payload.startswith('.')
+            data = payload.lstrip('.').split('.', 1)[0]
+            try:
+                data = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+                return zlib.decompress(data) if compressed else data
+            except (ValueError, zlib.error):
+                return b''
+    return b''
+
+def _classify(response: http.client.HTTPResponse, body: bytes) -> str:
+    if response.status >= 500:
+        return 'busy' if any(marker in body for marker in BUSY_MARKERS) else 'http_error'
+    # Form posts report their result as a flash message, either in the page or in the cookie
+    messages = body + _flashes(response)
+    if any(marker in messages for marker in BUSY_MARKERS):
+        return 'busy'
+    if response.status >= 400:
+        return 'http_error'
+    if b'class="flash-error"' in body or b'"error"' in messages:
+        return 'refused'
+    return 'ok'
+
+class Client(threading.Thread):
+    """One keep-alive HTTP client issuing requests from the mix until the deadline."""
+
+    def __init__(self, index: int, host: str, port: int, weights: Dict[str, int], deadline: float,
+                 summary: Dict, seed: int):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.routes = list(weights)
+        self.weights = list(weights.values())
+        self.deadline = deadline
+        self.summary = summary
+        self.rng = random.Random(f'{seed}:{index}')
+        self.patrons = [f'{FRESH_PATRON_BASE + index * PATRONS_PER_CLIENT + i:06d}' for i in range(PATRONS_PER_CLIENT)]
+        self.borrowed: List[Tuple[str, int]] = []
+        self.stats = {route: RouteStats() for route in self.routes}
+        self._conn = None
+
+    def run(self) -> None:
+        while time.monotonic() < self.deadline:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            method, path, form = ROUTES[route](self)
+            stats = self.stats[route]
+            started = time.perf_counter()
+            try:
+                outcome = self._request(method, path, form)
+            except (OSError, http.client.HTTPException):
+                outcome = 'conn_error'
+                self._close()
+            stats.latencies.append(time.perf_counter() - started)
+            stats.outcomes[outcome] += 1
+            if route == 'borrow' and outcome == 'ok':
+                self.borrowed.append((form['patron_id'], form['book_id']))
+        self._close()
+
+    def _request(self, method: str, path: str, form: Optional[Dict]) -> str:
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        body = urlencode(form) if form else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+        self._conn.request(method, path, body, headers)
+        response = self._conn.getresponse()
+        content = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            self._close()
+        return _classify(response, content)
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Request builders
+
+    def _book_id(self) -> int:
+        return self.rng.randint(1, self.summary['books'])
+
+    def _search_term(self) -> str:
+        return self.rng.choice(('river', 'shadow garden', 'the last', 'winter', 'crown', 'ocean'))
+
+    def catalog(self):
+        return 'GET', '/catalog', None
+
+    def search(self):
+        return 'GET', '/search?' + urlencode({'q': self._search_term(), 'type': 'title'}), None
+
+    def api_search(self):
+        search_type = self.rng.choice(('title', 'author', 'fuzzy'))
+        term = self.rng.choice(('Knuth', 'Hopper', 'Ada')) if search_type == 'author' else self._search_term()
+        return 'GET', '/api/search?' + urlencode({'q': term, 'type': search_type}), None
+
+    def late_fee(self):
+        return 'GET', f"/api/late_fee/{patron_id(self.rng.randrange(self.summary['patrons']))}/{self._book_id()}", None
+
+    def borrow(self):
+        return 'POST', '/borrow', {'patron_id': self.rng.choice(self.patrons), 'book_id': self._book_id()}
+
+    def return_(self):
+        if self.borrowed:
+            patron, book_id = self.borrowed.pop(self.rng.randrange(len(self.borrowed)))
+        else:
+            patron, book_id = self.rng.choice(self.patrons), self._book_id()
+        return 'POST', '/return', {'patron_id': patron, 'book_id': book_id}
+
+ROUTES = {
+    'catalog': Client.catalog,
+    'search': Client.search,
+    'api_search': Client.api_search,
+    'late_fee': Client.late_fee,
+    'borrow': Client.borrow,
+    'return': Client.return_,
+}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(kind: str, cwd: str, port: int, workers: int) -> subprocess.Popen:
+    """Start the pre-fork server or the threaded Flask development server in ``cwd``."""
+    if kind == 'prefork':
+        command = [sys.executable, os.path.join(ROOT, 'serve.py'), '--host', '127.0.0.1',
+                   '--port', str(port), '--workers', str(workers)]
+    else:
+        command = [sys.executable, '-c', 'import sys; sys.path.insert(0, sys.argv[1]); from app import create_app; '
+                   'create_app().run(host="127.0.0.1", port=int(sys.argv[2]), threaded=True)', ROOT, str(port)]
+    proc = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{kind} server exited with status {proc.returncode}')
+        # The master accepts connections before its workers finish booting, so wait for a real response
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=SERVER_START_TIMEOUT)
+            conn.request('GET', '/api/books?limit=1')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{kind} server did not start within {SERVER_START_TIMEOUT}s')
+
+def run_load(host: str, port: int, weights: Dict[str, int], clients: int, duration: float,
+             summary: Dict, seed: int = 9558) -> Dict:
+    """Drive the server with ``clients`` concurrent clients for ``duration`` seconds."""
+    deadline = time.monotonic() + duration
+    workers = [Client(i, host, port, weights, deadline, summary, seed) for i in range(clients)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    merged = {route: RouteStats() for route in weights}
+    total = RouteStats()
+    for worker in workers:
+        for route, stats in worker.stats.items():
+            merged[route].merge(stats)
+            total.merge(stats)
+    return {
+        'duration_s': round(elapsed, 2),
+        'clients': clients,
+        'total': total.report(elapsed),
+        'routes': {route: stats.report(elapsed) for route, stats in merged.items()},
+    }
+
+def print_report(report: Dict) -> None:
+    print(f"{'route':<12}{'requests':>10}{'req/s':>9}{'ok':>8}{'refused':>9}{'busy':>7}{'errors':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, stats in list(report['routes'].items()) + [('TOTAL', report['total'])]:
+        outcomes = stats['outcomes']
+        if not stats['requests']:
+            continue
+        print(f"{route:<12}{stats['requests']:>10}{stats['rps']:>9.1f}{outcomes['ok']:>8}{outcomes['refused']:>9}"
+              f"{outcomes['busy']:>7}{outcomes['http_error'] + outcomes['conn_error']:>8}{stats['p50_ms']:>9.1f}"
+              f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+    print()
+    print('latency histogram (ms): ' + ' '.join(f'{bucket:>7}' for bucket in report['total']['histogram_ms']))
+    for route, stats in report['routes'].items():
+        print(f"{route:<23} " + ' '.join(f'{count:>7}' for count in stats['histogram_ms'].values()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Load an already running server instead of starting one.')
+    parser.add_argument('--server', choices=('prefork', 'dev'), default='prefork',
+                        help='Server to start: serve.py or the threaded Flask development server.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='serve.py worker processes.')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Route weights as route=weight,...')
+    parser.add_argument('--books', type=int, default=10_000)
+    parser.add_argument('--patrons', type=int, default=2_000)
+    parser.add_argument('--loans', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--output', help='Save the report as JSON to this file.')
+    args = parser.parse_args()
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = None
+        if args.url:
+            target = urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+            summary = {'books': args.books, 'patrons': args.patrons}
+        else:
+            summary = generate_dataset(os.path.join(tmp, 'library.db'), args.books, args.patrons, args.loans,
+                                       seed=args.seed)
+            database.get_pool().close()
+            host, port = '127.0.0.1', _free_port()
+            proc = start_server(args.server, tmp, port, args.workers)
+        try:
+            report = run_load(host, port, weights, args.clients, args.duration, summary)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=60)
+
+    report.update(server=args.url or args.server, workers=None if args.url or args.server == 'dev' else args.workers,
+                  mix=weights)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
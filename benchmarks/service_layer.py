@@ -0,0 +1,279 @@
+"""
+Service Layer Benchmark
+
+Times every public function in services/library_service.py against a
+synthetic database (see benchmarks.dataset) and reports p50/p95/p99
+latency and ops/sec per function. Results can be saved as JSON and
+compared with a saved baseline; the exit status is 1 if any benchmark
+regressed by more than the threshold.
+
+Usage:
+    python -m benchmarks.service_layer [--books 10000] [--patrons 2000] [--loans 50000]
+        [--iterations 200] [--only search_title ...] [--output results.json]
+        [--baseline baseline.json] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import database
+from benchmarks.autocomplete_latency import percentile
+from benchmarks.dataset import generate_dataset, patron_id
+from services import library_service as service
+from services.payment_service import PaymentGateway
+
+BULK_ITERATIONS = 5
+DEFAULT_THRESHOLD = 0.2
+FRESH_PATRON_BASE = 900000
+
+def _sample(rng: random.Random, rows: List, count: int) -> List:
+    return rng.sample(rows, min(count, len(rows)))
+
+def _query(sql: str, params=()) -> List:
+    with database.db_connection() as conn:
+        return [tuple(row) for row in conn.execute(sql, params).fetchall()]
+
+def _open_loans(overdue: bool) -> List:
+    return _query(f'''
+        SELECT patron_id, book_id FROM borrow_records
+        WHERE return_date IS NULL AND due_date {'<' if overdue else '>='} ?
+        GROUP BY patron_id, book_id ORDER BY patron_id, book_id
+    ''', (datetime.now().isoformat(),))
+
+def _lendable_books() -> List[int]:
+    return [row[0] for row in _query('SELECT id FROM books WHERE available_copies >= 2 ORDER BY id')]
+
+# Each benchmark returns the zero-argument calls to time, built from the
+# dataset beforehand so only the service function itself is measured.
+# They run in this order, reads before writes, and share ``state`` (the dataset summary), which
+# the borrow benchmarks use to hand their loans to the return benchmarks.
+
+def bench_validate_book_details(rng, iterations, state):
+    return [lambda i=i: service.validate_book_details(f'Title {i}', 'Author', f'{9800000000000 + i}', 3)
+            for i in range(iterations)]
+
+def bench_add_book_to_catalog(rng, iterations, state):
+    return [lambda i=i, copies=rng.randint(1, 5): service.add_book_to_catalog(
+                f'Benchmark Book {i}', 'Bench Author', f'{9810000000000 + i}', copies)
+            for i in range(iterations)]
+
+def _search(search_type: str):
+    def bench(rng, iterations, state):
+        books = _query('SELECT title, author, isbn FROM books ORDER BY id')
+        terms = {
+            'title': lambda book: ' '.join(book[0].split()[:2]),
+            'author': lambda book: book[1].split()[-1],
+            'isbn': lambda book: book[2],
+            'fuzzy': lambda book: book[0][:-2].lower().replace('e', 'a', 1),
+        }[search_type]
+        return [lambda term=terms(book): service.search_books_in_catalog(term, search_type)
+                for book in (rng.choice(books) for _ in range(iterations))]
+    return bench
+
+def bench_autocomplete_catalog(rng, iterations, state):
+    titles = [row[0] for row in _query('SELECT title FROM books ORDER BY id')]
+    prefixes = [title[:rng.randint(1, 8)] for title in (rng.choice(titles) for _ in range(iterations))]
+    return [lambda prefix=prefix: service.autocomplete_catalog(prefix) for prefix in prefixes]
+
+def bench_get_catalog_page(rng, iterations, state):
+    cursors = [None]
+    page = service.get_catalog_page()
+    while page['next_cursor'] and len(cursors) < iterations:
+        cursors.append(page['next_cursor'])
+        page = service.get_catalog_page(page['next_cursor'])
+    return [lambda cursor=rng.choice(cursors): service.get_catalog_page(cursor) for _ in range(iterations)]
+
+def bench_get_patron_status_report(rng, iterations, state):
+    return [lambda p=patron_id(rng.randrange(state['patrons'])): service.get_patron_status_report(p)
+            for _ in range(iterations)]
+
+def bench_calculate_late_fee_for_book(rng, iterations, state):
+    loans = _open_loans(overdue=True) + _open_loans(overdue=False)
+    return [lambda loan=loan: service.calculate_late_fee_for_book(*loan) for loan in
+            (rng.choice(loans) for _ in range(iterations))]
+
+def bench_calculate_late_fees_bulk(rng, iterations, state):
+    return [lambda: sum(1 for _ in service.calculate_late_fees_bulk()) for _ in range(min(iterations, BULK_ITERATIONS))]
+
+def bench_borrow_book_by_patron(rng, iterations, state):
+    books = _lendable_books()
+    state['borrowed'] = [(f'{FRESH_PATRON_BASE + i // service.BORROWING_LIMIT:06d}', rng.choice(books))
+                         for i in range(iterations)]
+    return [lambda loan=loan: service.borrow_book_by_patron(*loan) for loan in state['borrowed']]
+
+def bench_return_book_by_patron(rng, iterations, state):
+    return [lambda loan=loan: service.return_book_by_patron(*loan) for loan in state.pop('borrowed', [])]
+
+def bench_borrow_books_by_patron(rng, iterations, state):
+    books = _lendable_books()
+    state['borrowed'] = [(f'{FRESH_PATRON_BASE + 50000 + i:06d}', rng.sample(books, 3)) for i in range(iterations)]
+    return [lambda batch=batch: service.borrow_books_by_patron(*batch) for batch in state['borrowed']]
+
+def bench_return_books_by_patron(rng, iterations, state):
+    return [lambda batch=batch: service.return_books_by_patron(*batch) for batch in state.pop('borrowed', [])]
+
+def bench_pay_late_fees(rng, iterations, state):
+    gateway = PaymentGateway()
+    return [lambda loan=loan: service.pay_late_fees(*loan, gateway)
+            for loan in _sample(rng, _open_loans(overdue=True), iterations)]
+
+def bench_refund_late_fee_payment(rng, iterations, state):
+    gateway = PaymentGateway()
+    payments = _query("SELECT transaction_id, amount FROM payments WHERE kind = 'payment' ORDER BY id")
+    return [lambda payment=payment: service.refund_late_fee_payment(payment[0], min(payment[1], 1.00), gateway)
+            for payment in _sample(rng, payments, iterations)]
+
+def bench_settle_patron_fees(rng, iterations, state):
+    gateway = PaymentGateway()
+    patrons = sorted({loan[0] for loan in _open_loans(overdue=True)})
+    return [lambda p=p: service.settle_patron_fees(p, gateway) for p in _sample(rng, patrons, iterations)]
+
+def bench_settle_fees_for_patrons(rng, iterations, state):
+    gateway = PaymentGateway()
+    return [lambda: sum(1 for _ in service.settle_fees_for_patrons(None, gateway))
+            for _ in range(min(iterations, BULK_ITERATIONS))]
+
+def bench_reconcile_payments(rng, iterations, state):
+    month = datetime.now().strftime('%Y-%m')
+    return [lambda: service.reconcile_payments(month) for _ in range(iterations)]
+
+BENCHMARKS: Dict[str, Callable] = {
+    'validate_book_details': bench_validate_book_details,
+    'search_title': _search('title'),
+    'search_author': _search('author'),
+    'search_isbn': _search('isbn'),
+    'search_fuzzy': _search('fuzzy'),
+    'autocomplete_catalog': bench_autocomplete_catalog,
+    'get_catalog_page': bench_get_catalog_page,
+    'get_patron_status_report': bench_get_patron_status_report,
+    'calculate_late_fee_for_book': bench_calculate_late_fee_for_book,
+    'calculate_late_fees_bulk': bench_calculate_late_fees_bulk,
+    'add_book_to_catalog': bench_add_book_to_catalog,
+    'borrow_book_by_patron': bench_borrow_book_by_patron,
+    'return_book_by_patron': bench_return_book_by_patron,
+    'borrow_books_by_patron': bench_borrow_books_by_patron,
+    'return_books_by_patron': bench_return_books_by_patron,
+    'pay_late_fees': bench_pay_late_fees,
+    'refund_late_fee_payment': bench_refund_late_fee_payment,
+    'settle_patron_fees': bench_settle_patron_fees,
+    'settle_fees_for_patrons': bench_settle_fees_for_patrons,
+    'reconcile_payments': bench_reconcile_payments,
+}
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency percentiles in microseconds and throughput for per-call timings in seconds."""
+    total = sum(samples)
+    return {
+        'ops': len(samples),
+        'mean_us': round(statistics.mean(samples) * 1e6, 1),
+        'p50_us': round(percentile(samples, 50) * 1e6, 1),
+        'p95_us': round(percentile(samples, 95) * 1e6, 1),
+        'p99_us': round(percentile(samples, 99) * 1e6, 1),
+        'ops_per_sec': round(len(samples) / total, 1) if total else None,
+    }
+
+def run_benchmarks(names: List[str], iterations: int, summary: Dict, seed: int = 9558) -> Dict[str, Dict]:
+    """Run the named benchmarks, in BENCHMARKS order, against the current database."""
+    state = dict(summary)
+    results = {}
+    for name in BENCHMARKS:
+        if name not in names:
+            continue
+        # Seed per benchmark so --only runs time the same calls as a full run
+        calls = BENCHMARKS[name](random.Random(f'{seed}:{name}'), iterations, state)
+        if not calls:
+            continue
+        samples = []
+        failed = 0
+        for call in calls:
+            started = time.perf_counter()
+            outcome = call()
+            samples.append(time.perf_counter() - started)
+            # Service functions report refusals as (False, message, ...)
+            if isinstance(outcome, tuple) and outcome and outcome[0] is False:
+                failed += 1
+        results[name] = dict(summarize(samples), failed=failed)
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Dict]:
+    """
+    Compare p50 and p95 with a baseline run.
+
+    Returns:
+        dict: Per benchmark present in both runs, the p50/p95 ratios to the
+        baseline and whether the p50 ratio exceeds ``1 + threshold`` (tail
+        latencies are reported but too noisy to gate on)
+    """
+    comparison = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratios = {key: round(result[key] / base[key], 2) if base[key] else None for key in ('p50_us', 'p95_us')}
+        comparison[name] = dict(ratios, regressed=ratios['p50_us'] is not None and ratios['p50_us'] > 1 + threshold)
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=10_000)
+    parser.add_argument('--patrons', type=int, default=2_000)
+    parser.add_argument('--loans', type=int, default=50_000)
+    parser.add_argument('--overdue-ratio', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--iterations', type=int, default=200, help='Calls timed per benchmark.')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Run only these benchmarks.')
+    parser.add_argument('--output', help='Save results as JSON to this file.')
+    parser.add_argument('--baseline', help='Compare with results previously saved with --output.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed p50 slowdown against the baseline (0.2 = 20%%).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        summary = generate_dataset(os.path.join(tmp, 'bench.db'), args.books, args.patrons, args.loans,
+                                   overdue_ratio=args.overdue_ratio, seed=args.seed)
+        print(f"dataset: {summary['books']} books, {summary['loans']} loans ({summary['open_loans']} open, "
+              f"{summary['overdue_loans']} overdue) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        try:
+            results = run_benchmarks(args.only or list(BENCHMARKS), args.iterations, summary)
+        finally:
+            database.get_pool().close()
+
+    comparison = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f)['results'], args.threshold)
+
+    print(f"{'benchmark':<28}{'ops':>6}{'failed':>8}{'p50 (us)':>11}{'p95 (us)':>11}{'p99 (us)':>11}{'ops/sec':>10}"
+          + (f"{'vs base p50':>13}" if comparison else ''))
+    for name, result in results.items():
+        line = (f"{name:<28}{result['ops']:>6}{result['failed']:>8}{result['p50_us']:>11.1f}{result['p95_us']:>11.1f}"
+                f"{result['p99_us']:>11.1f}{result['ops_per_sec']:>10.1f}")
+        if name in comparison:
+            flag = '  REGRESSED' if comparison[name]['regressed'] else ''
+            line += f"{comparison[name]['p50_us'] or 0:>12.2f}x{flag}"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': dict(summary, iterations=args.iterations, python=platform.python_version(),
+                             platform=platform.platform(), created_at=datetime.now().isoformat()),
+                'results': results,
+                'comparison': comparison,
+            }, f, indent=2)
+
+    if any(c['regressed'] for c in comparison.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Cache module for Library Management System
+Small thread-safe in-process caches used by the database layer
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class LRUCache:
+    """
+    A bounded least-recently-used cache with a per-entry time to live.
+
+    Readers that fill the cache after a database query should take
+    ``generation()`` before running the query and pass it to ``put()``:
+    if anything was invalidated in between, the possibly stale value is
+    dropped instead of cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        if maxsize < 1:
+            raise ValueError("Cache size must be a positive integer.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        """Get the current invalidation generation."""
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Cache a value unless an invalidation happened since ``generation``."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one entry and bump the generation."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry and bump the generation."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
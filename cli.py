@@ -0,0 +1,180 @@
+"""
+CLI Commands - Batch jobs run through the Flask command line
+
+Usage:
+    flask --app app late-fees [--output fees.jsonl] [--patron 123456 ...]
+    flask --app app import-books books.csv [--batch-size 1000] [--errors errors.jsonl]
+    flask --app app settle-fees [--output settlements.jsonl] [--patron 123456 ...]
+    flask --app app reconcile-payments 2026-09 [--output ledger.jsonl]
+    flask --app app query-plans [--patron 123456] [--scans-only]
+    flask --app app check-patrons [--repair]
+    flask --app app archive-loans [--older-than-days 365] [--batch-size 1000]
+"""
+
+import json
+import sys
+from datetime import datetime
+
+import click
+import database
+from querylog import configure_query_log, get_query_plans, reset_query_plans
+from services.library_service import (
+    calculate_late_fees_bulk, settle_fees_for_patrons, reconcile_payments, get_patron_status_report,
+    calculate_late_fee_for_book, get_catalog_page, search_books_in_catalog
+)
+from services.payment_service import PaymentGateway
+from services.import_service import import_books, IMPORT_FORMATS, DEFAULT_BATCH_SIZE
+from services.archive_service import archive_loans, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+@click.command('late-fees')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='Write NDJSON results to this file instead of stdout.')
+@click.option('--patron', 'patron_ids', multiple=True, help='Only include this patron ID (repeatable).')
+@click.option('--include-current', is_flag=True, help='Also list loans that are not overdue.')
+def late_fees_command(output, patron_ids, include_current):
+    """Compute late fees for all open loans (nightly billing run)."""
+    out = open(output, 'w') if output else sys.stdout
+    count = 0
+    total = 0.0
+    try:
+        for fee in calculate_late_fees_bulk(list(patron_ids) or None, not include_current):
+            out.write(json.dumps(fee) + '\n')
+            count += 1
+            total += fee['fee_amount']
+    finally:
+        if output:
+            out.close()
+    click.echo(f'{count} loans, ${total:.2f} in late fees', err=True)
+
+@click.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS),
+              help='Input format (default: taken from the file extension).')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows per insert batch.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Write rejected rows as NDJSON to this file (default: stderr).')
+def import_books_command(path, fmt, batch_size, errors_path):
+    """Bulk import books from a CSV or JSON Lines file."""
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+    if fmt not in IMPORT_FORMATS:
+        raise click.BadParameter('Use --format csv or --format jsonl.', param_hint='--format')
+    
+    errors_out = open(errors_path, 'w') if errors_path else sys.stderr
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            summary = import_books(stream, fmt, batch_size,
+                                   lambda error: errors_out.write(json.dumps(error) + '\n'))
+    finally:
+        if errors_path:
+            errors_out.close()
+    click.echo(f"{summary['rows']} rows: {summary['imported']} imported, {summary['failed']} rejected", err=True)
+
+@click.command('settle-fees')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='Write NDJSON results to this file instead of stdout.')
+@click.option('--patron', 'patron_ids', multiple=True, help='Only bill this patron ID (repeatable).')
+def settle_fees_command(output, patron_ids):
+    """Charge each patron once for all outstanding late fees (billing run)."""
+    out = open(output, 'w') if output else sys.stdout
+    charged = 0
+    failed = 0
+    total = 0.0
+    try:
+        for result in settle_fees_for_patrons(list(patron_ids) or None, PaymentGateway()):
+            out.write(json.dumps(result) + '\n')
+            if result['success']:
+                charged += 1
+                total += result['amount']
+            elif result['message'] != "No late fees to pay":
+                failed += 1
+    finally:
+        if output:
+            out.close()
+    click.echo(f'{charged} patrons charged ${total:.2f}, {failed} failed', err=True)
+
+@click.command('reconcile-payments')
+@click.argument('month')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help="Also write the month's ledger entries as NDJSON to this file.")
+def reconcile_payments_command(month, output):
+    """Month-end totals from the payments ledger (MONTH is YYYY-MM)."""
+    try:
+        report = reconcile_payments(month, include_entries=bool(output))
+    except ValueError:
+        raise click.BadParameter('Use the form YYYY-MM.', param_hint='MONTH')
+    
+    if output:
+        with open(output, 'w') as out:
+            for entry in report.pop('entries'):
+                out.write(json.dumps(entry) + '\n')
+    click.echo(json.dumps(report))
+
+def _run_read_paths(patron_id):
+    get_patron_status_report(patron_id)
+    calculate_late_fee_for_book(patron_id, 1)
+    for _ in calculate_late_fees_bulk(None):
+        pass
+    page = get_catalog_page()
+    if page['next_cursor']:
+        get_catalog_page(page['next_cursor'])
+    for search_type, term in (('title', 'the'), ('author', 'scott'), ('isbn', '9780743273565')):
+        search_books_in_catalog(term, search_type)
+    reconcile_payments(datetime.now().strftime('%Y-%m'))
+
+@click.command('query-plans')
+@click.option('--patron', 'patron_id', default='123456', show_default=True,
+              help='Patron whose loans and fees are looked up.')
+@click.option('--scans-only', is_flag=True, help='Only list queries that scan a whole table.')
+def query_plans_command(patron_id, scans_only):
+    """Run the main read paths once and print each query's plan, flagging full table scans."""
+    configure_query_log(None, explain=True)
+    database.configure_pool()
+    reset_query_plans()
+    try:
+        _run_read_paths(patron_id)
+    finally:
+        configure_query_log(None)
+        database.configure_pool()
+    
+    plans = get_query_plans()
+    for plan in plans:
+        if scans_only and not plan['full_scans']:
+            continue
+        click.echo(f"{plan['caller']}: {plan['sql']}")
+        for detail in plan['plan']:
+            click.echo(f'  {detail}')
+        for table in plan['full_scans']:
+            click.echo(f'  ! full table scan of {table}')
+    scans = sum(1 for plan in plans if plan['full_scans'])
+    click.echo(f'{len(plans)} queries, {scans} with full table scans', err=True)
+
+@click.command('check-patrons')
+@click.option('--repair', is_flag=True, help='Rebuild the counters if any have drifted.')
+def check_patrons_command(repair):
+    """Recount open loans and report patrons whose stored counters have drifted."""
+    report = database.check_patron_counters(repair)
+    for drift in report['drift']:
+        click.echo(json.dumps(drift))
+    action = 'repaired' if report['repaired'] else 'found'
+    click.echo(f"{report['patrons_checked']} patrons checked, {len(report['drift'])} with drift {action}", err=True)
+    if report['drift'] and not report['repaired']:
+        sys.exit(1)
+
+@click.command('archive-loans')
+@click.option('--older-than-days', default=ARCHIVE_AFTER_DAYS, show_default=True, type=click.IntRange(min=0),
+              help='Archive loans returned more than this many days ago.')
+@click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True, type=click.IntRange(min=1),
+              help='Loans moved per transaction.')
+def archive_loans_command(older_than_days, batch_size):
+    """Move long-returned loans from borrow_records into loan_history."""
+    click.echo(json.dumps(archive_loans(older_than_days, batch_size)))
+
+def register_commands(app):
+    """Register all CLI commands with the Flask app."""
+    app.cli.add_command(late_fees_command)
+    app.cli.add_command(import_books_command)
+    app.cli.add_command(settle_fees_command)
+    app.cli.add_command(reconcile_payments_command)
+    app.cli.add_command(query_plans_command)
+    app.cli.add_command(check_patrons_command)
+    app.cli.add_command(archive_loans_command)
@@ -3,119 +3,945 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import queue
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from cache import LRUCache
+from metrics import count_statement, instrumented
+from querylog import connection_factory
+
+T = TypeVar('T')
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Connection pool configuration
+POOL_SIZE = 5
+BUSY_TIMEOUT_MS = 5000
+
+# Book lookup cache configuration
+BOOK_CACHE_SIZE = 4096
+BOOK_CACHE_TTL_SECONDS = 30.0
+
+# Pragmas applied to every connection handed out by the pool
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),       # negative value = size in KiB (~16 MB)
+    ('mmap_size', 134217728),     # 128 MB
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+)
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+    """Get a new, fully configured database connection (not pooled)."""
+    conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           factory=connection_factory())
     conn.row_factory = sqlite3.Row  # This enables column access by name
+    conn.set_trace_callback(count_statement)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
     return conn
 
+class ConnectionPool:
+    """
+    A small pool of reusable SQLite connections.
+
+    Each thread checks out at most one connection at a time: nested
+    ``connection()`` blocks on the same thread reuse it, and it is returned
+    to the pool when the outermost block exits. Up to ``size`` idle
+    connections are kept open; extra connections created under load are
+    closed on release instead of being pooled.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE):
+        if size < 1:
+            raise ValueError("Pool size must be a positive integer.")
+        self.database = database
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        return get_db_connection()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out this thread's connection for the duration of the block.
+
+        The outermost block commits on success and rolls back on error.
+        A block must end on the thread that entered it: one left open in an
+        abandoned generator and closed by the garbage collector elsewhere
+        raises RuntimeError instead of releasing that thread's connection.
+        """
+        owner = threading.get_ident()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._check_owner(owner)
+                self._local.depth -= 1
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if threading.get_ident() == owner and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._check_owner(owner)
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    @staticmethod
+    def _check_owner(owner: int) -> None:
+        if threading.get_ident() != owner:
+            raise RuntimeError("A pooled connection must be released by the thread that checked it out.")
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        """Close every idle connection and stop pooling new ones."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# Read-through cache for get_book_by_id/get_book_by_isbn; every write path
+# in this module invalidates the affected book after committing
+_book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL_SECONDS)
+
+# Callbacks notified with the list of newly inserted book rows after commit
+_book_insert_listeners: List[Callable[[List[Dict]], None]] = []
+
+def add_book_insert_listener(callback: Callable[[List[Dict]], None]) -> None:
+    """Register a callback run with the new book rows after books are inserted."""
+    _book_insert_listeners.append(callback)
+
+def _notify_books_inserted(books: List[Dict]) -> None:
+    for callback in _book_insert_listeners:
+        callback(books)
+
+# Callbacks run when get_catalog_version sees a version this process has not
+# seen yet, with the IDs of the books changed since (None if unknown)
+_catalog_change_listeners: List[Callable[[Optional[Set[int]]], None]] = []
+_seen_catalog_version: Optional[Tuple[str, int]] = None
+_seen_catalog_lock = threading.Lock()
+
+def add_catalog_change_listener(callback: Callable[[Optional[Set[int]]], None]) -> None:
+    """Register a callback run with the changed book IDs when the catalog version is seen to have moved."""
+    _catalog_change_listeners.append(callback)
+
+def _changed_book_ids(since: int, version: int) -> Optional[Set[int]]:
+    """Books changed by versions (since, version], or None if the change log no longer covers them."""
+    if version < since:
+        return None
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT book_id FROM catalog_changes WHERE version > ? AND version <= ?
+        ''', (since, version)).fetchall()
+    # Every version bump logs one row; fewer means the older ones were pruned
+    if len(rows) != version - since:
+        return None
+    return {row['book_id'] for row in rows}
+
+def _observe_catalog_version(version: int) -> None:
+    global _seen_catalog_version
+    seen = (DATABASE, version)
+    if _seen_catalog_version == seen:
+        return
+    with _seen_catalog_lock:
+        if _seen_catalog_version == seen:
+            return
+        # Other processes' writes never reach this process's invalidation
+        # calls, so drop the books changed since the last version seen (this
+        # process's own writes included: they are already invalidated, and
+        # dropping them again costs one cache miss each)
+        book_ids = None
+        if _seen_catalog_version is not None and _seen_catalog_version[0] == DATABASE:
+            book_ids = _changed_book_ids(_seen_catalog_version[1], version)
+        if book_ids is None:
+            _book_cache.clear()
+        else:
+            for book_id in book_ids:
+                _book_cache.invalidate(('id', DATABASE, book_id))
+        for callback in _catalog_change_listeners:
+            callback(book_ids)
+        # Recorded last, so concurrent readers of the same version wait for
+        # the callbacks instead of serving what they are refreshing
+        _seen_catalog_version = seen
+
+def configure_pool(size: int = POOL_SIZE) -> ConnectionPool:
+    """(Re)create the shared connection pool, closing the previous one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DATABASE, size)
+        return _pool
+
+def get_pool() -> ConnectionPool:
+    """Return the shared connection pool, creating it on first use."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.database == DATABASE:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            size = _pool.size if _pool is not None else POOL_SIZE
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE, size)
+        return _pool
+
+@contextmanager
+def db_connection() -> Iterator[sqlite3.Connection]:
+    """Context manager yielding a pooled connection; commits on success."""
+    with get_pool().connection() as conn:
+        yield conn
+
+# Transaction retry configuration
+BUSY_RETRIES = 3
+BUSY_BACKOFF_SECONDS = 0.05
+
+# Contention counters, reported by get_transaction_stats()
+_transaction_stats = {'transactions': 0, 'busy_retries': 0, 'busy_failures': 0}
+_stats_lock = threading.Lock()
+
+class DatabaseBusyError(Exception):
+    """Raised when a write transaction cannot acquire the database lock."""
+
+def _is_busy_error(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def _record_stat(name: str) -> None:
+    with _stats_lock:
+        _transaction_stats[name] += 1
+
+def get_transaction_stats() -> Dict[str, int]:
+    """Get counts of write transactions and SQLITE_BUSY retries/failures."""
+    with _stats_lock:
+        return dict(_transaction_stats)
+
+def run_in_transaction(work: Callable[[sqlite3.Connection], T], retries: int = BUSY_RETRIES) -> T:
+    """
+    Run ``work(conn)`` inside a single ``BEGIN IMMEDIATE`` transaction.
+
+    The write lock is taken up front so the reads done by ``work`` cannot
+    be invalidated by another writer before it commits; when called inside
+    an open transaction ``work`` simply joins it. If the database
+    stays locked past the busy timeout the whole transaction is retried
+    with a short backoff, and DatabaseBusyError is raised once the retries
+    are exhausted.
+    """
+    _record_stat('transactions')
+    for attempt in range(retries + 1):
+        try:
+            with db_connection() as conn:
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                return work(conn)
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e):
+                raise
+            if attempt == retries:
+                _record_stat('busy_failures')
+                raise DatabaseBusyError(str(e)) from e
+            _record_stat('busy_retries')
+            time.sleep(BUSY_BACKOFF_SECONDS * (attempt + 1))
+
 def init_database():
     """Initialize the database with required tables."""
-    conn = get_db_connection()
+    with db_connection() as conn:
+        # Create books table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                isbn TEXT UNIQUE NOT NULL,
+                total_copies INTEGER NOT NULL,
+                available_copies INTEGER NOT NULL
+            )
+        ''')
+        
+        # Create borrow_records table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS borrow_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patron_id TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                borrow_date TEXT NOT NULL,
+                due_date TEXT NOT NULL,
+                return_date TEXT,
+                FOREIGN KEY (book_id) REFERENCES books (id)
+            )
+        ''')
+    
+    migrate_database()
+
+# Schema migrations
+#
+# Each migration is (version, description, steps). Steps are SQL strings or
+# callables taking the connection, and must be safe to re-run. Migrations
+# are applied in version order, each in its own transaction, and recorded
+# in the schema_version table.
+
+def _create_books_fts(conn: sqlite3.Connection) -> None:
+    """Create the trigram FTS5 index over book titles/authors, if FTS5 is available."""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, content='books', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 (or older than 3.34): search falls back to LIKE
+        return
     
-    # Create books table
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            isbn TEXT UNIQUE NOT NULL,
-            total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+# Tables whose changes bump the catalog version, and the trigger events that do
+CATALOG_VERSION_TRIGGERS = (
+    ('books', 'INSERT'), ('books', 'UPDATE'), ('books', 'DELETE'),
+    ('borrow_records', 'INSERT'), ('borrow_records', 'UPDATE'), ('borrow_records', 'DELETE'),
+)
+
+def _create_catalog_version(conn: sqlite3.Connection) -> None:
+    """Create the one-row catalog version table and the triggers that bump it."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            modified_at TEXT NOT NULL
         )
     ''')
-    
-    # Create borrow_records table
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        INSERT OR IGNORE INTO catalog_version (id, version, modified_at)
+        VALUES (1, 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    ''')
+    # Triggers run inside the writing transaction, so every write path
+    # (including bulk imports) bumps the version exactly when it commits
+    for table, event in CATALOG_VERSION_TRIGGERS:
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_catalog_version AFTER {event} ON {table} BEGIN
+                UPDATE catalog_version
+                SET version = version + 1, modified_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                WHERE id = 1;
+            END
+        ''')
+
+# Changes kept in catalog_changes; a process that falls further behind than
+# this drops its whole book cache instead of the changed books
+CATALOG_CHANGE_LOG_SIZE = 10000
+
+def _log_catalog_changes(conn: sqlite3.Connection) -> None:
+    """Create catalog_changes and make every catalog version bump log the book it changed."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            version INTEGER PRIMARY KEY,
+            book_id INTEGER NOT NULL
+        )
+    ''')
+    for table, event in CATALOG_VERSION_TRIGGERS:
+        row = 'old' if event == 'DELETE' else 'new'
+        book_id = f'{row}.id' if table == 'books' else f'{row}.book_id'
+        # Archiving closed loans changes nothing the HTTP validators cover
+        when = 'WHEN old.return_date IS NULL' if (table, event) == ('borrow_records', 'DELETE') else ''
+        conn.execute(f'DROP TRIGGER IF EXISTS {table}_{event.lower()}_catalog_version')
+        conn.execute(f'''
+            CREATE TRIGGER {table}_{event.lower()}_catalog_version AFTER {event} ON {table} {when} BEGIN
+                UPDATE catalog_version
+                SET version = version + 1, modified_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                WHERE id = 1;
+                INSERT INTO catalog_changes (version, book_id)
+                SELECT version, {book_id} FROM catalog_version WHERE id = 1;
+                DELETE FROM catalog_changes
+                WHERE version <= (SELECT version FROM catalog_version WHERE id = 1) - {CATALOG_CHANGE_LOG_SIZE};
+            END
+        ''')
+
+# Earliest due date among a patron's open loans, for use inside trigger bodies
+_PATRON_NEXT_DUE = '''(
+    SELECT MIN(due_date) FROM borrow_records WHERE patron_id = {row}.patron_id AND return_date IS NULL
+)'''
+
+def _create_patrons(conn: sqlite3.Connection) -> None:
+    """Create the per-patron loan counters, the triggers that maintain them, and backfill them."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patrons (
+            patron_id TEXT PRIMARY KEY,
+            active_loans INTEGER NOT NULL DEFAULT 0 CHECK (active_loans >= 0),
+            next_due_date TEXT
+        ) WITHOUT ROWID
+    ''')
+    # A new open loan: count it, and it may now be the first one due
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_insert_patron AFTER INSERT ON borrow_records
+        WHEN new.return_date IS NULL BEGIN
+            INSERT INTO patrons (patron_id, active_loans, next_due_date)
+            VALUES (new.patron_id, 1, new.due_date)
+            ON CONFLICT (patron_id) DO UPDATE SET
+                active_loans = active_loans + 1,
+                next_due_date = MIN(COALESCE(next_due_date, excluded.next_due_date), excluded.next_due_date);
+        END
+    ''')
+    # Setting return_date closes a loan; clearing it again reopens one
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_return_patron AFTER UPDATE OF return_date ON borrow_records
+        WHEN old.return_date IS NULL AND new.return_date IS NOT NULL BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1, next_due_date = {_PATRON_NEXT_DUE.format(row='new')}
+            WHERE patron_id = new.patron_id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_reopen_patron AFTER UPDATE OF return_date ON borrow_records
+        WHEN old.return_date IS NOT NULL AND new.return_date IS NULL BEGIN
+            INSERT INTO patrons (patron_id, active_loans, next_due_date)
+            VALUES (new.patron_id, 1, new.due_date)
+            ON CONFLICT (patron_id) DO UPDATE SET
+                active_loans = active_loans + 1, next_due_date = {_PATRON_NEXT_DUE.format(row='new')};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_delete_patron AFTER DELETE ON borrow_records
+        WHEN old.return_date IS NULL BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1, next_due_date = {_PATRON_NEXT_DUE.format(row='old')}
+            WHERE patron_id = old.patron_id;
+        END
+    ''')
+    _rebuild_patrons_in(conn)
+
+def _rebuild_patrons_in(conn: sqlite3.Connection) -> None:
+    """Recompute every patron's counters from the open borrow records."""
+    conn.execute('UPDATE patrons SET active_loans = 0, next_due_date = NULL')
+    conn.execute('''
+        INSERT INTO patrons (patron_id, active_loans, next_due_date)
+        SELECT patron_id, COUNT(*), MIN(due_date) FROM borrow_records
+        WHERE return_date IS NULL
+        GROUP BY patron_id
+        ON CONFLICT (patron_id) DO UPDATE SET
+            active_loans = excluded.active_loans, next_due_date = excluded.next_due_date
+    ''')
+
+# Columns of a loan, shared by the hot borrow_records table and loan_history
+LOAN_COLUMNS = 'id, patron_id, book_id, borrow_date, due_date, return_date'
+
+def _create_loan_history(conn: sqlite3.Connection) -> None:
+    """Create the archive of closed loans and the view over open, recent and archived loans."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS loan_history (
+            id INTEGER PRIMARY KEY,
             patron_id TEXT NOT NULL,
             book_id INTEGER NOT NULL,
             borrow_date TEXT NOT NULL,
             due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
+            return_date TEXT NOT NULL,
+            archived_at TEXT NOT NULL
         )
     ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_loan_history_patron ON loan_history (patron_id, borrow_date)')
+    # Finds the loans due for archiving without reading the open ones
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_closed
+        ON borrow_records (return_date) WHERE return_date IS NOT NULL
+    ''')
+    conn.execute(f'''
+        CREATE VIEW IF NOT EXISTS loan_records AS
+        SELECT {LOAN_COLUMNS} FROM borrow_records
+        UNION ALL
+        SELECT {LOAN_COLUMNS} FROM loan_history
+    ''')
+    # Archiving closed loans changes nothing the HTTP validators cover
+    conn.execute('DROP TRIGGER IF EXISTS borrow_records_delete_catalog_version')
+    conn.execute('''
+        CREATE TRIGGER borrow_records_delete_catalog_version AFTER DELETE ON borrow_records
+        WHEN old.return_date IS NULL BEGIN
+            UPDATE catalog_version
+            SET version = version + 1, modified_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            WHERE id = 1;
+        END
+    ''')
+
+# Whole seconds since the epoch of a stored timestamp. Timestamps are naive
+# local times, read here (and by epoch_seconds) as if they were UTC, so the
+# two agree and differences between them are exact
+_DUE_AT = "CAST(strftime('%s', due_date) AS INTEGER)"
+
+def epoch_seconds(moment: datetime) -> int:
+    """A naive timestamp as whole seconds on the scale of the due_at column."""
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+def _add_due_at(conn: sqlite3.Connection) -> None:
+    """Add the integer due_at column, backfill it from due_date, and index it for open loans."""
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(borrow_records)')]
+    if 'due_at' not in columns:
+        conn.execute('ALTER TABLE borrow_records ADD COLUMN due_at INTEGER')
+    conn.execute(f'UPDATE borrow_records SET due_at = {_DUE_AT} WHERE due_at IS NULL')
+    # This module's writers set due_at themselves; the triggers cover any other
+    # writer, and loans whose due_date is changed in place
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_insert_due_at AFTER INSERT ON borrow_records
+        WHEN new.due_at IS NULL BEGIN
+            UPDATE borrow_records SET due_at = {_DUE_AT} WHERE id = new.id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_update_due_at AFTER UPDATE OF due_date ON borrow_records BEGIN
+            UPDATE borrow_records SET due_at = {_DUE_AT} WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+        ON borrow_records (due_at) WHERE return_date IS NULL
+    ''')
+
+# Lease given to payment jobs left unfinished by code that predates leases
+PAYMENT_JOB_BACKFILL_LEASE = timedelta(minutes=10)
+
+def _add_payment_job_leases(conn: sqlite3.Connection) -> None:
+    """Add the owner and lease columns that let live processes reclaim orphaned payment jobs."""
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(payment_jobs)')]
+    if 'owner' not in columns:
+        conn.execute('ALTER TABLE payment_jobs ADD COLUMN owner TEXT')
+    if 'lease_expires_at' not in columns:
+        conn.execute('ALTER TABLE payment_jobs ADD COLUMN lease_expires_at TEXT')
+    # Processes still running the old code may be working on these; give
+    # them time to finish before the jobs can be reclaimed
+    conn.execute('''
+        UPDATE payment_jobs SET lease_expires_at = ? WHERE finished_at IS NULL AND lease_expires_at IS NULL
+    ''', ((datetime.now() + PAYMENT_JOB_BACKFILL_LEASE).isoformat(),))
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payment_jobs_lease
+        ON payment_jobs (lease_expires_at) WHERE finished_at IS NULL
+    ''')
+
+# Overdue status and whole days overdue of ``br``, against a bound epoch_seconds(now)
+_OVERDUE_COLUMNS = 'br.due_at < ? AS is_overdue, MAX(0, (? - br.due_at) / 86400) AS days_overdue'
+
+def _open_loans_source(all_patrons_due_before: bool) -> str:
+    """FROM clause for open loans; pass True when filtering only on due date."""
+    # Without statistics the planner walks every open loan in patron order to
+    # skip the sort. Reading the due date index and sorting is faster however
+    # many loans match: due order follows insertion order, so the table is
+    # read sequentially
+    if all_patrons_due_before:
+        return 'borrow_records br INDEXED BY idx_borrow_records_open_due'
+    return 'borrow_records br'
+
+MIGRATIONS = [
+    (1,'Partial indexes for open borrow records', [
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_open_patron
+           ON borrow_records (patron_id, borrow_date) WHERE return_date IS NULL''',
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_open_book_patron
+           ON borrow_records (book_id, patron_id) WHERE return_date IS NULL''',
+    ]),
+    (2, 'Trigram full-text index over book titles and authors', [
+        _create_books_fts,
+    ]),
+    (3, 'Title index for keyset-paginated catalog listing', [
+        'CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)',
+    ]),
+    (4, 'Late fee allocations recorded by fee settlement', [
+        '''CREATE TABLE IF NOT EXISTS fee_allocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            borrow_record_id INTEGER NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            payment_reference TEXT NOT NULL,
+            paid_at TEXT NOT NULL,
+            FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_fee_allocations_record ON fee_allocations (borrow_record_id)',
+    ]),
+    (5, 'Payments ledger for late fee charges and refunds', [
+        '''CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('payment', 'refund')),
+            patron_id TEXT NOT NULL,
+            amount REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_charge
+           ON payments (transaction_id) WHERE kind = 'payment' ''',
+        'CREATE INDEX IF NOT EXISTS idx_payments_transaction ON payments (transaction_id, kind)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_patron ON payments (patron_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_created ON payments (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_fee_allocations_reference ON fee_allocations (payment_reference)',
+    ]),
+    (6, 'Catalog version counter for HTTP validators', [
+        _create_catalog_version,
+    ]),
+    (7, 'Per-patron open loan counters maintained by triggers', [
+        _create_patrons,
+    ]),
+    (8, 'Loan history archive and loan_records view', [
+        _create_loan_history,
+    ]),
+    (9, 'Integer due times for overdue checks in SQL', [
+        _add_due_at,
+    ]),
+    (10, 'Payment jobs shared by every server process', [
+        '''CREATE TABLE IF NOT EXISTS payment_jobs (
+            job_id TEXT PRIMARY KEY,
+            idempotency_key TEXT UNIQUE NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('queued', 'processing', 'succeeded', 'failed')),
+            message TEXT,
+            submitted_at TEXT NOT NULL,
+            finished_at TEXT
+        )''',
+        '''CREATE INDEX IF NOT EXISTS idx_payment_jobs_finished
+           ON payment_jobs (finished_at) WHERE finished_at IS NOT NULL''',
+    ]),
+    (11, 'Log of the books changed by each catalog version', [
+        _log_catalog_changes,
+    ]),
+    (12, 'Leases for reclaiming orphaned payment jobs', [
+        _add_payment_job_leases,
+    ]),
+]
+
+def get_schema_version() -> int:
+    """Get the highest migration version applied to the database."""
+    with db_connection() as conn:
+        table = conn.execute('''
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'
+        ''').fetchone()
+        if not table:
+            return 0
+        version = conn.execute('SELECT MAX(version) as version FROM schema_version').fetchone()['version']
+    return version or 0
+
+def migrate_database() -> List[int]:
+    """
+    Apply any pending schema migrations.
+
+    Returns:
+        list: Versions applied by this call (empty if already up to date)
+    """
+    with db_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        ''')
     
-    conn.commit()
-    conn.close()
+    applied = []
+    for version, description, steps in sorted(MIGRATIONS, key=lambda m: m[0]):
+        def work(conn):
+            # Re-check under the write lock in case another process migrated first
+            done = conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone()
+            if done:
+                return False
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('''
+                INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)
+            ''', (version, description, datetime.now().isoformat()))
+            return True
+        
+        if run_in_transaction(work):
+            applied.append(version)
+    
+    return applied
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
-    conn = get_db_connection()
-    book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-    
-    if book_count == 0:
-        # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
+    with db_connection() as conn:
+        book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
         
-        for title, author, isbn, copies in sample_books:
+        if book_count == 0:
+            # Add sample books
+            sample_books = [
+                ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                ('1984', 'George Orwell', '9780451524935', 1)
+            ]
+            
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
+            
+            # Make 1984 unavailable by adding a borrow record
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
-        
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
-    
-    conn.close()
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
 
 # Helper Functions for Database Operations
 
+@instrumented
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    with db_connection() as conn:
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
     return [dict(book) for book in books]
 
+@instrumented
+def iter_books(batch_size: int = 1000, after_id: int = 0) -> Iterator[Dict]:
+    """Stream every book (with an ID above ``after_id``) in id order without loading the whole table."""
+    last_id = after_id
+    while True:
+        with db_connection() as conn:
+            rows = conn.execute('''
+                SELECT * FROM books WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+        last_id = rows[-1]['id']
+
+@instrumented
+def get_books_by_ids(book_ids: List[int]) -> List[Dict]:
+    """Get several books by ID, in the order the IDs are given (missing IDs are skipped)."""
+    if not book_ids:
+        return []
+    with db_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT * FROM books WHERE id IN ({', '.join('?' * len(book_ids))})
+        ''', book_ids).fetchall()
+    by_id = {row['id']: dict(row) for row in rows}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+@instrumented
+def get_books_page(cursor: Optional[Tuple[str, int]] = None, limit: int = 50,
+                   backward: bool = False) -> Tuple[List[Dict], bool]:
+    """
+    Get one page of books in (title, id) order using keyset pagination.
+
+    Args:
+        cursor: (title, id) of the row to page from; None for the first page
+        limit: Maximum number of books to return
+        backward: Return the page before ``cursor`` instead of after it
+
+    Returns:
+        tuple: (books in ascending order, whether more rows exist in the
+        paging direction)
+    """
+    if backward:
+        where, order = '(title, id) < (?, ?)', 'title DESC, id DESC'
+    else:
+        where, order = '(title, id) > (?, ?)', 'title, id'
+    if cursor is None:
+        where, params = '1', ()
+    else:
+        params = tuple(cursor)
+    
+    with db_connection() as conn:
+        books = conn.execute(f'''
+            SELECT * FROM books WHERE {where} ORDER BY {order} LIMIT ?
+        ''', params + (limit + 1,)).fetchall()
+    
+    has_more = len(books) > limit
+    books = [dict(book) for book in books[:limit]]
+    if backward:
+        books.reverse()
+    return books, has_more
+
+@instrumented
+def get_catalog_version() -> Dict:
+    """
+    Get the catalog version, bumped by every change to books or borrow records.
+
+    Reading a version this process has not seen before clears the book cache
+    and runs the catalog change listeners, so caches filled before another
+    process's writes are not served after them.
+
+    Returns:
+        dict: Contains version (int) and modified_at (UTC datetime of the last change)
+    """
+    with db_connection() as conn:
+        row = conn.execute('SELECT version, modified_at FROM catalog_version WHERE id = 1').fetchone()
+    modified_at = datetime.strptime(row['modified_at'], '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+    _observe_catalog_version(row['version'])
+    return {'version': row['version'], 'modified_at': modified_at}
+
+@instrumented
 def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    """Get a specific book by ID (served from the book cache when possible)."""
+    key = ('id', DATABASE, book_id)
+    book = _book_cache.get(key)
+    if book is not None:
+        return dict(book)
+    
+    generation = _book_cache.generation()
+    with db_connection() as conn:
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    if not book:
+        return None
+    book = dict(book)
+    _book_cache.put(key, book, generation)
+    return dict(book)
 
+@instrumented
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
-
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
-    """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
+    """Get a specific book by ISBN (served from the book cache when possible)."""
+    # ISBN -> id never changes once a book exists, so only the id entry
+    # needs invalidating on writes
+    book_id = _book_cache.get(('isbn', DATABASE, isbn))
+    if book_id is not None:
+        book = get_book_by_id(book_id)
+        if book is not None:
+            return book
+    
+    generation = _book_cache.generation()
+    with db_connection() as conn:
+        book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    if not book:
+        return None
+    book = dict(book)
+    _book_cache.put(('isbn', DATABASE, isbn), book['id'], generation)
+    _book_cache.put(('id', DATABASE, book['id']), book, generation)
+    return dict(book)
+
+def invalidate_book_cache(book_id: Optional[int] = None) -> None:
+    """Drop one book (or every book, if book_id is None) from the book cache."""
+    if book_id is None:
+        _book_cache.clear()
+    else:
+        _book_cache.invalidate(('id', DATABASE, book_id))
+
+def get_book_cache_stats() -> Dict[str, int]:
+    """Get book cache size and hit/miss/eviction counters."""
+    return _book_cache.stats()
+
+# Catalog search
+
+# Trigram tokens need at least this many characters to match
+FTS_MIN_TERM_LENGTH = 3
+
+def _has_books_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'
+    ''').fetchone() is not None
+
+@instrumented
+def search_books(search_term: str, search_type: str, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Search books by title/author (case-insensitive partial match) or ISBN (exact match).
+
+    Title and author searches go through the books_fts trigram index and
+    are ranked by relevance (bm25), then title. ISBN searches are a single
+    lookup on the unique ISBN index.
+    """
+    if search_type == 'isbn':
+        # Not served from the book cache: search pages are not behind a
+        # catalog version check, so a cached row could predate another
+        # process's write
+        with db_connection() as conn:
+            book = conn.execute('SELECT * FROM books WHERE isbn = ?', (search_term,)).fetchone()
+        return [dict(book)] if book else []
+    
+    if search_type not in ('title', 'author'):
+        return []
+    
+    limit_clause = 'LIMIT ?' if limit is not None else ''
+    limit_params = (limit,) if limit is not None else ()
+    with db_connection() as conn:
+        if len(search_term) >= FTS_MIN_TERM_LENGTH and _has_books_fts(conn):
+            # Quote the term as an FTS phrase so punctuation is matched literally
+            phrase = '"' + search_term.replace('"', '""') + '"'
+            books = conn.execute(f'''
+                SELECT b.* FROM books_fts f 
+                JOIN books b ON b.id = f.rowid 
+                WHERE books_fts MATCH ? 
+                ORDER BY f.rank, b.title 
+                {limit_clause}
+            ''', (f'{search_type} : {phrase}',) + limit_params).fetchall()
+        else:
+            pattern = '%' + search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            books = conn.execute(f'''
+                SELECT * FROM books WHERE {search_type} LIKE ? ESCAPE '\\' 
+                ORDER BY title 
+                {limit_clause}
+            ''', (pattern,) + limit_params).fetchall()
+    return [dict(book) for book in books]
+
+@instrumented
+def get_patron_borrowed_books(patron_id: str, now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Get currently borrowed books for a patron.
+
+    ``is_overdue`` and ``days_overdue`` are computed in the query, as of
+    ``now`` (default: the current time).
+    """
+    now_at = epoch_seconds(now or datetime.now())
+    with db_connection() as conn:
+        records = conn.execute(f'''
+            SELECT br.book_id, br.borrow_date, br.due_date, b.title, b.author, {_OVERDUE_COLUMNS},
+                   (SELECT COALESCE(SUM(fa.amount), 0) FROM fee_allocations fa 
+                    WHERE fa.borrow_record_id = br.id) as paid_amount 
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ? AND br.return_date IS NULL
+            ORDER BY br.borrow_date
+        ''', (now_at, now_at, patron_id)).fetchall()
     
     borrowed_books = []
     for record in records:
@@ -125,77 +951,680 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
             'author': record['author'],
             'borrow_date': datetime.fromisoformat(record['borrow_date']),
             'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
+            'is_overdue': bool(record['is_overdue']),
+            'days_overdue': record['days_overdue'],
+            'paid_amount': round(record['paid_amount'], 2)
         })
     
     return borrowed_books
 
+@instrumented
+def iter_open_loans(patron_ids: Optional[List[str]] = None, due_before: Optional[datetime] = None,
+                    batch_size: int = 1000, now: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Stream open borrow records, optionally filtered by patron and due date.
+
+    Rows are fetched from a single query in batches of ``batch_size`` so
+    memory stays bounded however many loans are open. Each carries
+    ``is_overdue`` and ``days_overdue`` as of ``now``, computed in SQL.
+    """
+    now_at = epoch_seconds(now or datetime.now())
+    conditions = ['br.return_date IS NULL']
+    params = [now_at, now_at]
+    if patron_ids is not None:
+        conditions.append(f"br.patron_id IN ({', '.join('?' * len(patron_ids))})")
+        params.extend(patron_ids)
+    if due_before is not None:
+        conditions.append('br.due_at < ?')
+        params.append(epoch_seconds(due_before))
+    
+    with db_connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT br.id, br.patron_id, br.book_id, br.borrow_date, br.due_date, b.title, {_OVERDUE_COLUMNS}
+            FROM {_open_loans_source(patron_ids is None and due_before is not None)} 
+            JOIN books b ON br.book_id = b.id 
+            WHERE {' AND '.join(conditions)}
+            ORDER BY br.patron_id, br.borrow_date
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield {
+                    'record_id': row['id'],
+                    'patron_id': row['patron_id'],
+                    'book_id': row['book_id'],
+                    'title': row['title'],
+                    'borrow_date': datetime.fromisoformat(row['borrow_date']),
+                    'due_date': datetime.fromisoformat(row['due_date']),
+                    'is_overdue': bool(row['is_overdue']),
+                    'days_overdue': row['days_overdue']
+                }
+
+@instrumented
+def iter_unpaid_overdue_loans(patron_ids: Optional[List[str]], now: datetime, book_id: Optional[int] = None,
+                              batch_size: int = 1000) -> Iterator[Dict]:
+    """
+    Stream overdue open loans with the late fees already paid against each.
+
+    One query, ordered by patron, so callers can settle patron by patron.
+    """
+    now_at = epoch_seconds(now)
+    conditions = ['br.return_date IS NULL', 'br.due_at < ?']
+    params = [now_at, now_at, now_at]
+    if patron_ids is not None:
+        conditions.append(f"br.patron_id IN ({', '.join('?' * len(patron_ids))})")
+        params.extend(patron_ids)
+    if book_id is not None:
+        conditions.append('br.book_id = ?')
+        params.append(book_id)
+    
+    with db_connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT br.id, br.patron_id, br.book_id, br.due_date, b.title, {_OVERDUE_COLUMNS},
+                   COALESCE(SUM(fa.amount), 0) as paid_amount 
+            FROM {_open_loans_source(patron_ids is None and book_id is None)} 
+            JOIN books b ON br.book_id = b.id 
+            LEFT JOIN fee_allocations fa ON fa.borrow_record_id = br.id 
+            WHERE {' AND '.join(conditions)}
+            GROUP BY br.id 
+            ORDER BY br.patron_id, br.borrow_date
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield {
+                    'record_id': row['id'],
+                    'patron_id': row['patron_id'],
+                    'book_id': row['book_id'],
+                    'title': row['title'],
+                    'due_date': datetime.fromisoformat(row['due_date']),
+                    'days_overdue': row['days_overdue'],
+                    'paid_amount': row['paid_amount']
+                }
+
+def _active_loans_in(conn: sqlite3.Connection, patron_id: str) -> int:
+    row = conn.execute('SELECT active_loans FROM patrons WHERE patron_id = ?', (patron_id,)).fetchone()
+    return row['active_loans'] if row else 0
+
+@instrumented
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
-    return count
+    with db_connection() as conn:
+        return _active_loans_in(conn, patron_id)
+
+@instrumented
+def get_patron_loan_summary(patron_id: str) -> Dict:
+    """
+    Get a patron's open loan count and earliest due date (None without open loans).
+
+    Read from the trigger-maintained patrons table by primary key.
+    """
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT active_loans, next_due_date FROM patrons WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()
+    if not row or not row['next_due_date']:
+        return {'active_loans': row['active_loans'] if row else 0, 'next_due_date': None}
+    return {'active_loans': row['active_loans'], 'next_due_date': datetime.fromisoformat(row['next_due_date'])}
+
+@instrumented
+def check_patron_counters(repair: bool = False) -> Dict:
+    """
+    Recount every patron's open loans from borrow_records and compare with the patrons table.
+
+    The triggers keep the counters exact for every write that goes through
+    SQLite; drift means rows were changed while the triggers were missing,
+    or an open loan's patron or due date was edited in place. With
+    ``repair``, the table is rebuilt in the same transaction.
+
+    Returns:
+        dict: patrons_checked, drift (each mismatched patron_id with its
+        stored and recounted active_loans and next_due_date) and repaired
+    """
+    def work(conn):
+        rows = conn.execute('''
+            WITH actual AS (
+                SELECT patron_id, COUNT(*) AS active_loans, MIN(due_date) AS next_due_date
+                FROM borrow_records WHERE return_date IS NULL GROUP BY patron_id
+            )
+            SELECT p.patron_id, p.active_loans AS stored_loans, p.next_due_date AS stored_due,
+                   COALESCE(a.active_loans, 0) AS actual_loans, a.next_due_date AS actual_due
+            FROM patrons p LEFT JOIN actual a ON a.patron_id = p.patron_id
+            UNION ALL
+            SELECT a.patron_id, NULL, NULL, a.active_loans, a.next_due_date
+            FROM actual a WHERE a.patron_id NOT IN (SELECT patron_id FROM patrons)
+        ''').fetchall()
+        drift = [{
+            'patron_id': row['patron_id'],
+            'stored': {'active_loans': row['stored_loans'], 'next_due_date': row['stored_due']},
+            'actual': {'active_loans': row['actual_loans'], 'next_due_date': row['actual_due']},
+        } for row in rows if (row['stored_loans'], row['stored_due']) != (row['actual_loans'], row['actual_due'])]
+        if repair and drift:
+            _rebuild_patrons_in(conn)
+        return {'patrons_checked': len(rows), 'drift': drift, 'repaired': bool(repair and drift)}
+    
+    return run_in_transaction(work)
+
+@instrumented
+def archive_closed_loans(returned_before: datetime, batch_size: int = 1000) -> int:
+    """
+    Move up to ``batch_size`` loans returned before ``returned_before`` into loan_history.
+
+    Oldest returns go first, in one short write transaction per call; loans
+    keep their ids, so fee allocations still point at them.
 
+    Returns:
+        int: Number of loans archived (less than batch_size once none are left)
+    """
+    def work(conn):
+        batch = '''
+            SELECT id FROM borrow_records
+            WHERE return_date IS NOT NULL AND return_date < ?
+            ORDER BY return_date, id LIMIT ?
+        '''
+        params = (returned_before.isoformat(), batch_size)
+        conn.execute(f'''
+            INSERT INTO loan_history ({LOAN_COLUMNS}, archived_at)
+            SELECT {LOAN_COLUMNS}, ? FROM borrow_records WHERE id IN ({batch})
+        ''', (datetime.now().isoformat(),) + params)
+        return conn.execute(f'DELETE FROM borrow_records WHERE id IN ({batch})', params).rowcount
+    
+    return run_in_transaction(work)
+
+@instrumented
+def get_patron_loan_history(patron_id: str) -> List[Dict]:
+    """Get every loan a patron has made, open or returned, archived or not, newest first."""
+    with db_connection() as conn:
+        records = conn.execute('''
+            SELECT lr.*, b.title, b.author 
+            FROM loan_records lr 
+            JOIN books b ON lr.book_id = b.id 
+            WHERE lr.patron_id = ?
+            ORDER BY lr.borrow_date DESC
+        ''', (patron_id,)).fetchall()
+    
+    return [{
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': datetime.fromisoformat(record['borrow_date']),
+        'due_date': datetime.fromisoformat(record['due_date']),
+        'return_date': datetime.fromisoformat(record['return_date']) if record['return_date'] else None
+    } for record in records]
+
+@instrumented
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
+        with db_connection() as conn:
+            book_id = conn.execute('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (title, author, isbn, total_copies, available_copies)).lastrowid
+    except Exception:
+        return False
+    
+    invalidate_book_cache(book_id)
+    _notify_books_inserted([{
+        'id': book_id, 'title': title, 'author': author, 'isbn': isbn,
+        'total_copies': total_copies, 'available_copies': available_copies
+    }])
+    return True
+
+@instrumented
+def insert_books_bulk(books: List[Tuple[str, str, str, int]]) -> Tuple[int, Set[str]]:
+    """
+    Insert a batch of (title, author, isbn, total_copies) rows in one transaction.
+
+    ISBNs that already exist are looked up in one query and skipped; the
+    rest are inserted with executemany.
+
+    Returns:
+        tuple: (number of books inserted, set of ISBNs that already existed)
+    """
+    def work(conn):
+        isbns = [book[2] for book in books]
+        existing = {row['isbn'] for row in conn.execute(f'''
+            SELECT isbn FROM books WHERE isbn IN ({', '.join('?' * len(isbns))})
+        ''', isbns)}
+        new_books = [book for book in books if book[2] not in existing]
+        conn.executemany('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+        ''', ((title, author, isbn, copies, copies) for title, author, isbn, copies in new_books))
+        
+        inserted = []
+        if _book_insert_listeners and new_books:
+            new_isbns = [book[2] for book in new_books]
+            inserted = [dict(row) for row in conn.execute(f'''
+                SELECT * FROM books WHERE isbn IN ({', '.join('?' * len(new_isbns))})
+            ''', new_isbns)]
+        return len(new_books), existing, inserted
+    
+    if not books:
+        return 0, set()
+    count, existing, inserted = run_in_transaction(work)
+    if inserted:
+        _notify_books_inserted(inserted)
+    return count, existing
 
+@instrumented
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, due_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(), epoch_seconds(due_date)))
         return True
-    except Exception as e:
-        conn.close()
+    except Exception:
         return False
 
+@instrumented
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            conn.execute('''
+                UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+            ''', (change, book_id))
         return True
-    except Exception as e:
-        conn.close()
+    except Exception:
         return False
+    finally:
+        invalidate_book_cache(book_id)
 
+@instrumented
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
-    conn = get_db_connection()
     try:
+        with db_connection() as conn:
+            conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (return_date.isoformat(), patron_id, book_id))
+        return True
+    except Exception:
+        return False
+
+# Payments ledger
+
+def _insert_fee_allocations(conn: sqlite3.Connection, allocations: List[Dict], payment_reference: str,
+                            paid_at: datetime) -> None:
+    conn.executemany('''
+        INSERT INTO fee_allocations 
+            (borrow_record_id, patron_id, book_id, amount, payment_reference, paid_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(a['record_id'], a['patron_id'], a['book_id'], a['amount'],
+           payment_reference, paid_at.isoformat()) for a in allocations])
+
+@instrumented
+def record_payment(transaction_id: str, patron_id: str, amount: float, allocations: List[Dict],
+                   paid_at: datetime) -> bool:
+    """
+    Record a gateway charge in the payments ledger.
+
+    The ledger row and the split of the charge across borrow records
+    (each allocation needs record_id, patron_id, book_id and amount) are
+    written in one transaction.
+    """
+    def work(conn):
         conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
+            INSERT INTO payments (transaction_id, kind, patron_id, amount, created_at)
+            VALUES (?, 'payment', ?, ?, ?)
+        ''', (transaction_id, patron_id, amount, paid_at.isoformat()))
+        _insert_fee_allocations(conn, allocations, transaction_id, paid_at)
+    
+    try:
+        run_in_transaction(work)
         return True
-    except Exception as e:
-        conn.close()
+    except Exception:
         return False
+
+def _get_payment_in(conn: sqlite3.Connection, transaction_id: str) -> Optional[Dict]:
+    charge = conn.execute('''
+        SELECT transaction_id, patron_id, amount, created_at FROM payments 
+        WHERE transaction_id = ? AND kind = 'payment'
+    ''', (transaction_id,)).fetchone()
+    if not charge:
+        return None
+    
+    refunded = conn.execute('''
+        SELECT COALESCE(SUM(amount), 0) as refunded FROM payments 
+        WHERE transaction_id = ? AND kind = 'refund'
+    ''', (transaction_id,)).fetchone()['refunded']
+    payment = dict(charge)
+    payment['created_at'] = datetime.fromisoformat(payment['created_at'])
+    payment['refunded_amount'] = round(refunded, 2)
+    return payment
+
+@instrumented
+def get_payment(transaction_id: str) -> Optional[Dict]:
+    """Get a recorded charge with the total refunded against it so far."""
+    with db_connection() as conn:
+        return _get_payment_in(conn, transaction_id)
+
+@instrumented
+def record_refund(transaction_id: str, amount: float, refunded_at: datetime) -> bool:
+    """
+    Record a refund against a charge in the payments ledger.
+
+    The refund is checked against what is left of the original charge
+    inside the same transaction, and the fees it covered are reopened by
+    reversing the charge's allocations (oldest first) up to the refunded
+    amount. Returns False if the charge is unknown or over-refunded.
+    """
+    def work(conn):
+        payment = _get_payment_in(conn, transaction_id)
+        if payment is None or amount > round(payment['amount'] - payment['refunded_amount'], 2):
+            return False
+        
+        conn.execute('''
+            INSERT INTO payments (transaction_id, kind, patron_id, amount, created_at)
+            VALUES (?, 'refund', ?, ?, ?)
+        ''', (transaction_id, payment['patron_id'], amount, refunded_at.isoformat()))
+        
+        allocated = conn.execute('''
+            SELECT borrow_record_id, patron_id, book_id, SUM(amount) as amount 
+            FROM fee_allocations WHERE payment_reference = ? 
+            GROUP BY borrow_record_id HAVING SUM(amount) > 0 
+            ORDER BY MIN(id)
+        ''', (transaction_id,)).fetchall()
+        reversals = []
+        remaining = amount
+        for row in allocated:
+            if remaining <= 0:
+                break
+            reversed_amount = round(min(row['amount'], remaining), 2)
+            reversals.append({'record_id': row['borrow_record_id'], 'patron_id': row['patron_id'],
+                              'book_id': row['book_id'], 'amount': -reversed_amount})
+            remaining = round(remaining - reversed_amount, 2)
+        _insert_fee_allocations(conn, reversals, transaction_id, refunded_at)
+        return True
+    
+    try:
+        return run_in_transaction(work)
+    except Exception:
+        return False
+
+@instrumented
+def get_payment_totals(start: datetime, end: datetime) -> Dict:
+    """Sum charges and refunds recorded in [start, end) for reconciliation."""
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT kind, COUNT(*) as count, COALESCE(SUM(amount), 0) as total 
+            FROM payments WHERE created_at >= ? AND created_at < ? 
+            GROUP BY kind
+        ''', (start.isoformat(), end.isoformat())).fetchall()
+    
+    totals = {'payments': 0, 'payment_total': 0.00, 'refunds': 0, 'refund_total': 0.00}
+    for row in rows:
+        totals[f"{row['kind']}s"] = row['count']
+        totals[f"{row['kind']}_total"] = round(row['total'], 2)
+    totals['net_total'] = round(totals['payment_total'] - totals['refund_total'], 2)
+    return totals
+
+@instrumented
+def iter_payments(start: datetime, end: datetime, batch_size: int = 1000) -> Iterator[Dict]:
+    """Stream ledger entries recorded in [start, end), oldest first."""
+    with db_connection() as conn:
+        cursor = conn.execute('''
+            SELECT transaction_id, kind, patron_id, amount, created_at FROM payments 
+            WHERE created_at >= ? AND created_at < ? 
+            ORDER BY created_at, id
+        ''', (start.isoformat(), end.isoformat()))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+# Payment jobs
+
+_PAYMENT_JOB_COLUMNS = 'job_id, idempotency_key, patron_id, book_id, status, message, submitted_at, finished_at'
+
+@instrumented
+def create_payment_job(job_id: str, idempotency_key: str, patron_id: str, book_id: int, submitted_at: datetime,
+                       expire_before: datetime, owner: str, lease_until: datetime) -> Tuple[bool, Dict]:
+    """
+    Insert a queued payment job, or get the job already holding ``idempotency_key``.
+
+    The lookup and insert share one write transaction, so processes racing
+    on the same key agree on a single job. Jobs that finished before
+    ``expire_before`` are deleted first, releasing their keys. A new job
+    belongs to ``owner`` until ``lease_until`` unless the lease is renewed.
+
+    Returns:
+        tuple: (created, job) where created is False if the key was already used
+    """
+    def work(conn):
+        conn.execute('DELETE FROM payment_jobs WHERE finished_at < ?', (expire_before.isoformat(),))
+        existing = conn.execute(f'''
+            SELECT {_PAYMENT_JOB_COLUMNS} FROM payment_jobs WHERE idempotency_key = ?
+        ''', (idempotency_key,)).fetchone()
+        if existing:
+            return False, dict(existing)
+        
+        job = {
+            'job_id': job_id,
+            'idempotency_key': idempotency_key,
+            'patron_id': patron_id,
+            'book_id': book_id,
+            'status': 'queued',
+            'message': None,
+            'submitted_at': submitted_at.isoformat(),
+            'finished_at': None
+        }
+        conn.execute(f'''
+            INSERT INTO payment_jobs ({_PAYMENT_JOB_COLUMNS}, owner, lease_expires_at)
+            VALUES (:job_id, :idempotency_key, :patron_id, :book_id, :status, :message, :submitted_at, :finished_at,
+                    :owner, :lease_expires_at)
+        ''', dict(job, owner=owner, lease_expires_at=lease_until.isoformat()))
+        return True, job
+    
+    return run_in_transaction(work)
+
+@instrumented
+def get_payment_job(job_id: str) -> Optional[Dict]:
+    """Get a payment job by ID."""
+    with db_connection() as conn:
+        job = conn.execute(f'''
+            SELECT {_PAYMENT_JOB_COLUMNS} FROM payment_jobs WHERE job_id = ?
+        ''', (job_id,)).fetchone()
+    return dict(job) if job else None
+
+@instrumented
+def get_payment_job_by_key(idempotency_key: str) -> Optional[Dict]:
+    """Get the payment job holding an idempotency key."""
+    with db_connection() as conn:
+        job = conn.execute(f'''
+            SELECT {_PAYMENT_JOB_COLUMNS} FROM payment_jobs WHERE idempotency_key = ?
+        ''', (idempotency_key,)).fetchone()
+    return dict(job) if job else None
+
+@instrumented
+def start_payment_job(job_id: str, owner: str) -> bool:
+    """Mark a queued payment job as processing; returns False if it is not queued for ``owner``."""
+    with db_connection() as conn:
+        cursor = conn.execute('''
+            UPDATE payment_jobs SET status = 'processing' WHERE job_id = ? AND status = 'queued' AND owner = ?
+        ''', (job_id, owner))
+    return cursor.rowcount == 1
+
+@instrumented
+def finish_payment_job(job_id: str, owner: str, succeeded: bool, message: str, finished_at: datetime) -> bool:
+    """Record the outcome of a payment job; returns False if ``owner`` no longer holds it."""
+    with db_connection() as conn:
+        cursor = conn.execute('''
+            UPDATE payment_jobs SET status = ?, message = ?, finished_at = ? WHERE job_id = ? AND owner = ?
+        ''', ('succeeded' if succeeded else 'failed', message, finished_at.isoformat(), job_id, owner))
+    return cursor.rowcount == 1
+
+@instrumented
+def renew_payment_job_leases(owner: str, lease_until: datetime) -> int:
+    """Extend the leases of ``owner``'s unfinished payment jobs; returns how many were renewed."""
+    with db_connection() as conn:
+        cursor = conn.execute('''
+            UPDATE payment_jobs SET lease_expires_at = ? WHERE owner = ? AND finished_at IS NULL
+        ''', (lease_until.isoformat(), owner))
+    return cursor.rowcount
+
+@instrumented
+def claim_expired_payment_jobs(owner: str, now: datetime, lease_until: datetime, limit: int) -> List[Dict]:
+    """
+    Take over up to ``limit`` unfinished payment jobs whose lease ran out before ``now``.
+
+    Their owners stopped renewing (the process died or was replaced), so
+    the jobs are queued again under ``owner``.
+
+    Returns:
+        list: The claimed jobs, oldest first
+    """
+    def work(conn):
+        rows = conn.execute(f'''
+            SELECT {_PAYMENT_JOB_COLUMNS} FROM payment_jobs
+            WHERE finished_at IS NULL AND lease_expires_at < ?
+            ORDER BY submitted_at LIMIT ?
+        ''', (now.isoformat(), limit)).fetchall()
+        conn.executemany('''
+            UPDATE payment_jobs SET status = 'queued', owner = ?, lease_expires_at = ? WHERE job_id = ?
+        ''', [(owner, lease_until.isoformat(), row['job_id']) for row in rows])
+        return [dict(row, status='queued') for row in rows]
+    
+    if limit < 1:
+        return []
+    return run_in_transaction(work)
+
+# Atomic circulation operations
+
+def _checkout_in(conn: sqlite3.Connection, patron_id: str, book_id: int, borrow_date: datetime,
+                 due_date: datetime, borrowing_limit: int) -> Tuple[str, Optional[Dict]]:
+    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    if not book:
+        return 'not_found', None
+    book = dict(book)
+    
+    if book['available_copies'] <= 0:
+        return 'unavailable', book
+    
+    if _active_loans_in(conn, patron_id) >= borrowing_limit:
+        return 'limit_reached', book
+    
+    updated = conn.execute('''
+        UPDATE books SET available_copies = available_copies - 1 
+        WHERE id = ? AND available_copies > 0
+    ''', (book_id,)).rowcount
+    if updated == 0:
+        return 'unavailable', book
+    
+    conn.execute('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, due_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(), epoch_seconds(due_date)))
+    return 'ok', book
+
+def _checkin_in(conn: sqlite3.Connection, patron_id: str, book_id: int,
+                return_date: datetime) -> Tuple[str, Optional[Dict]]:
+    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    if not book:
+        return 'not_found', None
+    book = dict(book)
+    
+    updated = conn.execute('''
+        UPDATE borrow_records SET return_date = ? 
+        WHERE id = (
+            SELECT id FROM borrow_records 
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ORDER BY borrow_date LIMIT 1
+        )
+    ''', (return_date.isoformat(), patron_id, book_id)).rowcount
+    if updated == 0:
+        return 'not_borrowed', book
+    
+    conn.execute('''
+        UPDATE books SET available_copies = available_copies + 1 
+        WHERE id = ? AND available_copies < total_copies
+    ''', (book_id,))
+    return 'ok', book
+
+@instrumented
+def checkout_book(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                  borrowing_limit: int) -> Tuple[str, Optional[Dict]]:
+    """
+    Check out a book in one transaction.
+
+    Checks availability and the patron's borrowing limit, inserts the
+    borrow record and decrements available copies with a conditional
+    UPDATE so copies can never be oversold.
+
+    Returns:
+        tuple: (status, book) where status is one of 'ok', 'not_found',
+        'unavailable' or 'limit_reached'
+    """
+    try:
+        return run_in_transaction(
+            lambda conn: _checkout_in(conn, patron_id, book_id, borrow_date, due_date, borrowing_limit)
+        )
+    finally:
+        invalidate_book_cache(book_id)
+
+@instrumented
+def checkout_books(patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime,
+                   borrowing_limit: int) -> List[Tuple[str, Optional[Dict]]]:
+    """
+    Check out several books for one patron in a single transaction.
+
+    Each book is processed like checkout_book, in order, so earlier
+    checkouts count towards the borrowing limit of later ones.
+
+    Returns:
+        list: (status, book) for each book ID, in the order given
+    """
+    try:
+        return run_in_transaction(lambda conn: [
+            _checkout_in(conn, patron_id, book_id, borrow_date, due_date, borrowing_limit)
+            for book_id in book_ids
+        ])
+    finally:
+        for book_id in book_ids:
+            invalidate_book_cache(book_id)
+
+@instrumented
+def checkin_book(patron_id: str, book_id: int, return_date: datetime) -> Tuple[str, Optional[Dict]]:
+    """
+    Check in a book in one transaction.
+
+    Closes the patron's oldest open borrow record for the book and
+    increments available copies, never beyond total copies.
+
+    Returns:
+        tuple: (status, book) where status is one of 'ok', 'not_found' or
+        'not_borrowed'
+    """
+    try:
+        return run_in_transaction(lambda conn: _checkin_in(conn, patron_id, book_id, return_date))
+    finally:
+        invalidate_book_cache(book_id)
+
+@instrumented
+def checkin_books(patron_id: str, book_ids: List[int], return_date: datetime) -> List[Tuple[str, Optional[Dict]]]:
+    """
+    Check in several books for one patron in a single transaction.
+
+    Returns:
+        list: (status, book) for each book ID, in the order given
+    """
+    try:
+        return run_in_transaction(lambda conn: [
+            _checkin_in(conn, patron_id, book_id, return_date) for book_id in book_ids
+        ])
+    finally:
+        for book_id in book_ids:
+            invalidate_book_cache(book_id)
@@ -0,0 +1,81 @@
+"""
+HTTP Cache module for Library Management System
+Conditional GET support driven by the database's catalog version
+
+Responses of the decorated views carry a strong ETag and Last-Modified
+derived from the catalog version, which every write to books or borrow
+records bumps. A request whose If-None-Match (or If-Modified-Since) still
+matches is answered with 304 after reading only that version row.
+"""
+
+import functools
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from flask import current_app, make_response, request, session
+
+from database import get_catalog_version
+
+# Cache-Control sent with each conditional endpoint's responses
+CACHE_POLICIES = {
+    # Pages can carry flashed messages, so only the browser may keep them
+    'catalog.catalog': 'private, no-cache',
+    'api.search_books_api': 'public, no-cache',
+    'api.get_late_fee': 'private, no-cache',
+}
+
+# Late fees grow with the clock as well as with writes; their validators
+# roll over this often, bounding how long a 304 can lag a new day's fee
+LATE_FEE_VALIDATOR_SECONDS = 60
+
+# Distinguishes this deployment's responses from those rendered by an
+# earlier version of the code for the same catalog version
+_BOOT_TOKEN = format(int(time.time()), 'x')
+
+def _not_modified(etag: str, last_modified: datetime) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def conditional_get(clock_seconds: Optional[int] = None, flashes: bool = False) -> Callable:
+    """
+    Decorator adding catalog-version validators and the endpoint's cache policy to a GET view.
+
+    ``clock_seconds`` also rolls the validators over that often, for views
+    whose output depends on the time. Views that render flashed messages
+    pass ``flashes=True``; they are served in full, uncached, while
+    messages are pending.
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or (flashes and session.get('_flashes')):
+                response = make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+
+            # Read before the view's queries: if a write lands in between, the
+            # body is newer than its ETag, which only costs the client a refetch
+            catalog = get_catalog_version()
+            etag = f"{catalog['version']}.{_BOOT_TOKEN}"
+            last_modified = catalog['modified_at']
+            if clock_seconds:
+                tick = int(time.time()) // clock_seconds
+                etag += f'.{tick}'
+                last_modified = max(last_modified, datetime.fromtimestamp(tick * clock_seconds, timezone.utc))
+
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = CACHE_POLICIES[request.endpoint]
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,325 @@
+"""
+Metrics module for Library Management System
+Request, per-endpoint and database timing metrics in Prometheus text format
+
+Each thread records into its own shard without taking a lock; shards are
+summed when /metrics is scraped and folded into a shared total when their
+thread exits. Under the pre-fork server every worker also writes periodic
+snapshots to a shared directory so a scrape of any worker covers them all.
+"""
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SNAPSHOT_INTERVAL_SECONDS = 5.0
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'library_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.', None),
+    'library_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.', LATENCY_BUCKETS),
+    'library_http_request_db_queries': ('histogram', 'SQL statements run per HTTP request.', QUERY_COUNT_BUCKETS),
+    'library_http_request_db_seconds': ('histogram', 'Time spent in database helpers per HTTP request.',
+                                        LATENCY_BUCKETS),
+    'library_db_calls_total': ('counter', 'Database helper calls by function.', None),
+    'library_db_call_duration_seconds': ('histogram', 'Database helper latency by function.', LATENCY_BUCKETS),
+    'library_db_queries_total': ('counter', 'SQL statements run, inside requests or not.', None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class _Shard:
+    """One thread's counters and histograms; only its own thread writes to it."""
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], list] = {}
+        # Per-request state
+        self.depth = 0
+        self.request_queries = 0
+        self.request_db_seconds = 0.0
+
+    def inc(self, name: str, labels: Labels, amount: float = 1) -> None:
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # bucket counts (last one is +Inf), sum, count
+            histogram = self.histograms[key] = [[0] * (len(METRICS[name][2]) + 1), 0.0, 0]
+        histogram[0][bisect_left(METRICS[name][2], value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def merge(self, counters: Iterable, histograms: Iterable) -> None:
+        for key, value in counters:
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, (buckets, total, count) in histograms:
+            histogram = self.histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+            histogram[2] += count
+
+class _ShardOwner:
+    pass
+
+_local = threading.local()
+_lock = threading.Lock()
+_live: List[_Shard] = []
+_retired = _Shard()
+_snapshot_dir: Optional[str] = None
+# (pid, file name) of this process's snapshot; a forked child gets a new name
+_snapshot_name: Optional[Tuple[int, str]] = None
+
+def _retire(shard: _Shard) -> None:
+    with _lock:
+        _live.remove(shard)
+        _retired.merge(shard.counters.items(), shard.histograms.items())
+
+def _shard() -> _Shard:
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        # Retire the shard when the thread's locals are cleared at thread exit
+        _local.owner = _ShardOwner()
+        weakref.finalize(_local.owner, _retire, shard)
+        with _lock:
+            _live.append(shard)
+    return shard
+
+# Recording
+
+def count_statement(sql: str) -> None:
+    """sqlite3 trace callback: count executed statements (trigger bodies excluded)."""
+    if sql.startswith('--'):
+        return
+    shard = _shard()
+    shard.request_queries += 1
+    shard.inc('library_db_queries_total', ())
+
+def instrumented(func: Callable) -> Callable:
+    """
+    Decorator timing a database helper.
+
+    Generator helpers are timed while they are being iterated (their return
+    value is passed through). Only the
+    outermost helper on a thread adds to the current request's DB time,
+    so helpers calling helpers are not counted twice.
+    """
+    labels = (('function', func.__name__),)
+
+    def record(shard: _Shard, elapsed: float) -> None:
+        shard.inc('library_db_calls_total', labels)
+        shard.observe('library_db_call_duration_seconds', labels, elapsed)
+        if shard.depth == 0:
+            shard.request_db_seconds += elapsed
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            shard = _shard()
+            elapsed = 0.0
+            iterator = func(*args, **kwargs)
+            try:
+                while True:
+                    shard.depth += 1
+                    started = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration as stop:
+                        return stop.value
+                    finally:
+                        elapsed += time.perf_counter() - started
+                        shard.depth -= 1
+                    yield item
+            finally:
+                iterator.close()
+                record(shard, elapsed)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        shard = _shard()
+        shard.depth += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            shard.depth -= 1
+            record(shard, elapsed)
+    return wrapper
+
+def begin_request() -> None:
+    """Start timing a request on this thread."""
+    shard = _shard()
+    shard.request_queries = 0
+    shard.request_db_seconds = 0.0
+    _local.request_started = time.perf_counter()
+
+def end_request(endpoint: str, method: str, status: int) -> None:
+    """Record the request begun on this thread, once."""
+    started = getattr(_local, 'request_started', None)
+    if started is None:
+        return
+    _local.request_started = None
+    shard = _shard()
+    labels = (('endpoint', endpoint),)
+    shard.inc('library_http_requests_total', labels + (('method', method), ('status', str(status))))
+    shard.observe('library_http_request_duration_seconds', labels, time.perf_counter() - started)
+    shard.observe('library_http_request_db_queries', labels, shard.request_queries)
+    shard.observe('library_http_request_db_seconds', labels, shard.request_db_seconds)
+
+def register_request_hooks(app) -> None:
+    """Time every request of ``app`` (streamed bodies are timed until the response is returned)."""
+    from flask import request
+
+    def endpoint() -> str:
+        return request.endpoint or 'unmatched'
+
+    @app.before_request
+    def _begin():
+        begin_request()
+
+    @app.after_request
+    def _end(response):
+        end_request(endpoint(), request.method, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _teardown(error):
+        # after_request is skipped when a view raises
+        end_request(endpoint(), request.method, 500)
+
+# Collection
+
+def snapshot() -> Dict:
+    """All metrics recorded in this process so far, JSON-serializable."""
+    with _lock:
+        shards = list(_live) + [_retired]
+        # Copying the dicts is atomic, so writer threads need not be stopped
+        parts = [(list(shard.counters.items()), [(key, [list(h[0]), h[1], h[2]]) for key, h in
+                                                  list(shard.histograms.items())]) for shard in shards]
+    total = _Shard()
+    for counters, histograms in parts:
+        total.merge(counters, histograms)
+    return {
+        'counters': [[name, list(map(list, labels)), value] for (name, labels), value in total.counters.items()],
+        'histograms': [[name, list(map(list, labels)), *histogram]
+                       for (name, labels), histogram in total.histograms.items()],
+    }
+
+def _merge_snapshots(snapshots: Iterable[Dict]) -> _Shard:
+    total = _Shard()
+    for snap in snapshots:
+        total.merge(
+            (((name, tuple(map(tuple, labels))), value) for name, labels, value in snap['counters']),
+            (((name, tuple(map(tuple, labels))), (buckets, total_, count))
+             for name, labels, buckets, total_, count in snap['histograms']),
+        )
+    return total
+
+def configure_snapshot_dir(directory: Optional[str]) -> None:
+    """Share metrics across worker processes through ``directory`` (None: this process only)."""
+    global _snapshot_dir
+    _snapshot_dir = directory
+
+def _snapshot_file() -> str:
+    # The pid alone is not enough: a new worker can be given a dead worker's
+    # pid, and overwriting its file would drop the dead worker's totals
+    global _snapshot_name
+    pid = os.getpid()
+    if _snapshot_name is None or _snapshot_name[0] != pid:
+        _snapshot_name = (pid, f'{pid}-{uuid.uuid4().hex}.json')
+    return _snapshot_name[1]
+
+def write_snapshot() -> None:
+    """Write this process's metrics to the snapshot directory."""
+    if _snapshot_dir is None:
+        return
+    path = os.path.join(_snapshot_dir, _snapshot_file())
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+def start_snapshot_writer(interval: float = SNAPSHOT_INTERVAL_SECONDS) -> threading.Thread:
+    """Write snapshots every ``interval`` seconds from a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot()
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=run, name='metrics-snapshots', daemon=True)
+    thread.start()
+    return thread
+
+def _collect() -> _Shard:
+    snapshots = [snapshot()]
+    if _snapshot_dir is not None:
+        own = _snapshot_file()
+        for name in sorted(os.listdir(_snapshot_dir)):
+            if name.endswith('.json') and name != own:
+                try:
+                    with open(os.path.join(_snapshot_dir, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+    return _merge_snapshots(snapshots)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format (version 0.0.4)."""
+    total = _collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(total.counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+            continue
+        for (metric, labels), (counts, total_seconds, count) in sorted(total.histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _format_number(bound)
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(total_seconds)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+def reset() -> None:
+    """Forget everything recorded so far (for tests)."""
+    global _retired
+    with _lock:
+        for shard in _live:
+            shard.counters.clear()
+            shard.histograms.clear()
+        _retired = _Shard()
@@ -0,0 +1,191 @@
+"""
+Query Log module for Library Management System
+Optional per-statement timing, slow-query logging and query plan capture
+
+When enabled, connections opened afterwards time every statement (execute
+plus fetching its rows) and log those slower than the threshold, with the
+helper that ran them and the bound parameters reduced to their types.
+With plan capture on, ``EXPLAIN QUERY PLAN`` is recorded once for each
+distinct SELECT, and plans that scan a whole table are logged.
+"""
+
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = 100.0
+
+_threshold_seconds: Optional[float] = None
+_explain = False
+_plans: Dict[str, Dict] = {}
+_plans_lock = threading.Lock()
+
+def configure_query_log(threshold_ms: Optional[float] = SLOW_QUERY_THRESHOLD_MS, explain: bool = False) -> None:
+    """
+    Log statements slower than ``threshold_ms`` (None: none) and capture query plans if ``explain``.
+
+    Only connections opened after this call are traced, so call it before
+    the connection pool is (re)created. A threshold of 0 logs every statement;
+    ``configure_query_log(None)`` turns tracing off.
+    """
+    global _threshold_seconds, _explain
+    _threshold_seconds = None if threshold_ms is None else threshold_ms / 1000
+    _explain = explain
+
+def connection_factory() -> type:
+    """The sqlite3 connection class for new connections."""
+    return TracedConnection if _threshold_seconds is not None or _explain else sqlite3.Connection
+
+def get_query_plans() -> List[Dict]:
+    """Captured query plans: sql, caller, plan lines and tables scanned in full."""
+    with _plans_lock:
+        return [plan for plan in _plans.values() if plan is not None]
+
+def reset_query_plans() -> None:
+    """Forget captured query plans, so the next run of each query is explained again."""
+    with _plans_lock:
+        _plans.clear()
+
+def _one_line(sql: str) -> str:
+    return ' '.join(sql.split())
+
+def _is_query(sql: str) -> bool:
+    words = sql.split(None, 1)
+    return bool(words) and words[0].upper() in ('SELECT', 'WITH')
+
+def _redact(parameters) -> str:
+    """Bound parameters with their values replaced by their types."""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+def _caller() -> str:
+    """The outermost database helper on the current stack."""
+    name = '?'
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_globals.get('__name__') == 'database':
+            name = frame.f_code.co_name
+        frame = frame.f_back
+    return name
+
+def _full_scans(plan: List[str]) -> List[str]:
+    # "SCAN books" reads every row; "SCAN books USING INDEX ...", virtual and schema tables do not count
+    return [detail.split()[1] for detail in plan
+            if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail
+            and not detail.split()[1].startswith('sqlite_')]
+
+def _capture_plan(conn: sqlite3.Connection, sql: str, parameters) -> None:
+    with _plans_lock:
+        if sql in _plans:
+            return
+        _plans[sql] = None  # claimed; filled in below
+    try:
+        rows = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error:
+        with _plans_lock:
+            del _plans[sql]
+        return
+    plan = [row[3] for row in rows]
+    entry = {'sql': _one_line(sql), 'caller': _caller(), 'plan': plan, 'full_scans': _full_scans(plan)}
+    with _plans_lock:
+        _plans[sql] = entry
+    if entry['full_scans']:
+        logger.warning("Full table scan of %s in %s: %s\n  %s", ', '.join(entry['full_scans']),
+                       entry['caller'], entry['sql'], '\n  '.join(plan))
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times each statement, including fetching its rows."""
+
+    _statement = None  # (sql, parameters) of the statement being timed
+    _elapsed = 0.0
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        if _explain and _is_query(sql):
+            _capture_plan(self.connection, sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._start(sql, _redact(parameters), time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._start(sql, f'{self.rowcount} rows', time.perf_counter() - started)
+
+    def _start(self, sql, parameters, elapsed):
+        self._statement = (sql, parameters)
+        self._elapsed = elapsed
+        if self.description is None:
+            # Nothing to fetch: the statement is done
+            self._finish()
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            result = fetch(*args)
+        except StopIteration:
+            self._elapsed += time.perf_counter() - started
+            self._finish()
+            raise
+        self._elapsed += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _finish(self):
+        statement = self._statement
+        if statement is None:
+            return
+        self._statement = None
+        if _threshold_seconds is not None and self._elapsed >= _threshold_seconds:
+            sql, parameters = statement
+            logger.warning("Slow query (%.1f ms) in %s: %s %s", self._elapsed * 1000, _caller(),
+                           _one_line(sql), parameters)
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors are TracedCursors."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
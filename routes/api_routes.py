@@ -2,12 +2,28 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+import io
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from services.library_service import (
+    calculate_late_fee_for_book, calculate_late_fees_bulk, search_books_in_catalog,
+    get_catalog_page, borrow_books_by_patron, return_books_by_patron, autocomplete_catalog,
+    CATALOG_PAGE_SIZE, FUZZY_SEARCH_THRESHOLD, AUTOCOMPLETE_LIMIT
+)
+from services.import_service import import_books, IMPORT_FORMATS, DEFAULT_BATCH_SIZE
+from http_cache import conditional_get, LATE_FEE_VALIDATOR_SECONDS
+
+# Maximum number of patron IDs accepted by one /api/late_fees request
+MAX_BATCH_PATRONS = 500
+
+# Maximum number of rejected rows listed in an import response
+MAX_REPORTED_ERRORS = 100
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
+@conditional_get(clock_seconds=LATE_FEE_VALIDATOR_SECONDS)
 def get_late_fee(patron_id, book_id):
     """
     Calculate late fee for a specific book borrowed by a patron.
@@ -16,7 +32,35 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/late_fees')
+def get_late_fees_batch():
+    """
+    Calculate late fees for many open loans at once.
+    Batch API endpoint for R5: Late Fee Calculation
+    
+    Query parameters:
+        patron_id: Repeatable 6-digit patron ID filter (omit for all patrons)
+        include_current: If "1", also list loans that are not overdue
+        
+    Streams one JSON object per line (NDJSON), in the same shape as
+    /api/late_fee plus patron_id, book_id and title.
+    """
+    patron_ids = request.args.getlist('patron_id') or None
+    if patron_ids is not None:
+        if len(patron_ids) > MAX_BATCH_PATRONS:
+            return jsonify({'error': f'At most {MAX_BATCH_PATRONS} patron IDs per request'}), 400
+        if any(not p.isdigit() or len(p) != 6 for p in patron_ids):
+            return jsonify({'error': 'Invalid patron ID'}), 400
+    overdue_only = request.args.get('include_current') != '1'
+    
+    def generate():
+        for fee in calculate_late_fees_bulk(patron_ids, overdue_only):
+            yield json.dumps(fee) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @api_bp.route('/search')
+@conditional_get()
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -28,8 +72,15 @@ def search_books_api():
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
+    try:
+        threshold = float(request.args.get('threshold', FUZZY_SEARCH_THRESHOLD))
+    except ValueError:
+        return jsonify({'error': 'Threshold must be a number'}), 400
+    if not 0 < threshold <= 1:
+        return jsonify({'error': 'Threshold must be between 0 and 1'}), 400
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, threshold)
     
     return jsonify({
         'search_term': search_term,
@@ -37,3 +88,131 @@ def search_books_api():
         'results': books,
         'count': len(books)
     })
+
+
+@api_bp.route('/autocomplete')
+def autocomplete_api():
+    """
+    Suggest titles or authors for a partially typed search term.
+    Search-as-you-type support for R6: Book Search Functionality
+    """
+    prefix = request.args.get('q', '')
+    field = request.args.get('type', 'title')
+    
+    if field not in ('title', 'author'):
+        return jsonify({'error': 'Type must be title or author'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'Limit must be an integer'}), 400
+    
+    suggestions = autocomplete_catalog(prefix, field, limit)
+    return jsonify({'q': prefix, 'type': field, 'suggestions': suggestions})
+
+@api_bp.route('/books')
+def list_books_api():
+    """
+    List catalog books one page at a time.
+    API interface for R2: Book Catalog Display
+    """
+    try:
+        limit = int(request.args.get('limit', CATALOG_PAGE_SIZE))
+        page = get_catalog_page(request.args.get('cursor'), limit)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    return jsonify({
+        'results': page['books'],
+        'count': len(page['books']),
+        'limit': page['limit'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor']
+    })
+
+@api_bp.route('/books/import', methods=['POST'])
+def import_books_api():
+    """
+    Bulk import books from an uploaded CSV or JSON Lines file.
+    Bulk interface for R1: Book Catalog Management
+    
+    Form fields:
+        file: The upload (format taken from its .csv/.jsonl extension)
+        format: Optional explicit format, 'csv' or 'jsonl'
+        batch_size: Optional rows per insert batch
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'A file upload is required'}), 400
+    
+    fmt = request.form.get('format') or upload.filename.rsplit('.', 1)[-1].lower()
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': 'Format must be csv or jsonl'}), 400
+    
+    try:
+        batch_size = int(request.form.get('batch_size', DEFAULT_BATCH_SIZE))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Batch size must be an integer'}), 400
+    
+    errors = []
+    
+    def on_error(error):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append(error)
+    
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        summary = import_books(stream, fmt, batch_size, on_error)
+    except UnicodeDecodeError:
+        return jsonify({'error': 'File must be UTF-8 encoded'}), 400
+    
+    summary['errors'] = errors
+    summary['errors_truncated'] = summary['failed'] > len(errors)
+    return jsonify(summary)
+
+def _parse_batch_request():
+    """Read {"patron_id": str, "book_ids": [int, ...]} from the JSON body."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    patron_id = data.get('patron_id')
+    book_ids = data.get('book_ids')
+    if not isinstance(patron_id, str) or not isinstance(book_ids, list):
+        return None
+    if not all(isinstance(book_id, int) and not isinstance(book_id, bool) for book_id in book_ids):
+        return None
+    return patron_id.strip(), book_ids
+
+def _batch_response(patron_id, result):
+    success, message, results = result
+    status_code = 200 if results else 400
+    return jsonify({
+        'patron_id': patron_id,
+        'success': success,
+        'message': message,
+        'results': results
+    }), status_code
+
+@api_bp.route('/borrow/batch', methods=['POST'])
+def borrow_batch_api():
+    """
+    Borrow a stack of books for one patron in one transaction.
+    Batch API for R3: Book Borrowing
+    """
+    parsed = _parse_batch_request()
+    if parsed is None:
+        return jsonify({'error': 'Expected JSON with patron_id and a list of integer book_ids'}), 400
+    patron_id, book_ids = parsed
+    return _batch_response(patron_id, borrow_books_by_patron(patron_id, book_ids))
+
+@api_bp.route('/return/batch', methods=['POST'])
+def return_batch_api():
+    """
+    Return a stack of books for one patron in one transaction.
+    Batch API for R4: Book Return Processing
+    """
+    parsed = _parse_batch_request()
+    if parsed is None:
+        return jsonify({'error': 'Expected JSON with patron_id and a list of integer book_ids'}), 400
+    patron_id, book_ids = parsed
+    return _batch_response(patron_id, return_books_by_patron(patron_id, book_ids))
@@ -3,8 +3,9 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from services.library_service import add_book_to_catalog
+from http_cache import conditional_get
+from services.library_service import add_book_to_catalog, get_catalog_page, CATALOG_PAGE_SIZE
+from .streaming import render_streamed
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +15,21 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@conditional_get(flashes=True)
 def catalog():
     """
-    Display all books in the catalog.
+    Display one page of books in the catalog.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    try:
+        limit = int(request.args.get('limit', CATALOG_PAGE_SIZE))
+        page = get_catalog_page(request.args.get('cursor'), limit)
+    except (ValueError, TypeError):
+        flash('Invalid catalog page.', 'error')
+        page = get_catalog_page()
+    
+    # The page's rows are read up front; only the HTML is streamed
+    return render_streamed('catalog.html', books=page['books'], page=page)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
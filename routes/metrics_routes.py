@@ -0,0 +1,15 @@
+"""
+Metrics Routes - Prometheus scrape endpoint
+"""
+
+from flask import Blueprint, Response
+from metrics import render_prometheus
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Request, endpoint latency and database timing metrics in Prometheus text format."""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,68 @@
+"""
+Payment Routes - Asynchronous late fee payment endpoints
+"""
+
+from flask import Blueprint, jsonify, request
+from services.library_service import settle_patron_fees
+from services.payment_queue import (
+    get_payment_gateway, get_payment_queue, IdempotencyConflictError, PaymentQueueBusyError, PaymentRejectedError
+)
+
+payment_bp = Blueprint('payments', __name__, url_prefix='/api/payments')
+
+@payment_bp.route('', methods=['POST'])
+def submit_payment():
+    """
+    Queue a late fee payment and return its job ID immediately.
+    
+    Expects JSON {"patron_id": str, "book_id": int} and an idempotency key,
+    either in the Idempotency-Key header or as "idempotency_key" in the body.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON body'}), 400
+    
+    patron_id = data.get('patron_id')
+    book_id = data.get('book_id')
+    if not isinstance(patron_id, str) or not isinstance(book_id, int) or isinstance(book_id, bool):
+        return jsonify({'error': 'patron_id must be a string and book_id an integer'}), 400
+    
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if idempotency_key is not None and not isinstance(idempotency_key, str):
+        return jsonify({'error': 'Idempotency key must be a string'}), 400
+    
+    try:
+        message, job = get_payment_queue().submit(patron_id.strip(), book_id, idempotency_key)
+    except PaymentQueueBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except IdempotencyConflictError as e:
+        return jsonify({'error': str(e)}), 409
+    except PaymentRejectedError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'message': message, 'job': job}), 202
+
+@payment_bp.route('/<job_id>')
+def payment_status(job_id):
+    """Poll the status of a queued payment."""
+    job = get_payment_queue().get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Payment job not found'}), 404
+    return jsonify(job)
+
+@payment_bp.route('/settle', methods=['POST'])
+def settle_fees():
+    """
+    Charge a patron once for all outstanding late fees.
+    
+    Expects JSON {"patron_id": str}; the response lists how the charge
+    was split across overdue books.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('patron_id'), str):
+        return jsonify({'error': 'Expected a JSON body with a patron_id string'}), 400
+    
+    success, message, details = settle_patron_fees(data['patron_id'].strip(), get_payment_gateway())
+    if not success:
+        return jsonify({'error': message}), 400
+    return jsonify(details)
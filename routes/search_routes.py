@@ -4,6 +4,7 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request, flash
 from services.library_service import search_books_in_catalog
+from .streaming import render_streamed
 
 search_bp = Blueprint('search', __name__)
 
@@ -19,10 +20,10 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
-    # Use business logic function
+    # Use business logic function; results are read up front, only the HTML is streamed
     books = search_books_in_catalog(search_term, search_type)
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_streamed('search.html', books=books, search_term=search_term, search_type=search_type)
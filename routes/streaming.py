@@ -0,0 +1,45 @@
+"""
+Streaming Helpers - Send rendered pages to the client as they are generated
+"""
+
+from typing import Iterable, Iterator
+
+from flask import Response, get_flashed_messages, stream_template
+
+# Rendered output is sent once at least this many characters have built up
+STREAM_CHUNK_SIZE = 8192
+
+def _coalesce(chunks: Iterable[str], size: int) -> Iterator[str]:
+    """Join Jinja's many small output fragments into chunks of about ``size`` characters."""
+    buffer = []
+    buffered = 0
+    try:
+        for chunk in chunks:
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= size:
+                yield ''.join(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield ''.join(buffer)
+    finally:
+        # A client that disconnects closes only this generator; close the
+        # template's too, now, rather than whenever it is garbage collected
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def render_streamed(template_name: str, **context) -> Response:
+    """
+    Render a template as a streamed HTML response.
+
+    Pass rows already read from the database: the template may be closed
+    unfinished, on another thread, if the client goes away, so it must not
+    hold a pooled connection.
+    """
+    # The session cookie is written before the body streams, so take the
+    # flashed messages off it now; the template gets the same list later
+    get_flashed_messages()
+    return Response(_coalesce(stream_template(template_name, **context), STREAM_CHUNK_SIZE),
+                    mimetype='text/html')
@@ -0,0 +1,298 @@
+"""
+Search index module for Library Management System
+In-memory trigram and prefix indexes for typo-tolerant search and autocomplete
+"""
+
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import database
+
+DEFAULT_THRESHOLD = 0.5
+
+# Books read per batch while building the catalog index
+BUILD_BATCH_SIZE = 10000
+
+# Bounds on the work done by each fuzzy search: posting entries counted to
+# find candidates, and candidates then checked against the remaining trigrams
+MAX_SCANNED_POSTINGS = 50000
+MAX_CANDIDATES = 200
+
+_WORD_RE = re.compile(r'\w+')
+_SPACE_RE = re.compile(r'\s+')
+_LEADING_ARTICLES = ('the ', 'a ', 'an ')
+
+def normalize(text: str) -> str:
+    """Lowercase ``text`` and collapse runs of whitespace."""
+    return _SPACE_RE.sub(' ', text.strip().lower())
+
+def trigrams(text: str) -> Set[str]:
+    """Get the padded, lowercase word trigrams of ``text``."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramIndex:
+    """
+    Inverted index from trigrams to document IDs.
+
+    Scores are the fraction of the query's trigrams found in a document
+    (so a misspelt word still matches inside a longer title), with trigram
+    Jaccard similarity used to break ties in favour of closer matches.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._sizes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Index a document; adding the same ID twice is a no-op."""
+        grams = trigrams(text)
+        with self._lock:
+            if doc_id in self._sizes:
+                return
+            self._sizes[doc_id] = len(grams)
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array('i')
+                if postings and postings[-1] > doc_id:
+                    # Searches read posting lists without the lock, relying on
+                    # published entries never moving; insert into a copy
+                    postings = self._postings[gram] = array('i', postings)
+                    postings.insert(bisect_left(postings, doc_id), doc_id)
+                else:
+                    postings.append(doc_id)
+
+    def search(self, query: str, threshold: float = DEFAULT_THRESHOLD,
+               limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        Find documents similar to ``query``.
+
+        Returns:
+            list: (doc_id, score) pairs with score >= threshold, best first
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        
+        total = len(query_grams)
+        min_shared = max(1, math.ceil(threshold * total))
+        # Only the lengths are read under the lock: lists are append-only
+        # (see add), so their first ``length`` entries stay valid without it
+        with self._lock:
+            postings = sorted(((p, len(p)) for p in map(self._postings.get, query_grams) if p is not None),
+                              key=itemgetter(1))
+        if len(postings) < min_shared:
+            return []
+        
+        # A match must share at least min_shared trigrams, so it must appear
+        # in at least one of the (len(postings) - min_shared + 1) rarest
+        # posting lists. Those are counted for candidates, rarest first, until
+        # MAX_SCANNED_POSTINGS entries have been read, and the MAX_CANDIDATES
+        # candidates sharing the most trigrams are kept; the other lists are
+        # checked per candidate with a binary search (postings are sorted).
+        # Within those bounds the results are exact. Past them (queries made
+        # of trigrams common to much of the catalog) they are the best of the
+        # candidates kept
+        probe = len(postings) - min_shared + 1
+        counts = Counter()
+        counted = scanned = 0
+        for p, length in postings[:probe]:
+            if counted and scanned + length > MAX_SCANNED_POSTINGS:
+                break
+            counts.update(p[:min(length, MAX_SCANNED_POSTINGS)])
+            counted += 1
+            scanned += length
+        if len(counts) > MAX_CANDIDATES:
+            counts = Counter(dict(counts.most_common(MAX_CANDIDATES)))
+        
+        checked = postings[counted:]
+        for remaining, (p, length) in enumerate(checked, start=1):
+            still_needed = min_shared - (len(checked) - remaining)
+            for doc_id in list(counts):
+                i = bisect_left(p, doc_id, 0, length)
+                if i < length and p[i] == doc_id:
+                    counts[doc_id] += 1
+                elif counts[doc_id] < still_needed:
+                    del counts[doc_id]
+        
+        sizes = self._sizes
+        results = []
+        for doc_id, shared in counts.items():
+            score = shared / total
+            if score >= threshold:
+                jaccard = shared / (total + sizes[doc_id] - shared)
+                results.append((score, jaccard, doc_id))
+        
+        results.sort(reverse=True)
+        return [(doc_id, round(score, 3)) for score, _, doc_id in results[:limit]]
+
+class PrefixIndex:
+    """
+    Sorted array of normalized strings for prefix autocomplete.
+
+    Lookups are a binary search to the first key with the prefix followed
+    by a scan of at most ``limit`` keys. Titles are also indexed without a
+    leading article, so "great" finds "The Great Gatsby".
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._display: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _keys_for(text: str) -> List[str]:
+        normalized = normalize(text)
+        keys = [normalized] if normalized else []
+        for article in _LEADING_ARTICLES:
+            if normalized.startswith(article) and len(normalized) > len(article):
+                keys.append(normalized[len(article):])
+        return keys
+
+    def add(self, text: str) -> None:
+        """Index ``text``; repeated strings are stored once."""
+        with self._lock:
+            for key in self._keys_for(text):
+                if key not in self._display:
+                    self._display[key] = text.strip()
+                    insort(self._keys, key)
+
+    def add_many(self, texts: Iterable[str]) -> None:
+        """Index many strings with one sort instead of one insertion each."""
+        with self._lock:
+            added = []
+            for text in texts:
+                for key in self._keys_for(text):
+                    if key not in self._display:
+                        self._display[key] = text.strip()
+                        added.append(key)
+            if len(added) <= 64:
+                for key in added:
+                    insort(self._keys, key)
+            else:
+                self._keys.extend(added)
+                self._keys.sort()
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Get up to ``limit`` distinct strings starting with ``prefix``, in alphabetical order."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        suggestions = []
+        with self._lock:
+            i = bisect_left(self._keys, prefix)
+            while i < len(self._keys) and len(suggestions) < limit:
+                key = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                text = self._display[key]
+                if text not in suggestions:
+                    suggestions.append(text)
+                i += 1
+        return suggestions
+
+class CatalogSearchIndex:
+    """Trigram and prefix indexes over book titles and authors."""
+
+    def __init__(self):
+        self.title = TrigramIndex()
+        self.author = TrigramIndex()
+        self.title_prefix = PrefixIndex()
+        self.author_prefix = PrefixIndex()
+        # Highest book ID read by a scan of the books table; books inserted
+        # by this process may be indexed beyond it through the insert listener
+        self.scanned_through = 0
+
+    def add_books(self, books: List[Dict]) -> None:
+        for book in books:
+            self.title.add(book['id'], book['title'])
+            self.author.add(book['id'], book['author'])
+        self.title_prefix.add_many(book['title'] for book in books)
+        self.author_prefix.add_many(book['author'] for book in books)
+
+    def search(self, query: str, threshold: float = DEFAULT_THRESHOLD,
+               limit: int = 20) -> List[Tuple[int, float]]:
+        """Search titles and authors, keeping each book's best score."""
+        best: Dict[int, float] = {}
+        for index in (self.title, self.author):
+            for doc_id, score in index.search(query, threshold, limit):
+                best[doc_id] = max(score, best.get(doc_id, 0.0))
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def scan_books(self) -> int:
+        """Index the books with IDs above ``scanned_through``; returns how many were read."""
+        scanned = 0
+        books = database.iter_books(BUILD_BATCH_SIZE, after_id=self.scanned_through)
+        while True:
+            batch = list(islice(books, BUILD_BATCH_SIZE))
+            if not batch:
+                return scanned
+            self.add_books(batch)
+            self.scanned_through = batch[-1]['id']
+            scanned += len(batch)
+
+_index: Optional[CatalogSearchIndex] = None
+_index_database: Optional[str] = None
+_index_ready = False
+_build_lock = threading.RLock()
+
+def build_catalog_index() -> CatalogSearchIndex:
+    """(Re)build the catalog index from the books table."""
+    global _index, _index_database, _index_ready
+    with _build_lock:
+        index = CatalogSearchIndex()
+        # Publish before scanning so books inserted mid-build are added by
+        # the insert listener; add() ignores the duplicates
+        _index, _index_database, _index_ready = index, database.DATABASE, False
+        index.scan_books()
+        _index_ready = True
+        return index
+
+def get_catalog_index() -> CatalogSearchIndex:
+    """
+    Get the catalog index, building it on first use.
+
+    The catalog version is read first, so books inserted by other processes
+    since the last read are indexed before the index is returned.
+    """
+    if _index_ready and _index_database == database.DATABASE:
+        database.get_catalog_version()
+        return _index
+    with _build_lock:
+        if _index_ready and _index_database == database.DATABASE:
+            return _index
+        return build_catalog_index()
+
+def _on_books_inserted(books: Iterable[Dict]) -> None:
+    index = _index
+    if index is not None and _index_database == database.DATABASE:
+        index.add_books(list(books))
+
+def _on_catalog_changed(book_ids: Optional[Set[int]]) -> None:
+    with _build_lock:
+        if not _index_ready or _index_database != database.DATABASE:
+            return
+        # Only inserted books need indexing, and they take IDs above the last scan
+        if book_ids is None or max(book_ids, default=0) > _index.scanned_through:
+            _index.scan_books()
+
+database.add_book_insert_listener(_on_books_inserted)
+database.add_catalog_change_listener(_on_catalog_changed)
@@ -0,0 +1,288 @@
+"""
+Production Server - Pre-fork multi-process WSGI server
+
+Usage:
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers 4] [--pool-size 5]
+                    [--slow-query-ms 50] [--explain-queries] [--archive-after-days 365]
+
+The master process initializes the database, opens the listening socket
+and forks the workers. Each worker opens its own database connection pool
+and search index after the fork and serves requests with Werkzeug's
+threaded WSGI server, so requests are spread across all CPU cores.
+
+Signals (sent to the master):
+    SIGHUP            graceful reload: the master re-executes itself (same pid and listening
+                      socket), so code, configuration and migrations are loaded afresh, then
+                      starts new workers and drains and stops the old ones
+    SIGTERM, SIGINT   graceful shutdown: workers finish in-flight requests and exit
+"""
+
+import logging
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Optional
+
+import click
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import database
+import metrics
+import querylog
+from app import create_app
+from search_index import build_catalog_index
+from services.archive_service import start_loan_archiver
+from services.payment_queue import get_payment_queue, shutdown_payment_queue
+
+WORKER_SHUTDOWN_TIMEOUT = 30
+KEEPALIVE_TIMEOUT = 5
+POLL_INTERVAL = 0.2
+LISTEN_BACKLOG = 1024
+RELOAD_SIGNALS = {signal.SIGHUP, signal.SIGTERM, signal.SIGINT}
+
+# State handed from a master to its re-executed self on reload
+_LISTEN_FD_ENV = 'LIBRARY_SERVE_LISTEN_FD'
+_OLD_WORKERS_ENV = 'LIBRARY_SERVE_OLD_WORKERS'
+_METRICS_DIR_ENV = 'LIBRARY_SERVE_METRICS_DIR'
+
+def default_worker_count() -> int:
+    """Workers from $WEB_CONCURRENCY, else one per CPU core available to this process."""
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+class _WorkerRequestHandler(WSGIRequestHandler):
+    # Close idle keep-alive connections so a stopping worker is not held open by them
+    timeout = KEEPALIVE_TIMEOUT
+
+    def log_error(self, format, *args):
+        if not format.startswith('Request timed out'):
+            super().log_error(format, *args)
+
+class PreforkServer:
+    """
+    Master process that forks and supervises WSGI worker processes.
+
+    Workers share one listening socket and the kernel hands each new
+    connection to whichever worker accepts it first. Workers that die are
+    replaced; SIGHUP re-executes the master and replaces all of them
+    without dropping connections.
+    """
+
+    def __init__(self, app, host: str, port: int, workers: int, pool_size: int = database.POOL_SIZE,
+                 archive_after_days: Optional[int] = None):
+        if workers < 1:
+            raise ValueError("Worker count must be a positive integer.")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.pool_size = pool_size
+        self.archive_after_days = archive_after_days
+        self._socket = None
+        self._children = set()
+        self._pending = []
+        self._metrics_dir = None
+
+    def run(self) -> None:
+        """Serve until SIGTERM or SIGINT, then stop the workers gracefully."""
+        # A master re-executed by a reload inherits its predecessor's socket,
+        # workers (still its children: exec keeps the pid) and metrics
+        inherited_fd = os.environ.pop(_LISTEN_FD_ENV, None)
+        old_workers = [int(pid) for pid in os.environ.pop(_OLD_WORKERS_ENV, '').split(',') if pid]
+        metrics_dir = os.environ.pop(_METRICS_DIR_ENV, None)
+        if inherited_fd is not None:
+            self._socket = socket.socket(fileno=int(inherited_fd))
+        else:
+            self._socket = socket.create_server((self.host, self.port), backlog=LISTEN_BACKLOG)
+        # SQLite connections must not cross a fork; workers open their own
+        database.get_pool().close()
+        # Workers share their metrics through snapshot files, so any worker can answer /metrics
+        self._metrics_dir = metrics_dir or tempfile.mkdtemp(prefix='library-metrics-')
+        metrics.configure_snapshot_dir(self._metrics_dir)
+        
+        for signum in RELOAD_SIGNALS:
+            signal.signal(signum, lambda signum, frame: self._pending.append(signum))
+        # Signals that arrived while the previous image was re-executing were held until now
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, RELOAD_SIGNALS)
+        click.echo(f"Listening on http://{self.host}:{self.port} with {self.workers} workers "
+                   f"(master pid {os.getpid()})", err=True)
+        
+        try:
+            if old_workers:
+                self._spawn_missing()
+                click.echo(f"Reloaded: started {self.workers} new workers, stopping {len(old_workers)}", err=True)
+                self._stop(old_workers)
+            while True:
+                self._reap()
+                if any(signum != signal.SIGHUP for signum in self._pending):
+                    break
+                if self._pending:
+                    self._pending.clear()
+                    self._reload()
+                self._spawn_missing()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self._stop(list(self._children))
+            self._socket.close()
+            shutil.rmtree(self._metrics_dir, ignore_errors=True)
+
+    def _spawn_missing(self) -> None:
+        for _ in range(self.workers - len(self._children)):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children.add(pid)
+            return
+        
+        # Worker process: never returns
+        code = 1
+        try:
+            code = self._run_worker()
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    def _run_worker(self) -> int:
+        master = os.getppid()
+        stopping = []
+        # Only record the signal: taking locks (starting a thread, say) inside a
+        # handler can deadlock with the code it interrupted
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        # Ctrl-C reaches the whole process group; let the master coordinate shutdown
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        
+        # Per-worker state: fresh database connections, cache and search index
+        database.configure_pool(self.pool_size)
+        database.invalidate_book_cache()
+        build_catalog_index()
+        metrics.reset()
+        metrics.start_snapshot_writer()
+        # Started up front so payments orphaned by a previous worker are claimed without waiting for a request
+        get_payment_queue()
+        archiving = threading.Event()
+        if self.archive_after_days is not None:
+            # Every worker runs one; after the first finds the backlog, the others find nothing to move
+            start_loan_archiver(self.archive_after_days, stop=archiving)
+        
+        server = make_server(self.host, self.port, self.app, threaded=True,
+                             request_handler=_WorkerRequestHandler, fd=self._socket.fileno())
+        # Keep track of request threads so server_close() waits for in-flight requests
+        server.daemon_threads = False
+        server.block_on_close = True
+        # All workers wake up for each new connection but only one gets it; the
+        # others' accept() must not block, or serve_forever() cannot be shut down
+        server.socket.setblocking(False)
+        
+        serving = threading.Thread(target=server.serve_forever, name='serve-forever')
+        serving.start()
+        # Also stop if the master died without signalling us (SIGKILL, say)
+        while not stopping and os.getppid() == master:
+            time.sleep(POLL_INTERVAL)
+        server.shutdown()
+        serving.join()
+        server.server_close()
+        archiving.set()
+        shutdown_payment_queue(wait=True)
+        database.get_pool().close()
+        # Keep this worker's totals in the counters after it is gone
+        metrics.write_snapshot()
+        return 0
+
+    def _reap(self) -> None:
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            if pid not in self._children:
+                continue
+            self._children.discard(pid)
+            if os.waitstatus_to_exitcode(status) != 0:
+                click.echo(f"Worker {pid} exited unexpectedly ({os.waitstatus_to_exitcode(status)}); "
+                           "replacing it", err=True)
+
+    def _reload(self) -> None:
+        # Check the new code loads before replacing this process with it: a
+        # master that fails to start would take the running workers with it
+        command = [sys.executable] + sys.orig_argv[1:]
+        check = subprocess.run(command + ['--help'], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if check.returncode != 0:
+            click.echo(f"Reload aborted; the new code failed to load:\n{check.stderr}", err=True)
+            return
+        
+        click.echo(f"Reloading: re-executing the master (pid {os.getpid()})", err=True)
+        self._socket.set_inheritable(True)
+        os.environ[_LISTEN_FD_ENV] = str(self._socket.fileno())
+        os.environ[_OLD_WORKERS_ENV] = ','.join(map(str, self._children))
+        os.environ[_METRICS_DIR_ENV] = self._metrics_dir
+        # Held across the exec, then handled once the new image has its handlers
+        signal.pthread_sigmask(signal.SIG_BLOCK, RELOAD_SIGNALS)
+        sys.stderr.flush()
+        sys.stdout.flush()
+        os.execv(sys.executable, command)
+
+    def _stop(self, pids) -> None:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        
+        deadline = time.monotonic() + WORKER_SHUTDOWN_TIMEOUT
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        remaining.discard(pid)
+                        self._children.discard(pid)
+                except ChildProcessError:
+                    remaining.discard(pid)
+                    self._children.discard(pid)
+            time.sleep(0.05)
+        for pid in remaining:
+            click.echo(f"Worker {pid} did not stop within {WORKER_SHUTDOWN_TIMEOUT}s; killing it", err=True)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._children.discard(pid)
+
+@click.command()
+@click.option('--host', default='0.0.0.0', show_default=True, help='Interface to listen on.')
+@click.option('--port', default=5000, show_default=True, help='Port to listen on.')
+@click.option('--workers', '-w', type=int, default=default_worker_count,
+              help='Worker processes (default: $WEB_CONCURRENCY or the CPU count).')
+@click.option('--pool-size', default=database.POOL_SIZE, show_default=True,
+              help='Pooled database connections per worker.')
+@click.option('--access-log/--no-access-log', default=False, help='Log every request to stderr.')
+@click.option('--slow-query-ms', type=float, help='Log SQL statements slower than this many milliseconds.')
+@click.option('--explain-queries', is_flag=True, help='Log query plans that scan a whole table.')
+@click.option('--archive-after-days', type=click.IntRange(min=0),
+              help='Hourly, move loans returned more than this many days ago to loan_history.')
+def main(host, port, workers, pool_size, access_log, slow_query_ms, explain_queries, archive_after_days):
+    """Run the library app on a pre-fork multi-process server."""
+    if sys.platform == 'win32':
+        raise click.UsageError('serve.py needs os.fork(); use "python app.py" on Windows.')
+    logging.getLogger('werkzeug').setLevel(logging.INFO if access_log else logging.WARNING)
+    # Workers open their connections after the fork, so they all pick this up
+    querylog.configure_query_log(slow_query_ms, explain_queries)
+    PreforkServer(create_app(), host, port, workers, pool_size, archive_after_days).run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Archive Service Module - Loan history archival
+Moves long-returned loans from borrow_records into loan_history in batches
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from database import archive_closed_loans, DatabaseBusyError
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+# Pause between batches, so other writers get the database lock in between
+ARCHIVE_PAUSE_SECONDS = 0.05
+ARCHIVE_INTERVAL_SECONDS = 3600
+
+def archive_loans(max_age_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                  pause: float = ARCHIVE_PAUSE_SECONDS, max_batches: Optional[int] = None) -> Dict:
+    """
+    Archive every loan returned more than ``max_age_days`` ago.
+
+    Each batch is its own short transaction, so circulation keeps running
+    while a large backlog is moved.
+
+    Returns:
+        dict: archived (loans moved), batches and returned_before (the cutoff)
+    """
+    if max_age_days < 0:
+        raise ValueError("Archive age must not be negative.")
+    if batch_size < 1:
+        raise ValueError("Batch size must be a positive integer.")
+
+    returned_before = datetime.now() - timedelta(days=max_age_days)
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_closed_loans(returned_before, batch_size)
+        batches += 1
+        archived += moved
+        if moved < batch_size:
+            break
+        time.sleep(pause)
+    return {'archived': archived, 'batches': batches, 'returned_before': returned_before.isoformat()}
+
+def start_loan_archiver(max_age_days: int = ARCHIVE_AFTER_DAYS, interval: float = ARCHIVE_INTERVAL_SECONDS,
+                        stop: Optional[threading.Event] = None) -> threading.Thread:
+    """Run archive_loans every ``interval`` seconds from a daemon thread until ``stop`` is set."""
+    stop = stop or threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                result = archive_loans(max_age_days)
+                if result['archived']:
+                    logger.info("Archived %d loans returned before %s", result['archived'], result['returned_before'])
+            except DatabaseBusyError:
+                logger.warning("Loan archiving skipped: the database is busy")
+            stop.wait(interval)
+
+    thread = threading.Thread(target=run, name='loan-archiver', daemon=True)
+    thread.start()
+    return thread
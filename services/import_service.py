@@ -0,0 +1,130 @@
+"""
+Import Service Module - Bulk catalog import
+Streams CSV or JSON Lines book lists into the catalog in batches
+"""
+
+import csv
+import json
+from typing import Callable, Dict, IO, Iterator, Optional, Tuple
+from database import insert_books_bulk
+from services.library_service import validate_book_details
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+
+def read_book_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Stream book records from a text file.
+    
+    CSV input needs a header row with title, author, isbn and total_copies
+    columns; JSON Lines input has one object with those keys per line.
+    Open files as 'utf-8-sig' so a byte order mark (as Excel writes) is
+    not read into the first column name.
+    
+    Yields:
+        tuple: (row number, record or None, parse error or None)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None, "Invalid JSON."
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Each line must be a JSON object."
+                continue
+            yield line_number, record, None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+def _parse_record(record: Dict) -> Tuple[Optional[Tuple[str, str, str, int]], Optional[str]]:
+    title = str(record.get('title') or '')
+    author = str(record.get('author') or '')
+    isbn = str(record.get('isbn') or '').strip()
+    value = record.get('total_copies')
+    # int() would quietly turn 2.7 into 2 and true into 1
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None, "Total copies must be a positive integer."
+    try:
+        total_copies = int(value)
+    except (ValueError, TypeError):
+        return None, "Total copies must be a positive integer."
+    
+    error = validate_book_details(title, author, isbn, total_copies)
+    if error:
+        return None, error
+    return (title.strip(), author.strip(), isbn, total_copies), None
+
+def import_books(stream: IO[str], fmt: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 on_error: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Import books from a CSV or JSON Lines stream.
+    Bulk counterpart of add_book_to_catalog (R1)
+    
+    Rows are validated with the same rules as add_book_to_catalog and
+    inserted ``batch_size`` at a time, one transaction per batch. Only one
+    batch is held in memory; rejected rows are passed to ``on_error`` as
+    they are found instead of being collected.
+    
+    Args:
+        stream: Text stream to read from
+        fmt: 'csv' or 'jsonl'
+        batch_size: Rows per insert batch (clamped to 1..MAX_BATCH_SIZE)
+        on_error: Called with {'row', 'isbn', 'error'} for each rejected row
+        
+    Returns:
+        dict: Contains rows, imported and failed counts
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    summary = {'rows': 0, 'imported': 0, 'failed': 0}
+    
+    def reject(row_number, isbn, error):
+        summary['failed'] += 1
+        if on_error:
+            on_error({'row': row_number, 'isbn': isbn, 'error': error})
+    
+    batch = []
+    batch_rows = {}
+    
+    def flush():
+        inserted, duplicates = insert_books_bulk(batch)
+        summary['imported'] += inserted
+        for isbn in sorted(duplicates, key=batch_rows.get):
+            reject(batch_rows[isbn], isbn, "A book with this ISBN already exists.")
+        batch.clear()
+        batch_rows.clear()
+    
+    for row_number, record, parse_error in read_book_records(stream, fmt):
+        summary['rows'] += 1
+        if parse_error:
+            reject(row_number, None, parse_error)
+            continue
+        
+        book, error = _parse_record(record)
+        if error:
+            reject(row_number, record.get('isbn'), error)
+            continue
+        
+        # Duplicates within a batch are caught here; across batches the
+        # earlier batch is already committed and the database lookup finds it
+        if book[2] in batch_rows:
+            reject(row_number, book[2], "A book with this ISBN already exists.")
+            continue
+        
+        batch.append(book)
+        batch_rows[book[2]] = row_number
+        if len(batch) >= batch_size:
+            flush()
+    
+    flush()
+    return summary
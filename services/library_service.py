@@ -3,45 +3,178 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import base64
+import json
+import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count, get_patron_borrowed_books,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books
+    get_book_by_id, get_book_by_isbn, get_patron_borrowed_books, iter_open_loans,
+    iter_unpaid_overdue_loans, record_payment, record_refund, get_payment, get_payment_totals,
+    iter_payments,
+    insert_book, checkout_book, checkout_books, checkin_book, checkin_books, search_books,
+    get_books_page, get_books_by_ids, get_patron_loan_summary, DatabaseBusyError
 )
+from search_index import get_catalog_index
 from services.payment_service import PaymentGateway
 
+BORROWING_LIMIT = 5
+LOAN_PERIOD_DAYS = 14
+LATE_FEE_PER_DAY = 0.50  # $0.50 per day late fee
+SEARCH_RESULT_LIMIT = 100
+FUZZY_SEARCH_THRESHOLD = 0.5
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+MAX_BATCH_BOOKS = 50
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 200
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway) -> Tuple[bool, str]:
     """
     Process late fee payment for a book using the payment gateway.
+    
+    Only the part of the fee not already paid is charged, and the charge
+    is recorded in the payments ledger against the loan.
     Returns (success: bool, message: str)
     """
     # Validate patron
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID"
 
-    # Get late fee
+    # Get late fee, less anything already paid against the loan
+    now = datetime.now()
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
-    amount = fee_info.get("fee_amount", 0.0)
+    loans = list(iter_unpaid_overdue_loans([patron_id], now, book_id))
+    paid_amount = loans[0]['paid_amount'] if loans else 0.00
+    amount = round(fee_info.get("fee_amount", 0.0) - paid_amount, 2)
 
     if amount <= 0:
         return False, "No late fees to pay"
 
     try:
-        # Here we expect the payment_gateway mock to return True/False
-        success = payment_gateway.process_payment(patron_id, amount)
-        if success:
-            return True, f"Payment successful for book {book_id}, amount: ${amount:.2f}"
-        else:
-            return False, "Payment declined"
+        # The gateway returns a truthy response (ideally with a transaction_id) on success
+        response = payment_gateway.process_payment(patron_id, amount)
     except Exception as e:
         return False, f"Payment failed: {str(e)}"
+    if not response:
+        return False, "Payment declined"
+    
+    transaction_id = _transaction_reference(response, 'pay')
+    allocations = [{'record_id': loans[0]['record_id'], 'patron_id': patron_id,
+                    'book_id': book_id, 'amount': amount}] if loans else []
+    if not record_payment(transaction_id, patron_id, amount, allocations, now):
+        return True, (f"Payment of ${amount:.2f} succeeded (transaction {transaction_id}) "
+                      "but could not be recorded in the ledger")
+    return True, f"Payment successful for book {book_id}, amount: ${amount:.2f} (transaction {transaction_id})"
+
+
+def _transaction_reference(response, prefix: str) -> str:
+    """Use the gateway's transaction ID, or a local reference if it gave none."""
+    transaction_id = response.get('transaction_id') if isinstance(response, dict) else None
+    return transaction_id or f"{prefix}-{uuid.uuid4().hex}"
+
+
+def _settle_patron(patron_id: str, loans: List[Dict], now: datetime,
+                   payment_gateway: PaymentGateway) -> Dict:
+    """Charge one patron once for the unpaid fees on ``loans`` and record the split."""
+    allocations = []
+    for loan in loans:
+        fee_amount = _late_fee(loan['days_overdue'])
+        outstanding = round(fee_amount - loan['paid_amount'], 2)
+        if outstanding > 0:
+            allocations.append({
+                'record_id': loan['record_id'],
+                'patron_id': patron_id,
+                'book_id': loan['book_id'],
+                'title': loan['title'],
+                'amount': outstanding
+            })
+    
+    result = {'patron_id': patron_id, 'success': False, 'amount': 0.00,
+              'transaction_id': None, 'allocations': []}
+    amount = round(sum(a['amount'] for a in allocations), 2)
+    if amount <= 0:
+        result['message'] = "No late fees to pay"
+        return result
+    
+    try:
+        response = payment_gateway.process_payment(patron_id, amount)
+    except Exception as e:
+        result['message'] = f"Payment failed: {str(e)}"
+        return result
+    if not response:
+        result['message'] = "Payment declined"
+        return result
+    
+    transaction_id = _transaction_reference(response, 'settle')
+    result.update(success=True, amount=amount, transaction_id=transaction_id, allocations=[
+        {'book_id': a['book_id'], 'title': a['title'], 'amount': a['amount']} for a in allocations
+    ])
+    if record_payment(transaction_id, patron_id, amount, allocations, now):
+        result['message'] = f"Payment successful for {len(allocations)} books, amount: ${amount:.2f}"
+    else:
+        result['message'] = (f"Payment of ${amount:.2f} succeeded (transaction {transaction_id}) "
+                             "but could not be recorded in the ledger")
+    return result
+
+
+def settle_patron_fees(patron_id: str, payment_gateway: PaymentGateway) -> Tuple[bool, str, Dict]:
+    """
+    Pay all of a patron's outstanding late fees with a single gateway charge.
+    
+    Outstanding fees for every overdue loan are read in one query (minus
+    any amount already settled against each loan), charged once, and the
+    per-book split is recorded in fee_allocations.
+    
+    Returns:
+        tuple: (success: bool, message: str, details: dict with amount,
+        transaction_id and per-book allocations)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID", {}
+    
+    now = datetime.now()
+    # Nothing can be owed before the patron's earliest due date
+    next_due_date = get_patron_loan_summary(patron_id)['next_due_date']
+    loans = list(iter_unpaid_overdue_loans([patron_id], now)) if next_due_date and next_due_date < now else []
+    result = _settle_patron(patron_id, loans, now, payment_gateway)
+    return result['success'], result['message'], result
+
+
+def settle_fees_for_patrons(patron_ids: Optional[List[str]], payment_gateway: PaymentGateway) -> Iterator[Dict]:
+    """
+    Batch billing run: settle outstanding late fees for many patrons.
+    
+    Loans for all patrons come from one query, ordered by patron; each
+    patron with fees owing is charged once.
+    
+    Args:
+        patron_ids: Patrons to bill, or None for every patron with overdue loans
+        
+    Yields:
+        dict: The settle_patron_fees details for each patron, with success and message
+    """
+    if patron_ids is not None:
+        invalid = [p for p in patron_ids if not p or not p.isdigit() or len(p) != 6]
+        for patron_id in invalid:
+            yield {'patron_id': patron_id, 'success': False, 'message': "Invalid patron ID",
+                   'amount': 0.00, 'transaction_id': None, 'allocations': []}
+        patron_ids = [p for p in patron_ids if p not in invalid]
+    
+    # Read everything up front so no database connection is held across gateway calls
+    now = datetime.now()
+    loans = list(iter_unpaid_overdue_loans(patron_ids, now))
+    for patron_id, patron_loans in groupby(loans, key=lambda loan: loan['patron_id']):
+        yield _settle_patron(patron_id, list(patron_loans), now, payment_gateway)
 
 
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway) -> Tuple[bool, str]:
     """
     Refund a late fee payment using the payment gateway.
+    
+    The refund is checked against the original charge in the payments
+    ledger and recorded there once the gateway accepts it.
     Returns (success: bool, message: str)
     """
     if not transaction_id:
@@ -49,49 +182,93 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
 
     if amount <= 0 or amount > 15:
         return False, "Invalid refund amount"
+    
+    payment = get_payment(transaction_id)
+    if payment is None:
+        return False, "Transaction not found"
+    
+    refundable = round(payment['amount'] - payment['refunded_amount'], 2)
+    if amount > refundable:
+        return False, f"Refund exceeds the original charge (${refundable:.2f} refundable)"
 
     try:
-        # Expect mock to return True/False
+        # The gateway returns a truthy response on success
         success = payment_gateway.refund_payment(transaction_id, amount)
-        if success:
-            return True, f"Refund successful for transaction {transaction_id}, amount: ${amount:.2f}"
-        else:
-            return False, "Refund declined"
     except Exception as e:
         return False, f"Refund failed: {str(e)}"
+    if not success:
+        return False, "Refund declined"
+    
+    if not record_refund(transaction_id, amount, datetime.now()):
+        return True, (f"Refund of ${amount:.2f} succeeded for transaction {transaction_id} "
+                      "but could not be recorded in the ledger")
+    return True, f"Refund successful for transaction {transaction_id}, amount: ${amount:.2f}"
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+def reconcile_payments(month: str, include_entries: bool = False) -> Dict:
     """
-    Add a new book to the catalog.
-    Implements R1: Book Catalog Management
+    Month-end reconciliation from the payments ledger, without the gateway.
     
     Args:
-        title: Book title (max 200 chars)
-        author: Book author (max 100 chars)
-        isbn: 13-digit ISBN
-        total_copies: Number of copies (positive integer)
+        month: Month to reconcile as YYYY-MM
         
     Returns:
-        tuple: (success: bool, message: str)
+        dict: Charge and refund counts and totals and the net amount, plus
+        the month's ledger entries if requested; raises ValueError for a
+        malformed month
+    """
+    start = datetime.strptime(month, '%Y-%m')
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    report = get_payment_totals(start, end)
+    report['month'] = month
+    if include_entries:
+        report['entries'] = list(iter_payments(start, end))
+    return report
+
+def validate_book_details(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """
+    Validate book details against the R1 catalog rules.
+    
+    Returns:
+        str: The first validation error message, or None if the details are valid
     """
-    # Input validation
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     
     if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+        return "ISBN must be exactly 13 digits."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
+    
+    return None
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    """
+    Add a new book to the catalog.
+    Implements R1: Book Catalog Management
+    
+    Args:
+        title: Book title (max 200 chars)
+        author: Book author (max 100 chars)
+        isbn: 13-digit ISBN
+        total_copies: Number of copies (positive integer)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    # Input validation
+    error = validate_book_details(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -105,6 +282,31 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     else:
         return False, "Database error occurred while adding the book."
 
+def _borrow_result(status: str, book: Optional[Dict], due_date: datetime) -> Tuple[bool, str]:
+    """Map a checkout status to the (success, message) shown to the patron."""
+    if status == 'not_found':
+        return False, "Book not found."
+
+    if status == 'unavailable':
+        return False, "This book is currently not available."
+
+    if status == 'limit_reached':
+        return False, f"You have reached the maximum borrowing limit of {BORROWING_LIMIT} books."
+
+    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+
+
+def _return_result(status: str, book: Optional[Dict]) -> Tuple[bool, str]:
+    """Map a checkin status to the (success, message) shown to the patron."""
+    if status == 'not_found':
+        return False, "Book not found."
+
+    if status == 'not_borrowed':
+        return False, "No active borrow record found for this book and patron."
+
+    return True, f'Successfully returned "{book["title"]}".'
+
+
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
@@ -121,64 +323,120 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-    
-    # Create borrow record
+    # Loan period
     borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
+    due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
-    
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    # Availability check, limit check, borrow record and availability update
+    # all happen in a single transaction
+    try:
+        status, book = checkout_book(patron_id, book_id, borrow_date, due_date, BORROWING_LIMIT)
+    except DatabaseBusyError:
+        return False, "The library database is busy. Please try again."
     
-    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+    return _borrow_result(status, book, due_date)
 
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Process book return by a patron.
+    Implements R4 as per requirements
     
-    TODO: Implement R4 as per requirements
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to return
+        
+    Returns:
+        tuple: (success: bool, message: str)
     """
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
+    # Close the borrow record and update availability in a single transaction
+    try:
+        status, book = checkin_book(patron_id, book_id, datetime.now())
+    except DatabaseBusyError:
+        return False, "The library database is busy. Please try again."
     
-    # Update the borrow record with return date
-    return_date = datetime.now()
-    return_success = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not return_success:
-        return False, "No active borrow record found for this book and patron."
+    return _return_result(status, book)
+
+
+
+
+def _batch_results(book_ids: List[int], results: List[Tuple[bool, str]]) -> List[Dict]:
+    return [
+        {'book_id': book_id, 'success': success, 'message': message}
+        for book_id, (success, message) in zip(book_ids, results)
+    ]
+
+
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow several books for one patron in a single transaction.
+    Batch counterpart of borrow_book_by_patron (R3)
     
-    # Update book availability
-    availability_success = update_book_availability(book_id, 1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    Each book gets the same checks and message as borrow_book_by_patron;
+    books are processed in order, so the borrowing limit applies to the
+    whole set.
     
-    return True, f'Successfully returned "{book["title"]}".'
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow (at most MAX_BATCH_BOOKS)
+        
+    Returns:
+        tuple: (success: bool, message: str, results: list of
+        {'book_id', 'success', 'message'} per book)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", []
+    
+    if not book_ids or len(book_ids) > MAX_BATCH_BOOKS:
+        return False, f"Provide between 1 and {MAX_BATCH_BOOKS} book IDs.", []
+    
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
+    try:
+        statuses = checkout_books(patron_id, book_ids, borrow_date, due_date, BORROWING_LIMIT)
+    except DatabaseBusyError:
+        return False, "The library database is busy. Please try again.", []
+    
+    results = _batch_results(book_ids, [_borrow_result(status, book, due_date) for status, book in statuses])
+    borrowed = sum(result['success'] for result in results)
+    return borrowed > 0, f"Borrowed {borrowed} of {len(book_ids)} books.", results
+
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Return several books for one patron in a single transaction.
+    Batch counterpart of return_book_by_patron (R4)
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to return (at most MAX_BATCH_BOOKS)
+        
+    Returns:
+        tuple: (success: bool, message: str, results: list of
+        {'book_id', 'success', 'message'} per book)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", []
+    
+    if not book_ids or len(book_ids) > MAX_BATCH_BOOKS:
+        return False, f"Provide between 1 and {MAX_BATCH_BOOKS} book IDs.", []
+    
+    try:
+        statuses = checkin_books(patron_id, book_ids, datetime.now())
+    except DatabaseBusyError:
+        return False, "The library database is busy. Please try again.", []
+    
+    results = _batch_results(book_ids, [_return_result(status, book) for status, book in statuses])
+    returned = sum(result['success'] for result in results)
+    return returned > 0, f"Returned {returned} of {len(book_ids)} books.", results
 
 
+def _late_fee(days_overdue: int) -> float:
+    """Return the fee for a loan days_overdue whole days late (computed by the loan queries)."""
+    return round(days_overdue * LATE_FEE_PER_DAY, 2)
 
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
@@ -227,21 +485,16 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': 'This book is not currently borrowed by this patron'
         }
     
-    # Calculate days overdue
-    current_date = datetime.now()
-    due_date = target_book['due_date']
-    
-    if current_date <= due_date:
+    # Overdue status and days overdue come from the loan query
+    if not target_book['is_overdue']:
         return {
             'fee_amount': 0.00,
             'days_overdue': 0,
             'status': 'Book is not overdue'
         }
     
-    # Calculate overdue days and fee
-    days_overdue = (current_date - due_date).days
-    fee_per_day = 0.50  # $0.50 per day late fee
-    fee_amount = round(days_overdue * fee_per_day, 2)
+    days_overdue = target_book['days_overdue']
+    fee_amount = _late_fee(days_overdue)
     
     return {
         'fee_amount': fee_amount,
@@ -250,44 +503,147 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     }
 
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def calculate_late_fees_bulk(patron_ids: Optional[List[str]] = None,
+                             overdue_only: bool = True) -> Iterator[Dict]:
+    """
+    Calculate late fees for every open loan, or for a set of patrons.
+    Batch counterpart of calculate_late_fee_for_book (R5)
+    
+    Args:
+        patron_ids: 6-digit library card IDs to include; None for all patrons
+        overdue_only: Skip loans that are not overdue (filtered in SQL)
+        
+    Yields:
+        dict: patron_id, book_id and title, plus the same fee_amount,
+        days_overdue and status fields as calculate_late_fee_for_book
+    """
+    now = datetime.now()
+    loans = iter_open_loans(patron_ids, due_before=now if overdue_only else None, now=now)
+    for loan in loans:
+        if not loan['is_overdue']:
+            fee_amount, days_overdue, status = 0.00, 0, 'Book is not overdue'
+        else:
+            days_overdue = loan['days_overdue']
+            fee_amount = _late_fee(days_overdue)
+            status = f'Book is overdue by {days_overdue} days'
+        
+        yield {
+            'patron_id': loan['patron_id'],
+            'book_id': loan['book_id'],
+            'title': loan['title'],
+            'fee_amount': fee_amount,
+            'days_overdue': days_overdue,
+            'status': status
+        }
+
+
+def _encode_catalog_cursor(book: Dict, backward: bool) -> str:
+    payload = json.dumps([book['title'], book['id'], 'prev' if backward else 'next'])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def _decode_catalog_cursor(cursor: str) -> Tuple[Tuple[str, int], bool]:
+    try:
+        title, book_id, direction = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(title, str) or not isinstance(book_id, int) or direction not in ('next', 'prev'):
+        raise ValueError("Invalid cursor.")
+    return (title, book_id), direction == 'prev'
+
+
+def get_catalog_page(cursor: Optional[str] = None, limit: int = CATALOG_PAGE_SIZE) -> Dict:
+    """
+    Get one page of the catalog, ordered by title.
+    Implements R2 for large catalogs using keyset pagination
+    
+    Args:
+        cursor: Opaque cursor from a previous page's next_cursor/prev_cursor,
+            or None for the first page
+        limit: Page size, clamped to 1..CATALOG_MAX_PAGE_SIZE
+        
+    Returns:
+        dict: Contains books, limit, next_cursor and prev_cursor (None when
+        there is no such page)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = max(1, min(limit, CATALOG_MAX_PAGE_SIZE))
+    
+    if cursor:
+        key, backward = _decode_catalog_cursor(cursor)
+    else:
+        key, backward = None, False
+    
+    books, has_more = get_books_page(key, limit, backward)
+    
+    # Paging forward from a cursor implies a previous page exists, and vice versa
+    has_next = has_more if not backward else True
+    has_prev = has_more if backward else key is not None
+    
+    return {
+        'books': books,
+        'limit': limit,
+        'next_cursor': _encode_catalog_cursor(books[-1], False) if books and has_next else None,
+        'prev_cursor': _encode_catalog_cursor(books[0], True) if books and has_prev else None
+    }
+
+
+def search_books_in_catalog(search_term: str, search_type: str,
+                            threshold: float = FUZZY_SEARCH_THRESHOLD) -> List[Dict]:
     """
     Search for books in the catalog.
     Implements R6 as per requirements
     
     Args:
         search_term: Term to search for
-        search_type: Type of search ('title', 'author', or 'isbn')
+        search_type: Type of search ('title', 'author', 'isbn', or 'fuzzy'
+            for typo-tolerant title/author matching)
+        threshold: Minimum similarity (0-1) for fuzzy matches
         
     Returns:
-        list: List of matching books
+        list: List of matching books, best matches first (at most SEARCH_RESULT_LIMIT);
+        fuzzy results also carry a 'similarity' score
     """
     # Validate inputs
     if not search_term or not search_term.strip():
         return []
     
-    if search_type not in ['title', 'author', 'isbn']:
+    if search_type not in ['title', 'author', 'isbn', 'fuzzy']:
         return []
     
-    search_term = search_term.strip().lower()
+    if search_type == 'fuzzy':
+        matches = get_catalog_index().search(search_term.strip(), threshold, SEARCH_RESULT_LIMIT)
+        scores = dict(matches)
+        books = get_books_by_ids([book_id for book_id, _ in matches])
+        for book in books:
+            book['similarity'] = scores[book['id']]
+        return books
     
-    # Get all books from database
-    all_books = get_all_books()
+    # Title/author use the full-text index, ISBN the unique index
+    return search_books(search_term.strip(), search_type, limit=SEARCH_RESULT_LIMIT)
+
+
+def autocomplete_catalog(prefix: str, field: str = 'title', limit: int = AUTOCOMPLETE_LIMIT) -> List[str]:
+    """
+    Suggest titles or authors starting with a prefix (search-as-you-type).
     
-    # Filter based on search type
-    results = []
-    for book in all_books:
-        if search_type == 'title':
-            if search_term in book.get('title', '').lower():
-                results.append(book)
-        elif search_type == 'author':
-            if search_term in book.get('author', '').lower():
-                results.append(book)
-        elif search_type == 'isbn':
-            if search_term == book.get('isbn', '').lower():
-                results.append(book)
+    Args:
+        prefix: What the user has typed so far
+        field: 'title' or 'author'
+        limit: Maximum number of suggestions (clamped to 1..AUTOCOMPLETE_MAX_LIMIT)
+        
+    Returns:
+        list: Distinct matching titles or authors in alphabetical order
+    """
+    if not prefix or not prefix.strip() or field not in ('title', 'author'):
+        return []
     
-    return results
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    index = get_catalog_index()
+    prefix_index = index.title_prefix if field == 'title' else index.author_prefix
+    return prefix_index.complete(prefix, limit)
 
 
 def get_patron_status_report(patron_id: str) -> Dict:
@@ -309,29 +665,41 @@ def get_patron_status_report(patron_id: str) -> Dict:
             'books_borrowed': 0,
             'books_available_to_borrow': 0,
             'borrowed_books': [],
-            'total_late_fees': 0.00
+            'total_late_fees': 0.00,
+            'late_fees_paid': 0.00,
+            'late_fees_outstanding': 0.00
         }
     
-    # Get patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    books_available = max(0, 5 - current_borrowed)
+    # The loan count comes from the patron's counters row; the open loans
+    # are only queried when there are some, and fees computed in one pass
+    current_borrowed = get_patron_loan_summary(patron_id)['active_loans']
+    borrowed_books = get_patron_borrowed_books(patron_id) if current_borrowed else []
+    books_available = max(0, BORROWING_LIMIT - current_borrowed)
     
-    # Get detailed information about borrowed books
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    
-    # Calculate total late fees
+    # Calculate total late fees and how much of them the ledger shows as paid
     total_late_fees = 0.00
+    total_paid = 0.00
     for book in borrowed_books:
-        if book['is_overdue']:
-            fee_info = calculate_late_fee_for_book(patron_id, book['book_id'])
-            total_late_fees += fee_info['fee_amount']
+        book['fee_amount'] = _late_fee(book['days_overdue'])
+        book['fee_paid'] = min(book.pop('paid_amount'), book['fee_amount'])
+        book['fee_outstanding'] = round(book['fee_amount'] - book['fee_paid'], 2)
+        if book['fee_amount'] == 0:
+            book['fee_status'] = 'No fee'
+        elif book['fee_outstanding'] == 0:
+            book['fee_status'] = 'Paid'
+        else:
+            book['fee_status'] = 'Unpaid'
+        total_late_fees += book['fee_amount']
+        total_paid += book['fee_paid']
     
     return {
         'patron_id': patron_id,
         'status': 'Active',
         'books_borrowed': current_borrowed,
         'books_available_to_borrow': books_available,
-        'borrowing_limit': 5,
+        'borrowing_limit': BORROWING_LIMIT,
         'borrowed_books': borrowed_books,
-        'total_late_fees': round(total_late_fees, 2)
+        'total_late_fees': round(total_late_fees, 2),
+        'late_fees_paid': round(total_paid, 2),
+        'late_fees_outstanding': round(total_late_fees - total_paid, 2)
     }
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+Payment Queue Module - Asynchronous late fee payments
+Runs pay_late_fees on a bounded worker pool so requests never wait on the gateway
+"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from database import (
+    claim_expired_payment_jobs, create_payment_job, finish_payment_job, get_payment_job, get_payment_job_by_key,
+    renew_payment_job_leases, start_payment_job, DatabaseBusyError
+)
+from services.library_service import pay_late_fees
+from services.payment_service import PaymentGateway
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_WORKERS = 4
+MAX_PENDING_PAYMENTS = 100
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+# Finished jobs (and so their idempotency keys) are kept this long
+PAYMENT_JOB_RETENTION_HOURS = 24
+# Unfinished jobs whose queue has not renewed their lease for this long are
+# taken over by another queue; leases are renewed every third of it
+PAYMENT_JOB_LEASE_SECONDS = 60
+
+class PaymentRejectedError(Exception):
+    """Raised when a payment is not queued; the message says why."""
+
+class InvalidPaymentError(PaymentRejectedError):
+    """The patron ID or idempotency key is malformed."""
+
+class IdempotencyConflictError(PaymentRejectedError):
+    """The idempotency key was already used for a different payment."""
+
+class PaymentQueueBusyError(PaymentRejectedError):
+    """The queue is full or the database is busy; the payment may be retried later."""
+
+class PaymentQueue:
+    """
+    Queue of late fee payment jobs processed by a bounded thread pool.
+    
+    Every job carries a client-supplied idempotency key: submitting the
+    same key again returns the original job instead of charging twice.
+    Jobs live in the payment_jobs table, so every server process sees the
+    same jobs and keys; finished jobs are deleted once they are older than
+    the retention period, after which their keys can be used again.
+    
+    Each queue holds a lease on its unfinished jobs and renews it from a
+    background thread. Jobs left behind by a queue that stopped renewing
+    (its process was killed or replaced) are claimed and run by another
+    queue, first when it starts and then on every renewal.
+    """
+
+    def __init__(self, payment_gateway: PaymentGateway, max_workers: int = PAYMENT_WORKERS,
+                 max_pending: int = MAX_PENDING_PAYMENTS,
+                 retention_hours: float = PAYMENT_JOB_RETENTION_HOURS,
+                 lease_seconds: float = PAYMENT_JOB_LEASE_SECONDS):
+        self.payment_gateway = payment_gateway
+        self.max_pending = max_pending
+        self.retention = timedelta(hours=retention_hours)
+        self.lease = timedelta(seconds=lease_seconds)
+        # Marks this queue's jobs in payment_jobs
+        self.owner = uuid.uuid4().hex
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='payment')
+        # Jobs queued on this process's executor and not yet finished
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stop_leases = threading.Event()
+        self._leases = threading.Thread(target=self._keep_leases, name='payment-leases', daemon=True)
+        self._leases.start()
+
+    def submit(self, patron_id: str, book_id: int, idempotency_key: str) -> Tuple[str, Dict]:
+        """
+        Queue a late fee payment.
+        
+        Returns:
+            tuple: (message: str, job: dict)
+        
+        Raises:
+            InvalidPaymentError: If the patron ID or idempotency key is malformed
+            IdempotencyConflictError: If the key was used for a different payment
+            PaymentQueueBusyError: If the queue is full or the database is busy
+        """
+        if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+            raise InvalidPaymentError("Invalid patron ID")
+        
+        if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise InvalidPaymentError("An idempotency key of at most 128 characters is required")
+        
+        with self._lock:
+            reserved = self._pending < self.max_pending
+            if reserved:
+                self._pending += 1
+        
+        created = False
+        try:
+            if not reserved:
+                # A retry of an accepted payment is still answered when full
+                job = get_payment_job_by_key(idempotency_key)
+                if job is None:
+                    raise PaymentQueueBusyError("Payment queue is full, please retry later")
+            else:
+                now = datetime.now()
+                created, job = create_payment_job(uuid.uuid4().hex, idempotency_key, patron_id, book_id,
+                                                  now, now - self.retention, self.owner, now + self.lease)
+        except DatabaseBusyError:
+            raise PaymentQueueBusyError("The library database is busy, please retry later") from None
+        finally:
+            if reserved and not created:
+                with self._lock:
+                    self._pending -= 1
+        
+        if not created:
+            if (job['patron_id'], job['book_id']) != (patron_id, book_id):
+                raise IdempotencyConflictError("Idempotency key was already used for a different payment")
+            return "Payment already submitted", job
+        
+        self._executor.submit(self._run, job['job_id'], patron_id, book_id)
+        return "Payment queued", job
+
+    def _run(self, job_id: str, patron_id: str, book_id: int) -> None:
+        try:
+            if not start_payment_job(job_id, self.owner):
+                return
+            try:
+                success, message = pay_late_fees(patron_id, book_id, self.payment_gateway)
+            except Exception as e:
+                success, message = False, f"Payment failed: {str(e)}"
+            if not finish_payment_job(job_id, self.owner, success, message, datetime.now()):
+                logger.warning("Payment job %s was reclaimed by another queue before it finished", job_id)
+        except Exception:
+            logger.exception("Could not record the outcome of payment job %s", job_id)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def reclaim_jobs(self) -> int:
+        """
+        Renew this queue's leases and claim jobs whose leases have run out.
+
+        Claims are limited to the free room in this queue.
+
+        Returns:
+            int: Number of jobs claimed
+        """
+        now = datetime.now()
+        renew_payment_job_leases(self.owner, now + self.lease)
+        with self._lock:
+            room = 0 if self._closed else max(0, self.max_pending - self._pending)
+            self._pending += room
+        claimed = []
+        try:
+            claimed = claim_expired_payment_jobs(self.owner, now, now + self.lease, room)
+        finally:
+            with self._lock:
+                self._pending -= room - len(claimed)
+        for job in claimed:
+            logger.info("Claimed orphaned payment job %s", job['job_id'])
+            self._executor.submit(self._run, job['job_id'], job['patron_id'], job['book_id'])
+        return len(claimed)
+
+    def _keep_leases(self) -> None:
+        while True:
+            try:
+                self.reclaim_jobs()
+            except Exception:
+                logger.exception("Could not renew payment job leases")
+            if self._stop_leases.wait(self.lease.total_seconds() / 3):
+                return
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job by ID, or None if unknown (or expired)."""
+        return get_payment_job(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work and optionally wait for queued payments."""
+        with self._lock:
+            self._closed = True
+        # Leases are renewed until the queued payments have drained
+        self._executor.shutdown(wait=wait)
+        self._stop_leases.set()
+        self._leases.join()
+
+_queue: Optional[PaymentQueue] = None
+_queue_lock = threading.Lock()
+
+def configure_payment_queue(payment_gateway: PaymentGateway, max_workers: int = PAYMENT_WORKERS,
+                            max_pending: int = MAX_PENDING_PAYMENTS) -> PaymentQueue:
+    """Replace the shared payment queue, draining the previous one."""
+    global _queue
+    with _queue_lock:
+        previous, _queue = _queue, PaymentQueue(payment_gateway, max_workers, max_pending)
+    if previous is not None:
+        previous.shutdown(wait=True)
+    return _queue
+
+def get_payment_queue() -> PaymentQueue:
+    """Get the shared payment queue, creating one with the default gateway on first use."""
+    with _queue_lock:
+        if _queue is not None:
+            return _queue
+    return configure_payment_queue(PaymentGateway())
+
+def get_payment_gateway() -> PaymentGateway:
+    """Get the gateway payments are charged through: the one the shared queue was configured with."""
+    return get_payment_queue().payment_gateway
+
+def shutdown_payment_queue(wait: bool = True) -> None:
+    """Drain and drop the shared payment queue, if one was started."""
+    global _queue
+    with _queue_lock:
+        previous, _queue = _queue, None
+    if previous is not None:
+        previous.shutdown(wait=wait)
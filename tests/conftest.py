@@ -0,0 +1,12 @@
+import pytest
+import database
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the database module at a fresh, seeded database file."""
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    database.init_database()
+    database.add_sample_data()
+    yield database.DATABASE
+    database.get_pool().close()
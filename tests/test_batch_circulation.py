@@ -0,0 +1,70 @@
+import pytest
+import database
+from app import create_app
+from services.library_service import borrow_books_by_patron, return_books_by_patron
+
+
+@pytest.fixture
+def client(temp_db):
+    return create_app().test_client()
+
+
+@pytest.fixture
+def shelf(temp_db):
+    for i in range(6):
+        database.insert_book(f"Stack {i}", "Author", f"800000000000{i}", 1, 1)
+    return [database.get_book_by_isbn(f"800000000000{i}")['id'] for i in range(6)]
+
+
+def test_batch_borrow_per_item_results(shelf):
+    """Test each book in the stack gets its own result and message"""
+    success, message, results = borrow_books_by_patron("444444", [shelf[0], 3, 99999])
+    assert success is True
+    assert message == "Borrowed 1 of 3 books."
+    assert [r['success'] for r in results] == [True, False, False]
+    assert results[1]['message'] == "This book is currently not available."
+    assert results[2]['message'] == "Book not found."
+    assert database.get_book_by_id(shelf[0])['available_copies'] == 0
+
+
+def test_batch_borrow_applies_limit_across_the_stack(shelf):
+    """Test the borrowing limit counts books earlier in the same batch"""
+    success, message, results = borrow_books_by_patron("444444", shelf)
+    assert [r['success'] for r in results] == [True] * 5 + [False]
+    assert "maximum borrowing limit" in results[5]['message']
+    assert database.get_patron_borrow_count("444444") == 5
+
+
+def test_batch_return(shelf):
+    """Test returning a stack, including a book that was not borrowed"""
+    borrow_books_by_patron("444444", shelf[:2])
+    success, message, results = return_books_by_patron("444444", shelf[:3])
+    assert message == "Returned 2 of 3 books."
+    assert results[2]['message'] == "No active borrow record found for this book and patron."
+    assert database.get_patron_borrow_count("444444") == 0
+
+
+def test_batch_invalid_input(temp_db):
+    """Test invalid patron IDs and empty stacks are rejected up front"""
+    assert borrow_books_by_patron("12", [1]) == (False, "Invalid patron ID. Must be exactly 6 digits.", [])
+    assert borrow_books_by_patron("444444", [])[2] == []
+    assert return_books_by_patron("444444", list(range(51)))[2] == []
+
+
+def test_batch_borrow_api(client, shelf):
+    """Test the batch borrow endpoint is one round trip"""
+    response = client.post("/api/borrow/batch", json={"patron_id": "444444", "book_ids": shelf[:3]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['message'] == "Borrowed 3 of 3 books."
+    assert len(body['results']) == 3
+
+    response = client.post("/api/return/batch", json={"patron_id": "444444", "book_ids": shelf[:3]})
+    assert response.get_json()['message'] == "Returned 3 of 3 books."
+
+
+def test_batch_api_rejects_malformed_body(client):
+    """Test the batch endpoints validate the JSON body"""
+    assert client.post("/api/borrow/batch", json={"patron_id": "444444", "book_ids": ["1"]}).status_code == 400
+    assert client.post("/api/return/batch", data="nope").status_code == 400
+    assert client.post("/api/borrow/batch", json={"patron_id": "abc", "book_ids": [1]}).status_code == 400
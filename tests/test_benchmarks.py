@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+import database
+from benchmarks.dataset import generate_dataset
+from benchmarks.service_layer import BENCHMARKS, compare, run_benchmarks
+from services.library_service import BORROWING_LIMIT
+
+NOW = datetime(2026, 1, 15, 12, 0)
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", database.DATABASE)
+    summary = generate_dataset(str(tmp_path / "bench.db"), books=200, patrons=50, loans=1000, now=NOW)
+    yield summary
+    database.get_pool().close()
+
+
+def _snapshot():
+    with database.db_connection() as conn:
+        return conn.execute('''
+            SELECT b.isbn, b.available_copies, br.patron_id, br.due_date 
+            FROM borrow_records br JOIN books b ON br.book_id = b.id ORDER BY br.id
+        ''').fetchall()
+
+
+def test_dataset_is_deterministic(dataset, tmp_path):
+    """Test the same arguments generate the same rows"""
+    first = [tuple(row) for row in _snapshot()]
+    database.get_pool().close()
+    
+    again = generate_dataset(str(tmp_path / "again.db"), books=200, patrons=50, loans=1000, now=NOW)
+    
+    assert again == dataset
+    assert [tuple(row) for row in _snapshot()] == first
+
+
+def test_dataset_respects_library_rules(dataset):
+    """Test open loans stay within the borrowing limit and each book's copies"""
+    with database.db_connection() as conn:
+        most_loans = conn.execute('''
+            SELECT MAX(n) FROM (SELECT COUNT(*) as n FROM borrow_records 
+                                WHERE return_date IS NULL GROUP BY patron_id)
+        ''').fetchone()[0]
+        oversold = conn.execute('SELECT COUNT(*) FROM books WHERE available_copies < 0').fetchone()[0]
+    assert most_loans <= BORROWING_LIMIT
+    assert oversold == 0
+    assert 0 < dataset['overdue_loans'] < dataset['open_loans']
+
+
+def test_every_benchmark_runs(dataset):
+    """Test each service benchmark runs and reports percentiles"""
+    results = run_benchmarks(list(BENCHMARKS), 5, dataset)
+    
+    assert set(results) == set(BENCHMARKS)
+    for result in results.values():
+        assert result['p50_us'] <= result['p95_us'] <= result['p99_us']
+    assert results['borrow_book_by_patron']['failed'] == 0
+    assert results['return_book_by_patron']['failed'] == 0
+
+
+def test_compare_flags_regressions():
+    """Test only p50 slowdowns beyond the threshold count as regressions"""
+    baseline = {'fast': {'p50_us': 100.0, 'p95_us': 200.0}, 'slow': {'p50_us': 100.0, 'p95_us': 200.0}}
+    results = {'fast': {'p50_us': 110.0, 'p95_us': 400.0}, 'slow': {'p50_us': 150.0, 'p95_us': 210.0},
+               'new': {'p50_us': 1.0, 'p95_us': 1.0}}
+    
+    comparison = compare(results, baseline, threshold=0.2)
+    
+    assert set(comparison) == {'fast', 'slow'}
+    assert comparison['fast'] == {'p50_us': 1.1, 'p95_us': 2.0, 'regressed': False}
+    assert comparison['slow']['regressed'] is True
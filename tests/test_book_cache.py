@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+import database
+from cache import LRUCache
+from database import get_book_by_id, get_book_by_isbn, get_book_cache_stats
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+
+def test_repeat_lookups_hit_cache(temp_db):
+    """Test repeated lookups by id and ISBN are served from memory"""
+    get_book_by_id(1)
+    before = get_book_cache_stats()
+    assert get_book_by_id(1)['title'] == "The Great Gatsby"
+    assert get_book_by_isbn("9780743273565")['id'] == 1
+    assert get_book_by_isbn("9780743273565")['id'] == 1
+    after = get_book_cache_stats()
+    assert after['hits'] - before['hits'] >= 3
+
+
+def test_cached_book_is_a_copy(temp_db):
+    """Test callers cannot corrupt cached entries"""
+    get_book_by_id(1)['available_copies'] = -100
+    assert get_book_by_id(1)['available_copies'] == 3
+
+
+def test_borrow_and_return_invalidate(temp_db):
+    """Test availability is never stale after a borrow or return"""
+    assert get_book_by_id(1)['available_copies'] == 3
+    borrow_book_by_patron("555555", 1)
+    assert get_book_by_id(1)['available_copies'] == 2
+    assert get_book_by_isbn("9780743273565")['available_copies'] == 2
+    return_book_by_patron("555555", 1)
+    assert get_book_by_id(1)['available_copies'] == 3
+
+
+def test_update_availability_invalidates(temp_db):
+    """Test update_book_availability drops the cached entry"""
+    get_book_by_id(2)
+    database.update_book_availability(2, -1)
+    assert get_book_by_id(2)['available_copies'] == 1
+
+
+def test_missing_books_are_not_cached(temp_db):
+    """Test a lookup miss does not hide a book inserted later"""
+    assert get_book_by_isbn("9990000000000") is None
+    database.insert_book("New", "Author", "9990000000000", 1, 1)
+    assert get_book_by_isbn("9990000000000")['title'] == "New"
+
+
+def test_other_process_writes_clear_cache(temp_db):
+    """Test a write from another process is seen once the catalog version is read"""
+    assert get_book_by_id(1)['available_copies'] == 3
+    with sqlite3.connect(temp_db) as other:
+        other.execute("UPDATE books SET available_copies = 1 WHERE id = 1")
+    other.close()
+    assert get_book_by_id(1)['available_copies'] == 3
+    database.get_catalog_version()
+    assert get_book_by_id(1)['available_copies'] == 1
+
+
+def test_catalog_changes_invalidate_only_changed_books(temp_db):
+    """Test a version change drops just the books it touched, whichever process wrote it"""
+    database.get_catalog_version()
+    get_book_by_id(1)
+    get_book_by_id(2)
+    borrow_book_by_patron("555555", 1)
+    with sqlite3.connect(temp_db) as other:
+        other.execute("UPDATE books SET available_copies = 0 WHERE id = 3")
+    other.close()
+    get_book_by_id(3)
+    database.get_catalog_version()
+
+    before = get_book_cache_stats()
+    assert get_book_by_id(2)['available_copies'] == 2
+    assert get_book_by_id(3)['available_copies'] == 0
+    after = get_book_cache_stats()
+    assert (after['hits'] - before['hits'], after['misses'] - before['misses']) == (1, 1)
+
+
+def test_pruned_change_log_clears_cache(temp_db):
+    """Test falling behind the change log drops the whole cache"""
+    database.get_catalog_version()
+    get_book_by_id(2)
+    with database.db_connection() as conn:
+        conn.execute("UPDATE books SET available_copies = 0 WHERE id = 2")
+        conn.execute("DELETE FROM catalog_changes")
+    database.get_catalog_version()
+    assert get_book_by_id(2)['available_copies'] == 0
+
+
+def test_lru_evicts_oldest_entry():
+    """Test the cache stays bounded"""
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    """Test entries expire after their time to live"""
+    now = [100.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=5)
+    cache.put("a", 1)
+    now[0] += 6
+    assert cache.get("a") is None
+
+
+def test_put_after_invalidation_is_dropped():
+    """Test a value read before an invalidation is not cached"""
+    cache = LRUCache()
+    generation = cache.generation()
+    cache.invalidate("a")
+    cache.put("a", "stale", generation)
+    assert cache.get("a") is None
+
+
+def test_invalid_cache_size():
+    """Test the cache size must be positive"""
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
@@ -0,0 +1,103 @@
+import pytest
+import database
+from app import create_app
+from services.library_service import get_catalog_page
+
+
+@pytest.fixture
+def many_books(temp_db):
+    for i in range(12):
+        database.insert_book(f"Paged Book {i:02d}", "Author", f"{5000000000000 + i}", 1, 1)
+    return [book['id'] for book in database.get_all_books()]
+
+
+@pytest.fixture
+def client(temp_db):
+    return create_app().test_client()
+
+
+def test_catalog_first_page(many_books):
+    """Test the first page has no previous cursor"""
+    page = get_catalog_page(limit=5)
+    assert len(page['books']) == 5
+    assert page['prev_cursor'] is None
+    assert page['next_cursor'] is not None
+
+
+def test_catalog_pages_walk_forward_and_back(many_books):
+    """Test next/prev cursors cover the catalog in title order without gaps"""
+    seen = []
+    pages = []
+    page = get_catalog_page(limit=4)
+    while True:
+        pages.append(page)
+        seen.extend(book['id'] for book in page['books'])
+        if not page['next_cursor']:
+            break
+        page = get_catalog_page(page['next_cursor'], limit=4)
+    assert seen == many_books
+
+    back = get_catalog_page(pages[-1]['prev_cursor'], limit=4)
+    assert back['books'] == pages[-2]['books']
+    assert back['next_cursor'] is not None
+
+
+def test_catalog_page_limit_clamped(many_books):
+    """Test out-of-range page sizes are clamped"""
+    assert len(get_catalog_page(limit=0)['books']) == 1
+    assert get_catalog_page(limit=10_000)['limit'] == 200
+
+
+def test_catalog_invalid_cursor(many_books):
+    """Test a malformed cursor is rejected"""
+    with pytest.raises(ValueError):
+        get_catalog_page("not-a-cursor")
+
+
+def test_api_books_pagination(client, many_books):
+    """Test the JSON catalog API returns pages and cursors"""
+    first = client.get("/api/books?limit=10").get_json()
+    assert first['count'] == 10
+    second = client.get(f"/api/books?limit=10&cursor={first['next_cursor']}").get_json()
+    assert [book['id'] for book in first['results'] + second['results']] == many_books
+    assert second['next_cursor'] is None
+
+
+def test_api_books_invalid_cursor(client):
+    """Test the JSON catalog API rejects bad cursors"""
+    response = client.get("/api/books?cursor=%%%")
+    assert response.status_code == 400
+
+
+def test_catalog_page_renders_next_link(client, many_books):
+    """Test the catalog page links to the next page"""
+    response = client.get("/catalog?limit=5")
+    assert response.status_code == 200
+    assert b"Next &rarr;" in response.data
+    assert b"Previous" not in response.data
+
+
+def test_catalog_page_is_streamed(client, many_books):
+    """Test the catalog page streams its HTML and links both ways from a middle page"""
+    first = get_catalog_page(limit=5)
+    response = client.get(f"/catalog?limit=5&cursor={first['next_cursor']}")
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert html.count("<tr>") == 6  # header row + 5 books
+    assert "Previous" in html and "Next &rarr;" in html
+    assert html.rstrip().endswith("</html>")
+
+
+def test_flashed_message_shown_once_on_streamed_page(client, many_books):
+    """Test flashed messages are consumed even though the page body is streamed"""
+    client.post("/borrow", data={"patron_id": "bad", "book_id": "1"})
+    assert b"flash-error\">" in client.get("/catalog").data
+    assert b"flash-error\">" not in client.get("/catalog").data
+
+
+def test_dropped_catalog_stream_holds_no_connection(client, many_books):
+    """Test a client that disconnects mid-page leaves no pooled connection checked out"""
+    response = client.get("/catalog?limit=200", buffered=False)
+    next(response.response)
+    response.close()
+    assert getattr(database.get_pool()._local, 'conn', None) is None
@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+import database
+from database import (
+    DatabaseBusyError, checkin_book, checkout_book, get_book_by_id,
+    get_patron_borrow_count, get_transaction_stats, run_in_transaction
+)
+from services.library_service import borrow_book_by_patron
+
+
+def _checkout(patron_id, book_id, limit=5):
+    now = datetime.now()
+    return checkout_book(patron_id, book_id, now, now + timedelta(days=14), limit)
+
+
+def test_checkout_decrements_and_records(temp_db):
+    """A successful checkout writes the record and the counter together"""
+    status, book = _checkout("111111", 1)
+    assert status == 'ok'
+    assert book['title'] == 'The Great Gatsby'
+    assert get_book_by_id(1)['available_copies'] == 2
+    assert get_patron_borrow_count("111111") == 1
+
+
+def test_checkout_unavailable_leaves_no_record(temp_db):
+    """Checking out a title with no copies changes nothing"""
+    status, _ = _checkout("111111", 3)
+    assert status == 'unavailable'
+    assert get_patron_borrow_count("111111") == 0
+    assert get_book_by_id(3)['available_copies'] == 0
+
+
+def test_checkout_enforces_limit(temp_db):
+    """The borrowing limit is checked inside the transaction"""
+    assert _checkout("111111", 1, limit=1)[0] == 'ok'
+    assert _checkout("111111", 2, limit=1)[0] == 'limit_reached'
+    assert get_book_by_id(2)['available_copies'] == 2
+
+
+def test_borrow_limit_is_five_books(temp_db):
+    """A sixth concurrent loan is refused"""
+    for i in range(5):
+        database.insert_book(f"Limit {i}", "Author", f"900000000000{i}", 1, 1)
+    book_ids = [database.get_book_by_isbn(f"900000000000{i}")['id'] for i in range(5)]
+    for book_id in book_ids:
+        assert borrow_book_by_patron("222222", book_id)[0] is True
+    success, message = borrow_book_by_patron("222222", 1)
+    assert success is False
+    assert "maximum borrowing limit of 5" in message
+
+
+def test_concurrent_checkouts_never_oversell(temp_db):
+    """Many desks borrowing the same title cannot exceed its copies"""
+    results = []
+
+    def desk(n):
+        results.append(_checkout(f"3000{n:02d}", 2)[0])
+
+    threads = [threading.Thread(target=desk, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count('ok') == 2
+    assert results.count('unavailable') == 6
+    assert get_book_by_id(2)['available_copies'] == 0
+
+
+def test_checkin_never_exceeds_total_copies(temp_db):
+    """Returning a book restores exactly one copy"""
+    _checkout("111111", 1)
+    assert checkin_book("111111", 1, datetime.now())[0] == 'ok'
+    assert checkin_book("111111", 1, datetime.now())[0] == 'not_borrowed'
+    assert get_book_by_id(1)['available_copies'] == 3
+
+
+def test_checkin_unknown_book(temp_db):
+    """Returning a nonexistent book reports not_found"""
+    assert checkin_book("111111", 99999, datetime.now()) == ('not_found', None)
+
+
+def test_busy_transaction_retries_then_fails(temp_db, monkeypatch):
+    """SQLITE_BUSY is retried and then surfaced as DatabaseBusyError"""
+    monkeypatch.setattr(database, "BUSY_BACKOFF_SECONDS", 0)
+    before = get_transaction_stats()
+
+    def work(conn):
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(DatabaseBusyError):
+        run_in_transaction(work, retries=2)
+    after = get_transaction_stats()
+    assert after['busy_retries'] - before['busy_retries'] == 2
+    assert after['busy_failures'] - before['busy_failures'] == 1
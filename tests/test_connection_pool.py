@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+import database
+from database import ConnectionPool, db_connection, get_book_by_id, get_pool
+
+
+def test_pool_reuses_connection_across_calls(temp_db):
+    """Sequential helper calls on one thread share a single connection"""
+    with db_connection() as first:
+        pass
+    get_book_by_id(1)
+    with db_connection() as second:
+        pass
+    assert first is second
+
+
+def test_nested_blocks_share_connection(temp_db):
+    """Nested db_connection blocks on the same thread reuse the outer connection"""
+    with db_connection() as outer:
+        with db_connection() as inner:
+            assert inner is outer
+
+
+def test_pool_applies_pragmas(temp_db):
+    """Pooled connections run in WAL mode with a busy timeout"""
+    with db_connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.BUSY_TIMEOUT_MS
+
+
+def test_rollback_on_error(temp_db):
+    """An exception inside the block rolls back the pending transaction"""
+    with pytest.raises(RuntimeError):
+        with db_connection() as conn:
+            conn.execute("UPDATE books SET available_copies = 99 WHERE id = 1")
+            raise RuntimeError("boom")
+    assert get_book_by_id(1)["available_copies"] == 3
+
+
+def test_threads_get_distinct_connections(temp_db):
+    """Concurrent threads never share a checked-out connection"""
+    barrier = threading.Barrier(3)
+    seen = []
+
+    def worker():
+        with db_connection() as conn:
+            seen.append(conn)
+            barrier.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(conn) for conn in seen}) == 3
+    assert get_pool()._idle.qsize() <= get_pool().size
+
+
+def test_invalid_pool_size():
+    """Pool size must be positive"""
+    with pytest.raises(ValueError):
+        ConnectionPool("library.db", 0)
+
+
+def test_release_from_another_thread_is_refused(temp_db):
+    """Closing an abandoned cursor generator on another thread leaves that thread's connection alone"""
+    abandoned = database.iter_open_loans()
+    next(abandoned)
+    errors = []
+
+    def other_thread():
+        with db_connection() as outer:
+            with pytest.raises(RuntimeError):
+                abandoned.close()
+            with db_connection() as inner:
+                errors.append(inner is not outer)
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join()
+    assert errors == [False]
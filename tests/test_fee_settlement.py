@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+import database
+from app import create_app
+from services.library_service import (
+    calculate_late_fee_for_book, settle_patron_fees, settle_fees_for_patrons
+)
+from services.payment_queue import configure_payment_queue
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture
+def overdue_loans(temp_db):
+    now = datetime.now()
+    loans = [("111111", 1, 20), ("111111", 2, 3), ("222222", 1, 40), ("333333", 2, -5)]
+    for patron_id, book_id, days_late in loans:
+        due_date = now - timedelta(days=days_late, hours=1)
+        database.insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+    return loans
+
+
+@pytest.fixture
+def gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = {"status": "success", "transaction_id": "txn_001"}
+    return gateway
+
+
+def test_settle_charges_patron_once(overdue_loans, gateway):
+    """Test all overdue books are paid with a single gateway call"""
+    expected = {book_id: calculate_late_fee_for_book("111111", book_id)['fee_amount'] for book_id in (1, 2)}
+    
+    success, message, details = settle_patron_fees("111111", gateway)
+    
+    assert success is True
+    assert "2 books" in message
+    gateway.process_payment.assert_called_once_with("111111", round(sum(expected.values()), 2))
+    assert details['transaction_id'] == "txn_001"
+    assert {a['book_id']: a['amount'] for a in details['allocations']} == expected
+
+
+def test_settle_does_not_charge_twice(overdue_loans, gateway):
+    """Test recorded allocations stop the same fees being charged again"""
+    settle_patron_fees("111111", gateway)
+    
+    success, message, details = settle_patron_fees("111111", gateway)
+    
+    assert success is False
+    assert message == "No late fees to pay"
+    assert gateway.process_payment.call_count == 1
+
+
+def test_settle_declined_records_nothing(overdue_loans, gateway):
+    """Test a declined charge leaves the fees outstanding"""
+    gateway.process_payment.return_value = False
+    
+    success, message, _ = settle_patron_fees("111111", gateway)
+    assert success is False
+    assert message == "Payment declined"
+    
+    gateway.process_payment.return_value = {"status": "success"}
+    success, _, details = settle_patron_fees("111111", gateway)
+    assert success is True
+    assert details['transaction_id'].startswith("settle-")
+
+
+def test_settle_gateway_error(overdue_loans, gateway):
+    """Test gateway exceptions are reported, not raised"""
+    gateway.process_payment.side_effect = Exception("Network error")
+    
+    success, message, _ = settle_patron_fees("111111", gateway)
+    
+    assert success is False
+    assert message == "Payment failed: Network error"
+
+
+def test_settle_invalid_patron(temp_db, gateway):
+    """Test invalid patron IDs are rejected before any charge"""
+    success, message, details = settle_patron_fees("12ab", gateway)
+    
+    assert success is False
+    assert message == "Invalid patron ID"
+    gateway.process_payment.assert_not_called()
+
+
+def test_settle_batch_one_charge_per_patron(overdue_loans, gateway):
+    """Test the billing run charges every patron with overdue fees exactly once"""
+    gateway.process_payment.side_effect = lambda patron_id, amount: {"transaction_id": f"txn_{patron_id}"}
+    results = list(settle_fees_for_patrons(None, gateway))
+    
+    assert [r['patron_id'] for r in results] == ["111111", "222222"]
+    assert all(r['success'] for r in results)
+    assert sorted(c.args[0] for c in gateway.process_payment.call_args_list) == ["111111", "222222"]
+    assert list(settle_fees_for_patrons(None, gateway)) == [
+        dict(r, success=False, message="No late fees to pay", amount=0.00, transaction_id=None, allocations=[])
+        for r in results
+    ]
+
+
+def test_settle_batch_filters_patrons(overdue_loans, gateway):
+    """Test the billing run can be limited to given patrons"""
+    results = list(settle_fees_for_patrons(["222222", "bad"], gateway))
+    
+    assert [(r['patron_id'], r['success']) for r in results] == [("bad", False), ("222222", True)]
+    gateway.process_payment.assert_called_once()
+
+
+def test_settle_api(overdue_loans, gateway):
+    """Test the settlement endpoint charges the configured gateway and returns the per-book split"""
+    configure_payment_queue(gateway)
+    client = create_app().test_client()
+    
+    response = client.post('/api/payments/settle', json={'patron_id': '222222'})
+    assert response.status_code == 200
+    assert response.get_json()['allocations'][0]['book_id'] == 1
+    gateway.process_payment.assert_called_once()
+    
+    response = client.post('/api/payments/settle', json={'patron_id': '222222'})
+    assert response.status_code == 400
+    configure_payment_queue(PaymentGateway())
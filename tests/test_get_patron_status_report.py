@@ -1,5 +1,7 @@
 import pytest
-from services.library_service import get_patron_status_report
+from datetime import datetime, timedelta
+import database
+from services.library_service import get_patron_status_report, calculate_late_fee_for_book
 
 def test_patron_status_invalid_id_empty():
     """Test patron status with empty patron ID"""
@@ -42,4 +44,44 @@ def test_patron_status_with_overdue_books():
     assert isinstance(result['total_late_fees'], float)
     assert result['total_late_fees'] >= 0.00
     if result['total_late_fees'] > 0:
-        assert any(book['is_overdue'] for book in result['borrowed_books'])
\ No newline at end of file
+        assert any(book['is_overdue'] for book in result['borrowed_books'])
+
+
+def _count_statements():
+    """Trace statements run on this thread's pooled connection."""
+    statements = []
+    with database.db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_patron_status_report_single_query(temp_db):
+    """Test the report costs a counters lookup and one loan query no matter how many books are overdue"""
+    borrow_date = datetime.now() - timedelta(days=30)
+    for i in range(5):
+        database.insert_book(f"Overdue {i}", "Author", f"700000000000{i}", 1, 1)
+        book_id = database.get_book_by_isbn(f"700000000000{i}")['id']
+        database.insert_borrow_record("678901", book_id, borrow_date + timedelta(days=i),
+                                      borrow_date + timedelta(days=14 + i))
+    
+    statements = _count_statements()
+    result = get_patron_status_report("678901")
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    
+    assert len(selects) == 2
+    assert 'FROM patrons WHERE patron_id' in selects[0]
+    assert result['books_borrowed'] == 5
+    assert result['books_available_to_borrow'] == 0
+    assert all(book['is_overdue'] for book in result['borrowed_books'])
+    assert result['total_late_fees'] == round(sum(book['fee_amount'] for book in result['borrowed_books']), 2)
+
+
+def test_patron_status_report_fees_match_single_book(temp_db):
+    """Test per-book fees in the report match calculate_late_fee_for_book"""
+    borrow_date = datetime.now() - timedelta(days=20)
+    database.insert_borrow_record("678901", 1, borrow_date, borrow_date + timedelta(days=14))
+    result = get_patron_status_report("678901")
+    fee_info = calculate_late_fee_for_book("678901", 1)
+    assert result['borrowed_books'][0]['fee_amount'] == fee_info['fee_amount']
+    assert result['borrowed_books'][0]['days_overdue'] == fee_info['days_overdue']
+    assert result['total_late_fees'] == fee_info['fee_amount']
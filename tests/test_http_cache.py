@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+
+import database
+import http_cache
+from app import create_app
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+
+@pytest.fixture
+def client(temp_db):
+    return create_app().test_client()
+
+
+def test_catalog_version_bumps_on_every_write(temp_db):
+    """Test book inserts, availability changes, borrows and returns bump the catalog version"""
+    versions = [database.get_catalog_version()['version']]
+    database.insert_book('Dune', 'Frank Herbert', '9780441172719', 2, 2)
+    versions.append(database.get_catalog_version()['version'])
+    database.update_book_availability(1, -1)
+    versions.append(database.get_catalog_version()['version'])
+    assert borrow_book_by_patron('222222', 2)[0]
+    versions.append(database.get_catalog_version()['version'])
+    assert return_book_by_patron('222222', 2)[0]
+    versions.append(database.get_catalog_version()['version'])
+    
+    assert versions == sorted(set(versions))
+    assert database.get_catalog_version()['modified_at'].tzinfo is not None
+
+
+def test_search_revalidates_with_304_without_querying(client, mocker):
+    """Test a matching If-None-Match gets an empty 304 before the search runs"""
+    first = client.get('/api/search?q=gatsby&type=title')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'public, no-cache'
+    assert first.headers['Last-Modified']
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    
+    search = mocker.patch('routes.api_routes.search_books_in_catalog')
+    second = client.get('/api/search?q=gatsby&type=title', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    assert second.headers['Cache-Control'] == 'public, no-cache'
+    search.assert_not_called()
+    
+    modified = client.get('/api/search?q=gatsby&type=title',
+                          headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert modified.status_code == 304
+
+
+def test_writes_invalidate_etags(client):
+    """Test a borrow changes the catalog's ETag so clients refetch"""
+    etag = client.get('/catalog').headers['ETag']
+    assert client.get('/catalog', headers={'If-None-Match': etag}).status_code == 304
+    
+    assert borrow_book_by_patron('222222', 1)[0]
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'The Great Gatsby' in response.data
+
+
+def test_catalog_with_flashed_messages_is_not_cached(client):
+    """Test a catalog page showing a flashed message is served in full and not stored"""
+    etag = client.get('/catalog').headers['ETag']
+    client.post('/borrow', data={'patron_id': 'bad', 'book_id': '1'})
+    
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in response.headers
+    assert client.get('/catalog', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_late_fee_validators_roll_over_with_the_clock(client, mocker):
+    """Test late fee ETags change as time passes even without writes"""
+    clock = mocker.patch('http_cache.time.time', return_value=datetime(2026, 10, 1).timestamp())
+    first = client.get('/api/late_fee/123456/3')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert client.get('/api/late_fee/123456/3', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    
+    clock.return_value += http_cache.LATE_FEE_VALIDATOR_SECONDS
+    assert client.get('/api/late_fee/123456/3', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+
+def test_error_responses_carry_no_validators(client):
+    """Test failed searches are not given cache validators"""
+    response = client.get('/api/search?q=')
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
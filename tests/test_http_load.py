@@ -0,0 +1,46 @@
+import os
+
+import pytest
+import database
+from benchmarks.dataset import generate_dataset
+from benchmarks.http_load import ROUTES, _free_port, parse_mix, run_load, start_server
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-fork server needs os.fork()")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", database.DATABASE)
+    summary = generate_dataset(str(tmp_path / "library.db"), books=200, patrons=50, loans=1000)
+    database.get_pool().close()
+    port = _free_port()
+    proc = start_server('prefork', str(tmp_path), port, workers=2)
+    yield port, summary
+    proc.terminate()
+    proc.wait(timeout=30)
+
+
+def test_parse_mix():
+    """Test route weights are parsed and unknown routes rejected"""
+    assert parse_mix('catalog=3, borrow=1,return') == {'catalog': 3, 'borrow': 1, 'return': 1}
+    with pytest.raises(ValueError):
+        parse_mix('catalog=1,checkout=2')
+    with pytest.raises(ValueError):
+        parse_mix('catalog=0')
+
+
+def test_load_run_reports_every_route(server):
+    """Test a short run drives every route without errors and classifies outcomes"""
+    port, summary = server
+    
+    report = run_load('127.0.0.1', port, dict.fromkeys(ROUTES, 1), clients=4, duration=1.5, summary=summary)
+    
+    assert set(report['routes']) == set(ROUTES)
+    assert report['total']['requests'] > 0
+    assert report['total']['outcomes']['http_error'] == report['total']['outcomes']['conn_error'] == 0
+    for route in ('catalog', 'api_search', 'late_fee'):
+        stats = report['routes'][route]
+        assert stats['outcomes']['ok'] == stats['requests']
+    for stats in report['routes'].values():
+        assert sum(stats['histogram_ms'].values()) == stats['requests']
+    assert report['routes']['borrow']['outcomes']['ok'] > 0
@@ -0,0 +1,129 @@
+import io
+import json
+
+import pytest
+import database
+from app import create_app
+from services.import_service import import_books
+
+CSV_DATA = """title,author,isbn,total_copies
+Dune,Frank Herbert,9780441172719,4
+Emma,Jane Austen,9780141439587,2
+,No Title,9780000000001,1
+Dune Again,Frank Herbert,9780441172719,1
+Sapiens,Yuval Noah Harari,12345,1
+Odyssey,Homer,9780140268867,zero
+The Great Gatsby,F. Scott Fitzgerald,9780743273565,3
+"""
+
+
+@pytest.fixture
+def app(temp_db):
+    return create_app()
+
+
+def _run_import(data, fmt, batch_size=2):
+    errors = []
+    summary = import_books(io.StringIO(data), fmt, batch_size, errors.append)
+    return summary, errors
+
+
+def test_import_csv_validates_and_reports_rows(temp_db):
+    """Test CSV import applies add_book_to_catalog rules and reports each rejected row"""
+    summary, errors = _run_import(CSV_DATA, "csv")
+    assert summary == {'rows': 7, 'imported': 2, 'failed': 5}
+    assert {error['row']: error['error'] for error in errors} == {
+        4: "Title is required.",
+        5: "A book with this ISBN already exists.",
+        6: "ISBN must be exactly 13 digits.",
+        7: "Total copies must be a positive integer.",
+        8: "A book with this ISBN already exists.",
+    }
+    book = database.get_book_by_isbn("9780441172719")
+    assert book['title'] == "Dune"
+    assert book['available_copies'] == 4
+
+
+def test_import_jsonl(temp_db):
+    """Test JSON Lines import, including malformed lines"""
+    data = "\n".join([
+        json.dumps({"title": "Emma", "author": "Jane Austen", "isbn": "9780141439587", "total_copies": 2}),
+        "{not json",
+        json.dumps(["a", "list"]),
+        "",
+        json.dumps({"title": "Dune", "author": "Frank Herbert", "isbn": "9780441172719", "total_copies": 1}),
+    ])
+    summary, errors = _run_import(data, "jsonl")
+    assert summary == {'rows': 4, 'imported': 2, 'failed': 2}
+    assert [error['row'] for error in errors] == [2, 3]
+
+
+def test_import_jsonl_rejects_non_integral_copies(temp_db):
+    """Test fractional and boolean copy counts are rejected instead of truncated"""
+    rows = [("9781000000001", 2.7), ("9781000000002", True), ("9781000000003", "3"), ("9781000000004", 3.0)]
+    data = "\n".join(json.dumps({"title": "T", "author": "A", "isbn": isbn, "total_copies": copies})
+                     for isbn, copies in rows)
+    summary, errors = _run_import(data, "jsonl")
+    assert summary == {'rows': 4, 'imported': 2, 'failed': 2}
+    assert [(error['row'], error['error']) for error in errors] == [
+        (1, "Total copies must be a positive integer."),
+        (2, "Total copies must be a positive integer."),
+    ]
+    assert database.get_book_by_isbn("9781000000004")['total_copies'] == 3
+
+
+def test_import_duplicates_within_one_batch(temp_db):
+    """Test duplicate ISBNs in the same batch are rejected without failing the batch"""
+    data = "title,author,isbn,total_copies\nA,X,9781111111111,1\nB,Y,9781111111111,1\n"
+    summary, errors = _run_import(data, "csv", batch_size=100)
+    assert summary['imported'] == 1
+    assert errors == [{'row': 3, 'isbn': "9781111111111", 'error': "A book with this ISBN already exists."}]
+
+
+def test_import_unknown_format(temp_db):
+    """Test unsupported formats are rejected"""
+    with pytest.raises(ValueError):
+        import_books(io.StringIO(""), "xml")
+
+
+def test_import_upload_endpoint(app):
+    """Test the upload endpoint returns a summary and error report"""
+    response = app.test_client().post("/api/books/import", data={
+        "file": (io.BytesIO(CSV_DATA.encode()), "books.csv"),
+        "batch_size": "3",
+    }, content_type="multipart/form-data")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['imported'] == 2
+    assert body['failed'] == 5
+    assert len(body['errors']) == 5
+    assert body['errors_truncated'] is False
+
+
+def test_import_upload_with_byte_order_mark(app):
+    """Test a CSV saved with a UTF-8 byte order mark (as Excel writes it) keeps its title column"""
+    response = app.test_client().post("/api/books/import", data={
+        "file": (io.BytesIO(CSV_DATA.encode("utf-8-sig")), "books.csv"),
+    }, content_type="multipart/form-data")
+    body = response.get_json()
+    assert (body['imported'], body['failed']) == (2, 5)
+    assert database.get_book_by_isbn("9780441172719")['title'] == "Dune"
+
+
+def test_import_upload_requires_known_format(app):
+    """Test the upload endpoint rejects unknown file types"""
+    response = app.test_client().post("/api/books/import", data={
+        "file": (io.BytesIO(b"x"), "books.xml"),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+
+def test_import_cli(app, tmp_path):
+    """Test the import-books CLI command"""
+    source = tmp_path / "books.csv"
+    source.write_text(CSV_DATA, encoding="utf-8-sig")
+    errors = tmp_path / "errors.jsonl"
+    result = app.test_cli_runner().invoke(args=["import-books", str(source), "--errors", str(errors)])
+    assert result.exit_code == 0
+    assert "7 rows: 2 imported, 5 rejected" in result.output
+    assert len(errors.read_text().splitlines()) == 5
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import database
+from app import create_app
+from services.library_service import calculate_late_fee_for_book, calculate_late_fees_bulk
+
+
+@pytest.fixture
+def overdue_loans(temp_db):
+    now = datetime.now()
+    loans = [("111111", 1, 20), ("111111", 2, 3), ("222222", 1, 40), ("333333", 2, -5)]
+    for patron_id, book_id, days_late in loans:
+        due_date = now - timedelta(days=days_late, hours=1)
+        database.insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+    return loans
+
+
+@pytest.fixture
+def app(temp_db):
+    return create_app()
+
+
+def test_bulk_fees_match_single_book_function(overdue_loans):
+    """Test every bulk result matches calculate_late_fee_for_book exactly"""
+    results = list(calculate_late_fees_bulk())
+    assert {(r['patron_id'], r['book_id']) for r in results} == {("111111", 1), ("111111", 2), ("222222", 1)}
+    for result in results:
+        single = calculate_late_fee_for_book(result['patron_id'], result['book_id'])
+        assert {k: result[k] for k in single} == single
+
+
+def test_bulk_fees_filter_by_patron(overdue_loans):
+    """Test restricting the run to a subset of patrons"""
+    results = list(calculate_late_fees_bulk(["222222"]))
+    assert len(results) == 1
+    assert results[0]['days_overdue'] == 40
+    assert results[0]['fee_amount'] == 20.00
+
+
+def test_bulk_fees_include_current(overdue_loans):
+    """Test loans that are not overdue are reported with a zero fee when requested"""
+    results = list(calculate_late_fees_bulk(["333333", "123456"], overdue_only=False))
+    assert len(results) == 2
+    assert all(r['fee_amount'] == 0.00 and r['status'] == 'Book is not overdue' for r in results)
+
+
+def test_late_fees_api_streams_ndjson(app, overdue_loans):
+    """Test the batch endpoint streams one JSON object per line"""
+    response = app.test_client().get("/api/late_fees?patron_id=111111")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(line['book_id'] for line in lines) == [1, 2]
+
+
+def test_late_fees_api_rejects_invalid_patron(app):
+    """Test the batch endpoint validates patron IDs"""
+    response = app.test_client().get("/api/late_fees?patron_id=12ab56")
+    assert response.status_code == 400
+
+
+def test_late_fees_cli(app, overdue_loans, tmp_path):
+    """Test the nightly billing CLI job writes NDJSON results"""
+    output = tmp_path / "fees.jsonl"
+    result = app.test_cli_runner().invoke(args=["late-fees", "--output", str(output)])
+    assert result.exit_code == 0
+    lines = output.read_text().splitlines()
+    assert len(lines) == 3
+    assert "3 loans, $31.50 in late fees" in result.output
+
+
+def test_overdue_days_computed_in_sql_match_python(temp_db):
+    """days_overdue from the loan queries equals timedelta.days, fractions of a day included"""
+    now = datetime(2026, 10, 17, 12, 0, 0)
+    offsets = [timedelta(hours=-1), timedelta(hours=1), timedelta(days=1, seconds=1),
+               timedelta(days=2, hours=23, minutes=59), timedelta(days=30)]
+    for i, offset in enumerate(offsets):
+        due_date = now - offset
+        database.insert_borrow_record(f"55555{i}", 1, due_date - timedelta(days=14), due_date)
+
+    loans = {loan['patron_id']: loan for loan in database.iter_open_loans(now=now)}
+    for i, offset in enumerate(offsets):
+        loan = loans[f"55555{i}"]
+        assert loan['is_overdue'] == (offset > timedelta(0))
+        assert loan['days_overdue'] == max(0, offset.days)
+
+
+def test_due_at_follows_due_date(temp_db):
+    """Rows written without due_at get it from the trigger, and it tracks due_date edits"""
+    with database.db_connection() as conn:
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES ('666666', 1, '2026-01-01T08:00:00', '2026-01-15T08:00:00')
+        ''')
+        due_at = conn.execute("SELECT due_at FROM borrow_records WHERE patron_id = '666666'").fetchone()[0]
+        assert due_at == database.epoch_seconds(datetime(2026, 1, 15, 8))
+
+        conn.execute("UPDATE borrow_records SET due_date = '2026-01-20T08:00:00' WHERE patron_id = '666666'")
+        due_at = conn.execute("SELECT due_at FROM borrow_records WHERE patron_id = '666666'").fetchone()[0]
+        assert due_at == database.epoch_seconds(datetime(2026, 1, 20, 8))
+
+
+def test_overdue_run_uses_due_index(temp_db):
+    """The overdue filter is served by the open-loan due_at index"""
+    statements = []
+    with database.db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        list(calculate_late_fees_bulk())
+        query = next(s for s in statements if 'FROM borrow_records br' in s)
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + query).fetchall()
+    assert "idx_borrow_records_open_due" in " ".join(row["detail"] for row in plan)
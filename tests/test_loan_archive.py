@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app
+from database import (
+    archive_closed_loans, check_patron_counters, db_connection, get_catalog_version, get_patron_loan_history,
+    insert_borrow_record, update_borrow_record_return_date
+)
+from services.archive_service import archive_loans, start_loan_archiver
+
+
+def _returned_loan(patron_id, book_id, days_ago):
+    borrow_date = datetime.now() - timedelta(days=days_ago + 7)
+    insert_borrow_record(patron_id, book_id, borrow_date, borrow_date + timedelta(days=14))
+    update_borrow_record_return_date(patron_id, book_id, datetime.now() - timedelta(days=days_ago))
+
+
+def _count(table):
+    with db_connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_old_closed_loans_move_to_history(temp_db):
+    """Loans returned before the cutoff leave borrow_records; open and recent ones stay"""
+    _returned_loan("111111", 1, days_ago=400)
+    _returned_loan("111111", 2, days_ago=10)
+    hot = _count("borrow_records")
+
+    result = archive_loans(max_age_days=365)
+    assert result['archived'] == 1
+    assert _count("borrow_records") == hot - 1
+    assert _count("loan_history") == 1
+    assert _count("loan_records") == hot
+    assert check_patron_counters()['drift'] == []
+
+
+def test_archiving_runs_in_batches(temp_db):
+    """A backlog is moved batch by batch, oldest returns first"""
+    for days_ago in range(400, 405):
+        _returned_loan("222222", 1, days_ago)
+
+    assert archive_closed_loans(datetime.now() - timedelta(days=365), batch_size=2) == 2
+    with db_connection() as conn:
+        archived = [row[0] for row in conn.execute("SELECT return_date FROM loan_history ORDER BY return_date")]
+        remaining = conn.execute("SELECT MIN(return_date) FROM borrow_records WHERE patron_id = '222222'").fetchone()[0]
+    assert max(archived) < remaining
+
+    result = archive_loans(max_age_days=365, batch_size=2, pause=0)
+    assert result == {'archived': 3, 'batches': 2, 'returned_before': result['returned_before']}
+    assert archive_loans(max_age_days=365)['archived'] == 0
+
+
+def test_history_spans_hot_and_archived_loans(temp_db):
+    """The loan_records view reports open, recent and archived loans together"""
+    _returned_loan("123456", 2, days_ago=400)
+    archive_loans(max_age_days=365)
+    _returned_loan("123456", 1, days_ago=1)
+
+    history = get_patron_loan_history("123456")
+    assert sorted(loan['book_id'] for loan in history) == [1, 2, 3]
+    assert [loan['borrow_date'] for loan in history] == sorted((loan['borrow_date'] for loan in history), reverse=True)
+    assert history[-1]['book_id'] == 2
+    assert [loan['book_id'] for loan in history if loan['return_date'] is None] == [3]
+
+
+def test_archiving_keeps_http_validators(temp_db):
+    """Moving closed loans does not invalidate cached catalog responses"""
+    _returned_loan("111111", 1, days_ago=400)
+    version = get_catalog_version()['version']
+    archive_loans(max_age_days=365)
+    assert get_catalog_version()['version'] == version
+
+
+def test_archive_rejects_bad_arguments(temp_db):
+    with pytest.raises(ValueError):
+        archive_loans(max_age_days=-1)
+    with pytest.raises(ValueError):
+        archive_loans(batch_size=0)
+
+
+def test_background_archiver(temp_db):
+    """The archiver thread archives on start and stops when asked"""
+    _returned_loan("111111", 1, days_ago=400)
+    stop = threading.Event()
+    thread = start_loan_archiver(365, interval=60, stop=stop)
+    deadline = time.monotonic() + 5
+    while _count("loan_history") == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert _count("loan_history") == 1
+
+
+def test_archive_loans_command(temp_db):
+    _returned_loan("111111", 1, days_ago=30)
+    result = create_app().test_cli_runner().invoke(args=['archive-loans', '--older-than-days', '7'])
+    assert result.exit_code == 0
+    assert '"archived": 1' in result.output
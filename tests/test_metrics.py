@@ -0,0 +1,123 @@
+import re
+import threading
+
+import pytest
+
+import metrics
+from app import create_app
+
+
+@pytest.fixture
+def client(temp_db):
+    metrics.reset()
+    yield create_app().test_client()
+    metrics.reset()
+
+
+def _value(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_request_counts_and_latency(client):
+    """Test /metrics reports per-endpoint request counts, latency and query counts"""
+    for _ in range(3):
+        assert client.get('/api/search?q=gatsby&type=title').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    
+    text = response.get_data(as_text=True)
+    assert _value(text, 'library_http_requests_total{endpoint="api.search_books_api",method="GET",status="200"}') == 3
+    assert _value(text, 'library_http_request_duration_seconds_count{endpoint="api.search_books_api"}') == 3
+    assert _value(text, 'library_http_request_duration_seconds_bucket{endpoint="api.search_books_api",le="+Inf"}') == 3
+    assert _value(text, 'library_http_request_db_queries_count{endpoint="api.search_books_api"}') == 3
+    assert _value(text, 'library_http_request_db_queries_sum{endpoint="api.search_books_api"}') >= 3
+    assert _value(text, 'library_db_calls_total{function="search_books"}') == 3
+
+
+def test_exposition_format(client):
+    """Test every metric has HELP/TYPE lines and histogram buckets are cumulative"""
+    client.get('/catalog')
+    text = client.get('/metrics').get_data(as_text=True)
+    for name, (kind, _, _) in metrics.METRICS.items():
+        assert f'# TYPE {name} {kind}' in text
+    
+    buckets = [float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith('library_http_request_duration_seconds_bucket{endpoint="catalog.catalog"')]
+    assert len(buckets) == len(metrics.LATENCY_BUCKETS) + 1
+    assert buckets == sorted(buckets)
+    sample = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [0-9.e+-]+$')
+    assert all(sample.match(line) for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_unmatched_and_failed_requests_are_counted(client, mocker):
+    """Test 404s and views raising errors are recorded"""
+    client.get('/no-such-page')
+    mocker.patch('routes.api_routes.search_books_in_catalog', side_effect=RuntimeError('boom'))
+    client.application.testing = False
+    assert client.get('/api/search?q=x&type=title').status_code == 500
+    
+    text = metrics.render_prometheus()
+    assert _value(text, 'library_http_requests_total{endpoint="unmatched",method="GET",status="404"}') == 1
+    assert _value(text, 'library_http_requests_total{endpoint="api.search_books_api",method="GET",status="500"}') == 1
+
+
+def test_exited_threads_are_kept(temp_db):
+    """Test metrics recorded on a thread survive the thread exiting"""
+    metrics.reset()
+    import database
+    threads = [threading.Thread(target=database.get_book_by_id, args=(1,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    
+    text = metrics.render_prometheus()
+    assert _value(text, 'library_db_calls_total{function="get_book_by_id"}') == 4
+
+
+def test_generator_helpers_are_timed_while_iterated(temp_db):
+    """Test generator helpers are recorded once, when iteration finishes"""
+    import database
+    metrics.reset()
+    books = database.iter_books(batch_size=1)
+    assert _value(metrics.render_prometheus(), 'library_db_calls_total{function="iter_books"}') is None
+    assert len(list(books)) >= 1
+    assert _value(metrics.render_prometheus(), 'library_db_calls_total{function="iter_books"}') == 1
+
+
+def test_snapshots_merge_other_processes(temp_db, tmp_path):
+    """Test snapshot files written by other workers are added to the scrape"""
+    metrics.reset()
+    metrics.begin_request()
+    metrics.end_request('catalog.catalog', 'GET', 200)
+    (tmp_path / '999999.json').write_text(__import__('json').dumps(metrics.snapshot()))
+    metrics.configure_snapshot_dir(str(tmp_path))
+    try:
+        text = metrics.render_prometheus()
+    finally:
+        metrics.configure_snapshot_dir(None)
+    assert _value(text, 'library_http_requests_total{endpoint="catalog.catalog",method="GET",status="200"}') == 2
+
+
+def test_reused_pid_keeps_dead_worker_totals(temp_db, tmp_path, mocker):
+    """Test a worker given a dead worker's pid writes its own snapshot file instead of replacing the old one"""
+    mocker.patch('metrics.os.getpid', return_value=4242)
+    metrics.configure_snapshot_dir(str(tmp_path))
+    try:
+        for _ in range(2):
+            # A new worker process: fresh metrics and no snapshot file yet
+            metrics._snapshot_name = None
+            metrics.reset()
+            metrics.begin_request()
+            metrics.end_request('catalog.catalog', 'GET', 200)
+            metrics.write_snapshot()
+        assert len(list(tmp_path.glob('4242-*.json'))) == 2
+        text = metrics.render_prometheus()
+    finally:
+        metrics.configure_snapshot_dir(None)
+        metrics._snapshot_name = None
+        metrics.reset()
+    assert _value(text, 'library_http_requests_total{endpoint="catalog.catalog",method="GET",status="200"}') == 2
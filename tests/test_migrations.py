@@ -0,0 +1,44 @@
+import pytest
+import database
+from database import db_connection, get_schema_version, migrate_database
+
+
+def test_init_database_applies_all_migrations(temp_db):
+    """A fresh database is migrated to the latest version"""
+    assert get_schema_version() == max(m[0] for m in database.MIGRATIONS)
+
+
+def test_migrations_are_idempotent(temp_db):
+    """Running the migrator again applies nothing"""
+    assert migrate_database() == []
+    with db_connection() as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]
+    assert rows == len(database.MIGRATIONS)
+
+
+def test_open_loan_queries_use_partial_indexes(temp_db):
+    """Open-loan lookups are served by the partial indexes, not a table scan"""
+    with db_connection() as conn:
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT COUNT(*) FROM borrow_records
+            WHERE patron_id = ? AND return_date IS NULL
+        ''', ("123456",)).fetchall()
+        assert "idx_borrow_records_open_patron" in " ".join(row["detail"] for row in plan)
+
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT id FROM borrow_records
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        ''', ("123456", 3)).fetchall()
+        assert "idx_borrow_records_open_book_patron" in " ".join(row["detail"] for row in plan)
+
+
+def test_new_migration_is_applied_in_order(temp_db, monkeypatch):
+    """Pending migrations run in version order and are recorded"""
+    calls = []
+    monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [
+        (101, "second", [lambda conn: calls.append(101)]),
+        (100, "first", [lambda conn: calls.append(100)]),
+    ])
+    assert migrate_database() == [100, 101]
+    assert calls == [100, 101]
+    assert get_schema_version() == 101
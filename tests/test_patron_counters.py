@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import database
+from app import create_app
+from database import (
+    check_patron_counters, checkin_book, checkout_book, db_connection, get_patron_borrow_count,
+    get_patron_loan_summary
+)
+from services import library_service
+
+
+def _checkout(patron_id, book_id, due_in_days=14):
+    now = datetime.now()
+    return checkout_book(patron_id, book_id, now, now + timedelta(days=due_in_days), 5)
+
+
+def test_counters_follow_checkouts_and_returns(temp_db):
+    """Borrowing and returning keep the count and earliest due date exact"""
+    _checkout("111111", 1, due_in_days=14)
+    _checkout("111111", 2, due_in_days=7)
+    summary = get_patron_loan_summary("111111")
+    assert summary['active_loans'] == 2
+    first_due = summary['next_due_date']
+
+    checkin_book("111111", 2, datetime.now())
+    summary = get_patron_loan_summary("111111")
+    assert summary['active_loans'] == 1
+    assert summary['next_due_date'] > first_due
+
+    checkin_book("111111", 1, datetime.now())
+    assert get_patron_loan_summary("111111") == {'active_loans': 0, 'next_due_date': None}
+
+
+def test_unknown_patron_has_no_loans(temp_db):
+    """Patrons who never borrowed have no row and read as zero"""
+    assert get_patron_borrow_count("999999") == 0
+    assert get_patron_loan_summary("999999") == {'active_loans': 0, 'next_due_date': None}
+
+
+def test_reopened_and_deleted_loans_are_counted(temp_db):
+    """Clearing return_date reopens a loan; deleting an open loan uncounts it"""
+    _checkout("111111", 1)
+    checkin_book("111111", 1, datetime.now())
+    with db_connection() as conn:
+        conn.execute("UPDATE borrow_records SET return_date = NULL WHERE patron_id = '111111'")
+    assert get_patron_borrow_count("111111") == 1
+
+    with db_connection() as conn:
+        conn.execute("DELETE FROM borrow_records WHERE patron_id = '111111'")
+    assert get_patron_borrow_count("111111") == 0
+    assert check_patron_counters()['drift'] == []
+
+
+def test_migration_backfills_existing_loans(temp_db):
+    """Loans recorded before the counters existed are counted by the migration"""
+    with db_connection() as conn:
+        conn.execute("DROP TABLE patrons")
+        for trigger in ('insert', 'return', 'reopen', 'delete'):
+            conn.execute(f"DROP TRIGGER borrow_records_{trigger}_patron")
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES ('222222', 1, '2026-01-01T00:00:00', '2026-01-15T00:00:00')
+        ''')
+        database._create_patrons(conn)
+
+    assert get_patron_borrow_count("222222") == 1
+    assert get_patron_borrow_count("123456") == 1
+    assert check_patron_counters()['drift'] == []
+
+
+def test_checker_reports_and_repairs_drift(temp_db):
+    """The checker recounts from borrow_records and rebuilds on request"""
+    _checkout("111111", 1)
+    with db_connection() as conn:
+        conn.execute("UPDATE patrons SET active_loans = 4 WHERE patron_id = '111111'")
+        conn.execute("DELETE FROM patrons WHERE patron_id = '123456'")
+
+    report = check_patron_counters()
+    assert report['repaired'] is False
+    drift = {entry['patron_id']: entry for entry in report['drift']}
+    assert drift.keys() == {'111111', '123456'}
+    assert drift['111111']['stored']['active_loans'] == 4
+    assert drift['111111']['actual']['active_loans'] == 1
+    assert drift['123456']['stored']['active_loans'] is None
+    assert get_patron_borrow_count("111111") == 4
+
+    assert check_patron_counters(repair=True)['repaired'] is True
+    assert get_patron_borrow_count("111111") == 1
+    assert get_patron_borrow_count("123456") == 1
+    assert check_patron_counters()['drift'] == []
+
+
+def test_limit_check_reads_the_counter(temp_db):
+    """Checkout enforces the borrowing limit from the patrons row"""
+    with db_connection() as conn:
+        conn.execute("INSERT INTO patrons (patron_id, active_loans) VALUES ('111111', 5)")
+    assert _checkout("111111", 1)[0] == 'limit_reached'
+
+
+def test_status_report_skips_loan_query_without_loans(temp_db, mocker):
+    """A patron with no open loans is reported from the counters row alone"""
+    borrowed = mocker.spy(library_service, 'get_patron_borrowed_books')
+    report = library_service.get_patron_status_report("111111")
+    assert report['books_borrowed'] == 0
+    assert report['borrowed_books'] == []
+    borrowed.assert_not_called()
+
+    report = library_service.get_patron_status_report("123456")
+    assert report['books_borrowed'] == 1
+    assert len(report['borrowed_books']) == 1
+
+
+def test_check_patrons_command(temp_db):
+    """check-patrons exits 1 on drift and 0 once repaired"""
+    with db_connection() as conn:
+        conn.execute("UPDATE patrons SET active_loans = 3")
+    runner = create_app().test_cli_runner()
+
+    result = runner.invoke(args=['check-patrons'])
+    assert result.exit_code == 1
+    assert '"patron_id": "123456"' in result.output
+
+    assert runner.invoke(args=['check-patrons', '--repair']).exit_code == 0
+    assert runner.invoke(args=['check-patrons']).exit_code == 0
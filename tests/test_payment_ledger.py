@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+import database
+from services.library_service import (
+    get_patron_status_report, pay_late_fees, reconcile_payments, refund_late_fee_payment,
+    settle_patron_fees
+)
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture
+def overdue_loan(temp_db):
+    due_date = datetime.now() - timedelta(days=10, hours=1)
+    database.insert_borrow_record("111111", 1, due_date - timedelta(days=14), due_date)
+
+
+@pytest.fixture
+def gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = {"status": "success", "transaction_id": "txn_001"}
+    gateway.refund_payment.return_value = {"status": "refunded"}
+    return gateway
+
+
+def test_payment_recorded_in_ledger(overdue_loan, gateway):
+    """Test a successful payment is written to the ledger with its transaction ID"""
+    success, message = pay_late_fees("111111", 1, gateway)
+    
+    assert success is True
+    assert "txn_001" in message
+    payment = database.get_payment("txn_001")
+    assert payment['patron_id'] == "111111"
+    assert payment['amount'] == 5.00
+    assert payment['refunded_amount'] == 0.00
+
+
+def test_paid_fee_is_not_charged_again(overdue_loan, gateway):
+    """Test paying the same book twice only charges once"""
+    pay_late_fees("111111", 1, gateway)
+    
+    success, message = pay_late_fees("111111", 1, gateway)
+    
+    assert success is False
+    assert message == "No late fees to pay"
+    gateway.process_payment.assert_called_once()
+
+
+def test_declined_payment_not_recorded(overdue_loan, gateway):
+    """Test declined charges leave no ledger entry"""
+    gateway.process_payment.return_value = False
+    
+    success, _ = pay_late_fees("111111", 1, gateway)
+    
+    assert success is False
+    assert database.get_payment("txn_001") is None
+
+
+def test_refund_unknown_transaction(temp_db, gateway):
+    """Test refunds must match a recorded charge"""
+    success, message = refund_late_fee_payment("txn_missing", 5.00, gateway)
+    
+    assert success is False
+    assert message == "Transaction not found"
+    gateway.refund_payment.assert_not_called()
+
+
+def test_refund_limited_to_original_charge(overdue_loan, gateway):
+    """Test partial refunds add up to no more than the original charge"""
+    pay_late_fees("111111", 1, gateway)
+    
+    assert refund_late_fee_payment("txn_001", 4.00, gateway)[0] is True
+    success, message = refund_late_fee_payment("txn_001", 4.00, gateway)
+    
+    assert success is False
+    assert "$1.00 refundable" in message
+    assert database.get_payment("txn_001")['refunded_amount'] == 4.00
+    gateway.refund_payment.assert_called_once_with("txn_001", 4.00)
+
+
+def test_refund_reopens_fee(overdue_loan, gateway):
+    """Test a refunded fee shows as outstanding again"""
+    pay_late_fees("111111", 1, gateway)
+    refund_late_fee_payment("txn_001", 2.00, gateway)
+    
+    gateway.process_payment.return_value = {"status": "success", "transaction_id": "txn_002"}
+    success, _ = pay_late_fees("111111", 1, gateway)
+    
+    assert success is True
+    gateway.process_payment.assert_called_with("111111", 2.00)
+
+
+def test_status_report_shows_paid_and_unpaid(temp_db, gateway):
+    """Test the patron report splits late fees into paid and outstanding"""
+    for book_id, days_late in ((1, 10), (2, 3)):
+        due_date = datetime.now() - timedelta(days=days_late, hours=1)
+        database.insert_borrow_record("111111", book_id, due_date - timedelta(days=14), due_date)
+    pay_late_fees("111111", 1, gateway)
+    
+    report = get_patron_status_report("111111")
+    
+    statuses = {b['book_id']: b['fee_status'] for b in report['borrowed_books']}
+    assert statuses == {1: 'Paid', 2: 'Unpaid'}
+    assert report['total_late_fees'] == 6.50
+    assert report['late_fees_paid'] == 5.00
+    assert report['late_fees_outstanding'] == 1.50
+
+
+def test_reconcile_month(overdue_loan, gateway):
+    """Test month-end totals come from the ledger alone"""
+    settle_patron_fees("111111", gateway)
+    refund_late_fee_payment("txn_001", 1.00, gateway)
+    
+    report = reconcile_payments(datetime.now().strftime('%Y-%m'), include_entries=True)
+    
+    assert report['payments'] == 1 and report['payment_total'] == 5.00
+    assert report['refunds'] == 1 and report['refund_total'] == 1.00
+    assert report['net_total'] == 4.00
+    assert [e['kind'] for e in report['entries']] == ['payment', 'refund']
+    gateway.refund_payment.assert_called_once()
+
+
+def test_reconcile_rejects_bad_month(temp_db):
+    """Test malformed months are rejected"""
+    with pytest.raises(ValueError):
+        reconcile_payments("September")
+
+
+def test_ledger_lookups_use_indexes(temp_db):
+    """Test refund and patron lookups are index searches, not table scans"""
+    with database.db_connection() as conn:
+        plans = [
+            ' '.join(row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+            for sql, params in (
+                ("SELECT * FROM payments WHERE transaction_id = ? AND kind = 'refund'", ('txn',)),
+                ("SELECT * FROM payments WHERE patron_id = ? ORDER BY created_at", ('111111',)),
+            )
+        ]
+    assert all('USING INDEX' in plan for plan in plans)
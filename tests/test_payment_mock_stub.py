@@ -74,6 +74,11 @@ def test_pay_late_fees_network_error(mocker, stub_db_functions):
 
 
 def test_refund_success(mocker):
+    mocker.patch(
+        "services.library_service.get_payment",
+        return_value={'transaction_id': 'txn123', 'patron_id': '123456', 'amount': 5.00, 'refunded_amount': 0.00}
+    )
+    mocker.patch("services.library_service.record_refund", return_value=True)
     mock_gateway = Mock(spec=PaymentGateway)
     mock_gateway.refund_payment.return_value = True
     
@@ -0,0 +1,238 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from database import db_connection
+from services.payment_queue import (
+    IdempotencyConflictError, InvalidPaymentError, PaymentQueue, PaymentQueueBusyError, configure_payment_queue
+)
+from services.payment_service import PaymentGateway
+
+
+class SlowGateway(PaymentGateway):
+    """Local stand-in for the external gateway that injects latency."""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.charges = []
+        self._lock = threading.Lock()
+
+    def process_payment(self, patron_id, amount):
+        time.sleep(self.latency)
+        with self._lock:
+            self.charges.append((patron_id, amount))
+        return super().process_payment(patron_id, amount)
+
+
+@pytest.fixture
+def overdue_fee(mocker):
+    mocker.patch(
+        "services.library_service.calculate_late_fee_for_book",
+        return_value={'fee_amount': 5.00, 'days_overdue': 10, 'status': 'Book is overdue by 10 days'}
+    )
+
+
+def _wait(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get_job(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("payment job did not finish")
+
+
+def test_submit_returns_before_gateway_responds(temp_db, overdue_fee):
+    """Test submitting does not block on a slow gateway"""
+    gateway = SlowGateway(latency=0.3)
+    queue = PaymentQueue(gateway)
+    started = time.monotonic()
+    message, job = queue.submit("123456", 1, "key-1")
+    assert message == "Payment queued"
+    assert time.monotonic() - started < 0.1
+    assert job['status'] in ('queued', 'processing')
+
+    finished = _wait(queue, job['job_id'])
+    assert finished['status'] == 'succeeded'
+    assert "Payment successful" in finished['message']
+    assert gateway.charges == [("123456", 5.00)]
+    queue.shutdown()
+
+
+def test_idempotency_key_never_double_charges(temp_db, overdue_fee):
+    """Test retries with the same key return the original job"""
+    gateway = SlowGateway(latency=0.05)
+    queue = PaymentQueue(gateway)
+    results = [queue.submit("123456", 1, "retry-key") for _ in range(5)]
+    job_ids = {job['job_id'] for _, job in results}
+    assert len(job_ids) == 1
+    _wait(queue, job_ids.pop())
+    assert queue.submit("123456", 1, "retry-key")[0] == "Payment already submitted"
+    assert len(gateway.charges) == 1
+    queue.shutdown()
+
+
+def test_idempotency_key_reuse_for_other_payment(temp_db, overdue_fee):
+    """Test a key cannot be reused for a different payment"""
+    queue = PaymentQueue(SlowGateway(latency=0))
+    queue.submit("123456", 1, "shared")
+    with pytest.raises(IdempotencyConflictError, match="different payment"):
+        queue.submit("123456", 2, "shared")
+    queue.shutdown()
+
+
+def test_queue_is_bounded(temp_db, overdue_fee):
+    """Test submissions beyond the pending limit are rejected"""
+    queue = PaymentQueue(SlowGateway(latency=0.2), max_workers=1, max_pending=2)
+    assert queue.submit("123456", 1, "a")[0] == "Payment queued"
+    assert queue.submit("123456", 2, "b")[0] == "Payment queued"
+    with pytest.raises(PaymentQueueBusyError, match="queue is full"):
+        queue.submit("123456", 3, "c")
+    queue.shutdown()
+
+
+def test_jobs_are_shared_between_processes(temp_db, overdue_fee):
+    """Test a queue in another process sees the job and never charges its key again"""
+    first_gateway, second_gateway = SlowGateway(latency=0.05), SlowGateway(latency=0)
+    first, second = PaymentQueue(first_gateway), PaymentQueue(second_gateway)
+    _, job = first.submit("123456", 1, "shared-key")
+    assert second.get_job(job['job_id'])['idempotency_key'] == "shared-key"
+
+    message, again = second.submit("123456", 1, "shared-key")
+    assert (message, again['job_id']) == ("Payment already submitted", job['job_id'])
+    assert _wait(second, job['job_id'])['status'] == 'succeeded'
+    assert len(first_gateway.charges) == 1
+    assert second_gateway.charges == []
+    first.shutdown()
+    second.shutdown()
+
+
+def test_retry_is_answered_when_queue_is_full(temp_db, overdue_fee):
+    """Test a full queue still returns the job of an already accepted key"""
+    queue = PaymentQueue(SlowGateway(latency=0.2), max_workers=1, max_pending=1)
+    _, job = queue.submit("123456", 1, "first")
+    with pytest.raises(PaymentQueueBusyError):
+        queue.submit("123456", 2, "second")
+    assert queue.submit("123456", 1, "first")[1]['job_id'] == job['job_id']
+    queue.shutdown()
+
+
+def test_finished_jobs_expire(temp_db, overdue_fee):
+    """Test finished jobs past the retention period are deleted and free their key"""
+    gateway = SlowGateway(latency=0)
+    queue = PaymentQueue(gateway, retention_hours=1)
+    _, old = queue.submit("123456", 1, "old-key")
+    _wait(queue, old['job_id'])
+    _, recent = queue.submit("123456", 2, "recent-key")
+    _wait(queue, recent['job_id'])
+    with db_connection() as conn:
+        conn.execute("UPDATE payment_jobs SET finished_at = ? WHERE job_id = ?",
+                     ((datetime.now() - timedelta(hours=2)).isoformat(), old['job_id']))
+
+    message, job = queue.submit("123456", 1, "old-key")
+    assert message == "Payment queued"
+    assert job['job_id'] != old['job_id']
+    assert queue.get_job(old['job_id']) is None
+    assert queue.get_job(recent['job_id']) is not None
+    queue.shutdown()
+
+
+def _orphan(job_id, status):
+    """Make a job look abandoned by a queue whose process died."""
+    with db_connection() as conn:
+        conn.execute("UPDATE payment_jobs SET status = ?, owner = 'dead', lease_expires_at = ? WHERE job_id = ?",
+                     (status, (datetime.now() - timedelta(seconds=1)).isoformat(), job_id))
+
+
+def test_orphaned_jobs_are_claimed_on_startup(temp_db, overdue_fee):
+    """Test queued and processing jobs of a dead queue are run by the next queue to start"""
+    stalled = PaymentQueue(SlowGateway(latency=0), max_workers=1)
+    stalled.shutdown()
+    with db_connection() as conn:
+        for job_id, key, book_id in (("queued-job", "orphan-1", 1), ("processing-job", "orphan-2", 2)):
+            conn.execute('''
+                INSERT INTO payment_jobs (job_id, idempotency_key, patron_id, book_id, status, submitted_at)
+                VALUES (?, ?, '123456', ?, 'queued', ?)
+            ''', (job_id, key, book_id, datetime.now().isoformat()))
+    _orphan("queued-job", "queued")
+    _orphan("processing-job", "processing")
+
+    gateway = SlowGateway(latency=0)
+    queue = PaymentQueue(gateway)
+    assert _wait(queue, "queued-job")['status'] == 'succeeded'
+    assert _wait(queue, "processing-job")['status'] == 'succeeded'
+    assert len(gateway.charges) == 2
+    assert queue.submit("123456", 1, "orphan-1")[0] == "Payment already submitted"
+    queue.shutdown()
+
+
+def test_live_leases_are_not_reclaimed(temp_db, overdue_fee):
+    """Test jobs whose queue keeps renewing its lease are left to that queue"""
+    owner_gateway, other_gateway = SlowGateway(latency=0.3), SlowGateway(latency=0)
+    owner = PaymentQueue(owner_gateway, max_workers=1, lease_seconds=0.3)
+    _, job = owner.submit("123456", 1, "held")
+    other = PaymentQueue(other_gateway)
+    time.sleep(0.4)
+    assert other.reclaim_jobs() == 0
+    assert _wait(owner, job['job_id'])['status'] == 'succeeded'
+    assert (len(owner_gateway.charges), other_gateway.charges) == (1, [])
+    owner.shutdown()
+    other.shutdown()
+
+
+def test_invalid_submissions():
+    """Test invalid patron IDs and missing keys are rejected up front"""
+    queue = PaymentQueue(SlowGateway(latency=0))
+    with pytest.raises(InvalidPaymentError, match="Invalid patron ID"):
+        queue.submit("abc", 1, "key")
+    with pytest.raises(InvalidPaymentError):
+        queue.submit("123456", 1, "")
+    queue.shutdown()
+
+
+def test_gateway_failure_marks_job_failed(temp_db, mocker, overdue_fee):
+    """Test gateway errors end up in the job status"""
+    gateway = SlowGateway(latency=0)
+    mocker.patch.object(gateway, "process_payment", side_effect=Exception("Network Error"))
+    queue = PaymentQueue(gateway)
+    _, job = queue.submit("123456", 1, "net")
+    finished = _wait(queue, job['job_id'])
+    assert finished['status'] == 'failed'
+    assert "Network Error" in finished['message']
+    queue.shutdown()
+
+
+def test_payment_endpoints(temp_db, overdue_fee):
+    """Test submitting and polling through the HTTP API"""
+    from app import create_app
+    queue = configure_payment_queue(SlowGateway(latency=0.05))
+    client = create_app().test_client()
+
+    response = client.post("/api/payments", json={"patron_id": "123456", "book_id": 1},
+                           headers={"Idempotency-Key": "http-1"})
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['job_id']
+
+    _wait(queue, job_id)
+    body = client.get(f"/api/payments/{job_id}").get_json()
+    assert body['status'] == 'succeeded'
+    assert client.get("/api/payments/unknown").status_code == 404
+    assert client.post("/api/payments", json={"patron_id": "123456", "book_id": 1}).status_code == 400
+    conflict = client.post("/api/payments", json={"patron_id": "123456", "book_id": 2},
+                           headers={"Idempotency-Key": "http-1"})
+    assert conflict.status_code == 409
+    configure_payment_queue(PaymentGateway())
+
+
+def test_busy_database_is_retryable_over_http(temp_db, mocker):
+    """Test a busy database is reported as 503, not as a bad request"""
+    from app import create_app
+    from database import DatabaseBusyError
+    configure_payment_queue(SlowGateway(latency=0))
+    mocker.patch("services.payment_queue.create_payment_job", side_effect=DatabaseBusyError)
+    response = create_app().test_client().post("/api/payments", json={"patron_id": "123456", "book_id": 1},
+                                               headers={"Idempotency-Key": "busy"})
+    assert response.status_code == 503
+    assert "retry later" in response.get_json()['error']
+    configure_payment_queue(PaymentGateway())
@@ -0,0 +1,86 @@
+import logging
+import sqlite3
+
+import pytest
+
+import database
+import querylog
+from app import create_app
+
+
+@pytest.fixture
+def traced(temp_db):
+    """Reopen the pool with tracing on; the test configures the threshold."""
+    def configure(threshold_ms, explain=False):
+        querylog.configure_query_log(threshold_ms, explain)
+        querylog.reset_query_plans()
+        database.configure_pool()
+    yield configure
+    querylog.configure_query_log(None)
+    querylog.reset_query_plans()
+    database.configure_pool()
+
+
+def test_tracing_is_off_by_default(temp_db):
+    """Test connections are plain sqlite3 connections unless tracing is configured"""
+    assert querylog.connection_factory() is sqlite3.Connection
+    with database.db_connection() as conn:
+        assert type(conn) is sqlite3.Connection
+
+
+def test_slow_queries_are_logged_without_parameter_values(traced, caplog):
+    """Test statements over the threshold are logged with their helper and redacted parameters"""
+    traced(0)
+    with caplog.at_level(logging.WARNING, logger='querylog'):
+        database.get_patron_borrowed_books('123456')
+    
+    messages = [record.getMessage() for record in caplog.records if 'FROM borrow_records br' in record.getMessage()]
+    assert len(messages) == 1
+    assert messages[0].startswith('Slow query (')
+    assert 'in get_patron_borrowed_books' in messages[0]
+    assert messages[0].endswith('(int, int, str)')
+    assert '123456' not in messages[0]
+
+
+def test_fast_queries_are_not_logged(traced, caplog):
+    """Test statements under the threshold are not logged"""
+    traced(10_000)
+    with caplog.at_level(logging.WARNING, logger='querylog'):
+        database.get_patron_borrowed_books('123456')
+        list(database.iter_books())
+    assert not caplog.records
+
+
+def test_query_plans_are_captured_once(traced):
+    """Test EXPLAIN QUERY PLAN is recorded once per distinct query, with the indexes used"""
+    traced(None, explain=True)
+    database.get_patron_borrowed_books('123456')
+    database.get_patron_borrowed_books('654321')
+    
+    plans = [plan for plan in querylog.get_query_plans() if plan['caller'] == 'get_patron_borrowed_books'
+             and 'FROM borrow_records br' in plan['sql']]
+    assert len(plans) == 1
+    assert any('USING INDEX idx_borrow_records_open_patron' in detail for detail in plans[0]['plan'])
+    assert plans[0]['full_scans'] == []
+
+
+def test_full_table_scans_are_flagged(traced, caplog):
+    """Test a query without a usable index is reported as a full table scan"""
+    traced(None, explain=True)
+    with caplog.at_level(logging.WARNING, logger='querylog'):
+        with database.db_connection() as conn:
+            conn.execute('SELECT * FROM borrow_records WHERE due_date < ?', ('2026-01-01',)).fetchall()
+    
+    plan, = querylog.get_query_plans()
+    assert plan['full_scans'] == ['borrow_records']
+    assert 'Full table scan of borrow_records' in caplog.text
+
+
+def test_query_plans_command(temp_db):
+    """Test the query-plans command explains the main read paths"""
+    app = create_app()
+    result = app.test_cli_runner().invoke(args=['query-plans'])
+    assert result.exit_code == 0
+    assert 'get_patron_borrowed_books: SELECT' in result.output
+    assert 'SEARCH br USING INDEX idx_borrow_records_open_patron' in result.output
+    assert querylog.connection_factory() is sqlite3.Connection
@@ -1,11 +1,17 @@
 import pytest
+from datetime import datetime, timedelta
+from database import get_book_by_id, insert_borrow_record, update_book_availability
 from services.library_service import return_book_by_patron
 
-def test_return_book_success():
+def test_return_book_success(temp_db):
     """Test successful book return"""
+    borrow_date = datetime.now()
+    insert_borrow_record("123456", 1, borrow_date, borrow_date + timedelta(days=14))
+    update_book_availability(1, -1)
     success, message = return_book_by_patron("123456", 1)
     assert success is True
     assert "Successfully returned" in message
+    assert get_book_by_id(1)['available_copies'] == 3
 
 def test_return_book_invalid_patron_id_empty():
     """Test return with empty patron ID"""
@@ -19,11 +25,22 @@ def test_return_book_nonexistent_book():
     assert success is False
     assert message == "Book not found."
 
-def test_return_book_overdue():
+def test_return_book_overdue(temp_db):
     """Test returning a book that is overdue"""
     patron_id = "234567"  
-    book_id = 3           
+    book_id = 1           
+    borrow_date = datetime.now() - timedelta(days=30)
+    insert_borrow_record(patron_id, book_id, borrow_date, borrow_date + timedelta(days=14))
+    update_book_availability(book_id, -1)
     success, message = return_book_by_patron(patron_id, book_id)
     assert success is True
     assert "Successfully returned" in message
     assert isinstance(message, str)
+    assert get_book_by_id(book_id)['available_copies'] == 3
+
+def test_return_book_not_borrowed(temp_db):
+    """Test returning a book the patron never borrowed"""
+    success, message = return_book_by_patron("234567", 1)
+    assert success is False
+    assert message == "No active borrow record found for this book and patron."
+    assert get_book_by_id(1)['available_copies'] == 3
@@ -1,4 +1,7 @@
+import sqlite3
+
 import pytest
+import database
 from services.library_service import search_books_in_catalog
 
 def test_search_books_empty_search_term():
@@ -22,3 +25,58 @@ def test_search_books_returns_list():
     """Test that search returns a list"""
     results = search_books_in_catalog("Test", "title")
     assert isinstance(results, list)
+
+def test_search_books_title_partial_case_insensitive(temp_db):
+    """Test partial, case-insensitive title matching through the full-text index"""
+    results = search_books_in_catalog("GATS", "title")
+    assert [book['title'] for book in results] == ["The Great Gatsby"]
+
+def test_search_books_by_author(temp_db):
+    """Test partial author matching"""
+    results = search_books_in_catalog("orwell", "author")
+    assert [book['isbn'] for book in results] == ["9780451524935"]
+
+def test_search_books_isbn_exact_only(temp_db):
+    """Test ISBN search requires an exact match"""
+    assert len(search_books_in_catalog("9780061120084", "isbn")) == 1
+    assert search_books_in_catalog("978006112008", "isbn") == []
+
+def test_search_books_isbn_sees_other_process_writes(temp_db):
+    """Test an ISBN search is not answered from a book cached before another process's write"""
+    assert database.get_book_by_isbn("9780061120084")['available_copies'] == 2
+    with sqlite3.connect(temp_db) as other:
+        other.execute("UPDATE books SET available_copies = 0 WHERE isbn = '9780061120084'")
+    other.close()
+    assert search_books_in_catalog("9780061120084", "isbn")[0]['available_copies'] == 0
+
+def test_search_books_short_term(temp_db):
+    """Test terms shorter than a trigram still match"""
+    results = search_books_in_catalog("19", "title")
+    assert [book['title'] for book in results] == ["1984"]
+
+def test_search_books_index_follows_inserts_and_updates(temp_db):
+    """Test the search index is kept in sync with the books table"""
+    database.insert_book("Gatsby Revisited", "Some Critic", "1111111111111", 1, 1)
+    assert len(search_books_in_catalog("gatsby", "title")) == 2
+    with database.db_connection() as conn:
+        conn.execute("UPDATE books SET title = 'Renamed' WHERE isbn = '1111111111111'")
+    assert [book['title'] for book in search_books_in_catalog("gatsby", "title")] == ["The Great Gatsby"]
+    assert len(search_books_in_catalog("renamed", "title")) == 1
+
+def test_search_books_special_characters(temp_db):
+    """Test FTS syntax characters in the term are matched literally"""
+    assert search_books_in_catalog('"gats*', "title") == []
+    assert len(search_books_in_catalog("f. scott", "author")) == 1
+
+def test_search_page_streams_results(temp_db):
+    """Test the search page is streamed and still reports empty results"""
+    from app import create_app
+    client = create_app().test_client()
+    response = client.get("/search?q=orwell&type=author")
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert "1984" in html and "No results found" not in html
+    
+    html = client.get("/search?q=zzzzzz&type=title").get_data(as_text=True)
+    assert "No results found" in html
+    assert "not yet implemented." in html
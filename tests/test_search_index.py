@@ -0,0 +1,150 @@
+import sqlite3
+
+import pytest
+import database
+import search_index
+from search_index import PrefixIndex, TrigramIndex, get_catalog_index, trigrams
+from services.library_service import autocomplete_catalog, search_books_in_catalog
+
+
+def test_trigrams_are_padded_per_word():
+    """Test trigram extraction lowercases and pads each word"""
+    assert trigrams("Ab") == {"  a", " ab", "ab "}
+    assert trigrams("") == set()
+
+
+def test_index_ranks_closer_matches_first():
+    """Test misspelt queries find the right document, best match first"""
+    index = TrigramIndex()
+    index.add(1, "The Great Gatsby")
+    index.add(2, "Gatsby Girls")
+    index.add(3, "Animal Farm")
+    results = index.search("Gatsbi", threshold=0.5)
+    assert [doc_id for doc_id, _ in results] == [2, 1]
+    assert index.search("Gatsbi", threshold=0.9) == []
+
+
+def test_index_handles_out_of_order_ids():
+    """Test postings stay sorted when IDs arrive out of order"""
+    index = TrigramIndex()
+    index.add(5, "orwell")
+    index.add(2, "orwell")
+    index.add(2, "duplicate ignored")
+    assert sorted(doc_id for doc_id, _ in index.search("orwel")) == [2, 5]
+    assert len(index) == 2
+
+
+def test_common_trigrams_are_bounded(monkeypatch):
+    """Test a search over very common trigrams still ranks the closest match first"""
+    monkeypatch.setattr(search_index, "MAX_SCANNED_POSTINGS", 50)
+    monkeypatch.setattr(search_index, "MAX_CANDIDATES", 10)
+    index = TrigramIndex()
+    for doc_id in range(1, 501):
+        index.add(doc_id, f"River Shadow {doc_id}")
+    index.add(1000, "River Shadow Garden")
+    assert index.search("Rivr Shadow Gardn")[0][0] == 1000
+    assert len(index.search("River Shadow", limit=5)) == 5
+
+
+def test_out_of_order_insert_leaves_read_postings_intact():
+    """Test inserting an older ID copies the posting list instead of shifting it"""
+    index = TrigramIndex()
+    index.add(5, "orwell")
+    postings = index._postings["orw"]
+    index.add(2, "orwell")
+    assert list(postings) == [5]
+    assert list(index._postings["orw"]) == [2, 5]
+
+
+def test_fuzzy_search_tolerates_typos(temp_db):
+    """Test the fuzzy search type matches misspelt titles and authors"""
+    assert [b['title'] for b in search_books_in_catalog("Gatsbi", "fuzzy")] == ["The Great Gatsby"]
+    results = search_books_in_catalog("Orwel", "fuzzy")
+    assert [b['title'] for b in results] == ["1984"]
+    assert 0.5 <= results[0]['similarity'] <= 1
+
+
+def test_fuzzy_search_threshold(temp_db):
+    """Test a stricter threshold drops weak matches"""
+    assert search_books_in_catalog("Gatsbi", "fuzzy", threshold=0.95) == []
+
+
+def test_fuzzy_index_updated_on_insert(temp_db):
+    """Test books added after the index is built are searchable"""
+    get_catalog_index()
+    database.insert_book("Moby Dick", "Herman Melville", "9781503280786", 1, 1)
+    assert [b['title'] for b in search_books_in_catalog("Mobby Dik", "fuzzy")] == ["Moby Dick"]
+    database.insert_books_bulk([("Middlemarch", "George Eliot", "9780141439549", 1)])
+    assert [b['title'] for b in search_books_in_catalog("Midlemarch", "fuzzy")] == ["Middlemarch"]
+
+
+def test_index_catches_up_with_other_processes(temp_db):
+    """Test books written by another process are indexed once the catalog version moves"""
+    assert autocomplete_catalog("mob", "title") == []
+    with sqlite3.connect(temp_db) as other:
+        other.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Moby Dick', 'Herman Melville', '9781503280786', 1, 1)
+        ''')
+    other.close()
+    assert [b['title'] for b in search_books_in_catalog("Mobby Dik", "fuzzy")] == ["Moby Dick"]
+    assert autocomplete_catalog("mob", "title") == ["Moby Dick"]
+    assert get_catalog_index().scanned_through == database.get_book_by_isbn("9781503280786")['id']
+
+
+def test_index_rescans_only_after_inserts(temp_db, mocker):
+    """Test catalog changes that insert no books do not rescan the books table"""
+    index = get_catalog_index()
+    database.get_catalog_version()
+    scan = mocker.spy(index, "scan_books")
+    database.update_book_availability(1, -1)
+    get_catalog_index()
+    scan.assert_not_called()
+    database.insert_book("Moby Dick", "Herman Melville", "9781503280786", 1, 1)
+    get_catalog_index()
+    scan.assert_called_once()
+
+
+def test_fuzzy_api(temp_db):
+    """Test fuzzy search through /api/search with a threshold"""
+    from app import create_app
+    client = create_app().test_client()
+    body = client.get("/api/search?q=Gatsbi&type=fuzzy&threshold=0.6").get_json()
+    assert body['count'] == 1
+    assert client.get("/api/search?q=Gatsbi&type=fuzzy&threshold=2").status_code == 400
+
+
+def test_prefix_index_completes_in_order():
+    """Test prefix completion returns distinct matches alphabetically"""
+    index = PrefixIndex()
+    index.add_many(["The Great Gatsby", "Great Expectations", "Grendel", "great expectations"])
+    assert index.complete("gre") == ["Great Expectations", "The Great Gatsby", "Grendel"]
+    assert index.complete("the g") == ["The Great Gatsby"]
+    assert index.complete("gre", limit=1) == ["Great Expectations"]
+    assert index.complete("  ") == []
+
+
+def test_prefix_index_single_adds_stay_sorted():
+    """Test incremental adds keep the array sorted"""
+    index = PrefixIndex()
+    for title in ["b", "a", "c", "ab"]:
+        index.add(title)
+    assert index.complete("a") == ["a", "ab"]
+
+
+def test_autocomplete_follows_inserts(temp_db):
+    """Test suggestions include books inserted after the index was built"""
+    assert autocomplete_catalog("to k", "title") == ["To Kill a Mockingbird"]
+    database.insert_book("To Kill a Kingdom", "Alexandra Christo", "9781250112682", 1, 1)
+    assert autocomplete_catalog("to k", "title") == ["To Kill a Kingdom", "To Kill a Mockingbird"]
+    assert autocomplete_catalog("harp", "author") == ["Harper Lee"]
+    assert autocomplete_catalog("x", "publisher") == []
+
+
+def test_autocomplete_api(temp_db):
+    """Test the /api/autocomplete endpoint"""
+    from app import create_app
+    client = create_app().test_client()
+    body = client.get("/api/autocomplete?q=geo&type=author").get_json()
+    assert body['suggestions'] == ["George Orwell"]
+    assert client.get("/api/autocomplete?q=geo&type=isbn").status_code == 400
@@ -0,0 +1,115 @@
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-fork server needs os.fork()")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVE = os.path.join(ROOT, 'serve.py')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _get(port, path):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+        return response.status, response.read()
+
+
+def _wait_until_serving(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return _get(port, '/api/books?limit=1')
+        except OSError:
+            time.sleep(0.1)
+    raise AssertionError("server did not start")
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, SERVE, '--host', '127.0.0.1', '--port', str(port), '--workers', '2'],
+                            cwd=tmp_path, stderr=subprocess.PIPE, text=True)
+    try:
+        _wait_until_serving(port)
+        yield proc, port
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def test_workers_serve_requests(server):
+    """Test requests are answered by the forked workers"""
+    _, port = server
+    for _ in range(10):
+        status, body = _get(port, '/api/search?q=gatsby&type=title')
+        assert status == 200
+        assert b'The Great Gatsby' in body
+
+
+def test_reload_and_graceful_shutdown(server):
+    """Test SIGHUP swaps the workers without downtime and SIGTERM stops everything"""
+    proc, port = server
+    proc.send_signal(signal.SIGHUP)
+    for _ in range(20):
+        assert _get(port, '/catalog')[0] == 200
+        time.sleep(0.05)
+    
+    proc.send_signal(signal.SIGTERM)
+    assert proc.wait(timeout=15) == 0
+    assert "Reloading" in proc.stderr.read()
+    with pytest.raises(OSError):
+        _get(port, '/catalog')
+
+
+def test_reload_loads_new_code(tmp_path):
+    """Test SIGHUP re-executes the master, so workers run code changed since startup"""
+    code = tmp_path / 'app'
+    shutil.copytree(ROOT, code, ignore=shutil.ignore_patterns('.git', 'tests', 'benchmarks', '*.db*', '__pycache__'))
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, str(code / 'serve.py'), '--host', '127.0.0.1', '--port', str(port),
+                             '--workers', '2'], cwd=tmp_path, stderr=subprocess.PIPE, text=True)
+    try:
+        _wait_until_serving(port)
+        with (code / 'app.py').open('a') as f:
+            f.write(
+                "\n_create_app = create_app\n"
+                "def create_app():\n"
+                "    app = _create_app()\n"
+                "    app.add_url_rule('/reloaded', 'reloaded', lambda: 'new code')\n"
+                "    return app\n"
+            )
+        with pytest.raises(urllib.error.HTTPError):
+            _get(port, '/reloaded')
+
+        proc.send_signal(signal.SIGHUP)
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                assert _get(port, '/reloaded') == (200, b'new code')
+                break
+            except urllib.error.HTTPError:
+                assert time.monotonic() < deadline, "reloaded workers never served the new code"
+                time.sleep(0.1)
+        assert proc.poll() is None
+
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=15) == 0
+        assert "Reloaded: started 2 new workers, stopping 2" in proc.stderr.read()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()